@@ -1,6 +1,17 @@
 import streamlit as st
 import math
 import os
+import sys
+
+# Make the shared recipe modules in src/ importable
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
+from pour_matrix import PourMatrix, DEFAULT_PITCHER_SIZE
+from simulator import SimulationConfig
+from maintenance import live_config
+from pump_controller import load_flow_rates
+from recipe_search import RecipeSearchIndex, loaded_ingredients
+from metrics import start_exporters, order_placed
+from image_variants import start_image_server, picture_html
 
 # Konfiguration der Hauptseite
 st.set_page_config(
@@ -13,6 +24,28 @@ st.sidebar.success("Wähle eine Seite aus dem Menü.")
 
 # Get the absolute path to the assets directory
 ASSETS_DIR = os.path.join(os.path.dirname(__file__), "assets")
+# MIXMASTERX_DATA_DIR legt Metriken und Bildvarianten woanders ab (z.B. die Benchmarks in einem Temp-Verzeichnis)
+DATA_DIR = os.environ.get("MIXMASTERX_DATA_DIR") or os.path.join(os.path.dirname(__file__), "data")
+
+# Metriken auf localhost:9465/metrics und in DATA_DIR/metrics_streamlit.jsonl (einmal pro Prozess)
+start_exporters(DATA_DIR, "streamlit", port=9465)
+
+# Kartenbilder als WebP/JPEG-Varianten mit langem Cache auf Port 9466 (einmal pro Prozess);
+# ist der Port belegt, werden die Originale mit st.image gesendet
+image_server = start_image_server(DATA_DIR)
+
+
+def image_base_url(port):
+    """Return the image server's URL as the browser reaches it"""
+    url = os.environ.get("MIXMASTERX_IMAGE_URL")
+    if url:
+        # e.g. behind a reverse proxy that serves /img/ itself
+        return url.rstrip("/")
+    host = st.context.headers.get("Host") or "localhost"
+    name, _, streamlit_port = host.rpartition(":")
+    if streamlit_port.isdigit():
+        host = name
+    return f"http://{host}:{port}"
 
 # Standard Cocktails mit Bildpfaden
 DEFAULT_COCKTAILS = {
@@ -63,38 +96,69 @@ st.divider()
 if "recipes" not in st.session_state:
     st.error("Bitte zuerst im Admin-Bereich Cocktails konfigurieren!")
 else:
+    if "search_index" not in st.session_state:
+        st.session_state["search_index"] = RecipeSearchIndex(st.session_state["recipes"])
+
+    # Suche und Filter
+    search_col, exclude_col, available_col, servings_col = st.columns([3, 3, 2, 2])
+    with search_col:
+        query = st.text_input("Suche:", key="search_query")
+    with exclude_col:
+        exclude = st.multiselect("Ohne:", options=list(st.session_state["ingredients"]), key="search_exclude")
+    with available_col:
+        only_available = st.checkbox("Nur verfügbare Drinks", key="search_only_available")
+    with servings_col:
+        servings = st.number_input("Portionen:", min_value=1, max_value=50, value=1, key="servings")
+
+    loaded = loaded_ingredients(st.session_state["ingredients"]) if only_available else None
+    names = st.session_state["search_index"].search(query, exclude=exclude, loaded=loaded)
+
     # Bestimme die Anzahl der Cocktails pro Reihe
-    total_cocktails = len(st.session_state["recipes"])
+    total_cocktails = len(names)
     cocktails_per_row = 3 if total_cocktails % 3 == 0 else 2
 
     # Berechne die Anzahl der benötigten Reihen
     num_rows = math.ceil(total_cocktails / cocktails_per_row)
 
+    # Alle ml-Mengen und die Verfügbarkeit für das ganze Menü auf einmal berechnen
+    pour_matrix = PourMatrix(st.session_state["recipes"], st.session_state["ingredients"])
+    available = pour_matrix.available()
+
+    base_url = image_base_url(image_server.port) if image_server is not None else None
+
     # Erstelle das Grid-Layout
     for row in range(num_rows):
         start_idx = row * cocktails_per_row
         end_idx = min(start_idx + cocktails_per_row, total_cocktails)
         
         cols = st.columns(cocktails_per_row)
-        cocktails = list(st.session_state["recipes"].items())
         
         for col_idx, cocktail_idx in enumerate(range(start_idx, end_idx)):
             with cols[col_idx]:
-                cocktail_name, recipe_data = cocktails[cocktail_idx]
+                cocktail_name = names[cocktail_idx]
+                recipe_data = st.session_state["recipes"][cocktail_name]
                 try:
-                    st.image(recipe_data["image"], use_container_width=True)
+                    if image_server is not None:
+                        variants = image_server.store.variants(recipe_data.image)
+                        sizes = f"(max-width: 640px) 100vw, {100 // cocktails_per_row}vw"
+                        st.markdown(picture_html(variants, base_url, alt=cocktail_name, sizes=sizes),
+                                    unsafe_allow_html=True)
+                    else:
+                        st.image(recipe_data.image, use_container_width=True)
                     # Adjusted column ratios for better centering
                     col1, col2, col3 = st.columns([2, 3, 2])
                     with col2:
-                        if st.button(cocktail_name, key=f"btn_{cocktail_idx}", type="primary"):
+                        if st.button(cocktail_name, key=f"btn_{cocktail_name}", type="primary",
+                                     disabled=not available[pour_matrix.row_of[cocktail_name]]):
+                            order_placed(cocktail_name)
                             # Show recipe details
                             st.write(f"\nGlasgröße: {st.session_state['glass_size']}ml")
                             st.write("\nRezept:")
                             
                             # Create a formatted recipe dictionary
                             recipe_details = {}
-                            for ing, percentage in recipe_data["ingredients"].items():
-                                ml_amount = (percentage / 100) * st.session_state["glass_size"]
+                            pours = pour_matrix.recipe_pours(cocktail_name, st.session_state["glass_size"])
+                            for ing, percentage, ml_amount in pours:
                                 recipe_details[ing] = {
                                     "percentage": f"{percentage:.1f}%",
                                     "amount": f"{ml_amount:.1f}ml"
@@ -102,6 +166,20 @@ else:
                             
                             # Display the recipe
                             st.json(recipe_details)
+                            if servings > 1:
+                                # A round goes into pitchers, one continuous pour per slot and fill
+                                fills = pour_matrix.batch_pours(
+                                    cocktail_name, servings, st.session_state["glass_size"],
+                                    st.session_state.get("pitcher_size", DEFAULT_PITCHER_SIZE))
+                                single = pour_matrix.batch_pours(cocktail_name, 1, st.session_state["glass_size"],
+                                                                 slot_max=None)[0]
+                                # Pumping time only, as the machine serves it
+                                config = live_config(SimulationConfig(flow_rates=load_flow_rates(DATA_DIR)))
+                                batch_minutes = sum(config.drink_seconds(fill) for fill in fills) / 60
+                                single_minutes = servings * config.drink_seconds(single) / 60
+                                st.write(f"Runde: {servings} x {cocktail_name} in {len(fills)} Krug-Füllung(en) "
+                                         f"à {sum(fills[0].values()):.0f}ml, Zapfzeit ca. {batch_minutes:.1f} min "
+                                         f"(einzeln {single_minutes:.1f} min)")
                             st.success(f"Du hast {cocktail_name} ausgewählt! Prost! 🍹")
                 except Exception as e:
                     st.error(f"Bild für {cocktail_name} konnte nicht geladen werden")
@@ -0,0 +1,76 @@
+"""Throughput and memory benchmark for the streaming catalog import
+
+Run with `python benchmarks/bench_catalog_import.py [rows ...]`. Every size
+is imported into an empty data directory. The peak is the Python heap as
+traced by tracemalloc and should stay flat as the number of rows grows. It
+does not include SQLite's page cache for the spool, which SQLite bounds
+itself (2 MiB by default), nor an existing catalog, which an import into a
+full data directory reads as well.
+"""
+import csv
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from catalog_io import import_catalog
+
+INGREDIENTS = ["Aperol", "Lillet", "Schweppes Raspberry", "Secco", "Mineralwasser", "Gin", "Tonic"]
+
+
+def write_catalog(path, rows, seed=42):
+    """Write a wide CSV catalog with every 50th row invalid"""
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "image", "glass_size"] + INGREDIENTS)
+        for i in range(rows):
+            chosen = set(rng.sample(INGREDIENTS, rng.randint(2, 4)))
+            weights = {ing: rng.randint(1, 10) for ing in chosen}
+            total = sum(weights.values())
+            percentages = {ing: round(100 * w / total, 2) for ing, w in weights.items()}
+            # Fix rounding so the row sums to exactly 100, except for the invalid rows
+            last = next(iter(percentages))
+            percentages[last] = round(percentages[last] + 100 - sum(percentages.values()), 2)
+            if i % 50 == 0:
+                percentages[last] += 5
+            writer.writerow([f"Cocktail {i}", f"cocktail_{i}.jpg", 400] +
+                            [percentages.get(ing, "") for ing in INGREDIENTS])
+
+
+def run(rows, tmp_dir):
+    data_dir = os.path.join(tmp_dir, f"data_{rows}")
+    os.makedirs(data_dir)
+    with open(os.path.join(data_dir, "ingredients.json"), 'w') as f:
+        json.dump({ing: slot for slot, ing in enumerate(INGREDIENTS, start=1)}, f)
+    catalog = os.path.join(tmp_dir, f"catalog_{rows}.csv")
+    write_catalog(catalog, rows)
+
+    # Time a dry run without tracing, then measure memory on the real import
+    start = time.perf_counter()
+    import_catalog(catalog, data_dir, dry_run=True)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    result = import_catalog(catalog, data_dir)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    size = os.path.getsize(catalog) / 1024 / 1024
+    print(f"{rows:>9} rows ({size:6.1f} MiB): {rows / elapsed:10,.0f} rows/s, "
+          f"peak Python heap {peak / 1024 / 1024:6.1f} MiB, {result.imported} imported, {result.failed} rejected")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in sizes:
+            run(rows, tmp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Image bytes per page load of the Streamlit menu, before and after the variants
+
+Run with `python benchmarks/bench_image_bytes.py [images ...]` (default: the
+images in assets/). Before, `st.image` sends every card's original JPEG,
+unchanged since it is narrower than Streamlit's 1460 px limit, and without
+cache headers, so every page load downloads it again. After, the browser
+picks one variant per card from the srcset; the bytes are fetched from a
+local image server exactly as a browser would. A repeated page load sends no
+image bytes: the cached copies are `immutable`, and even a forced
+revalidation only gets a 304.
+"""
+import glob
+import os
+import re
+import sys
+import tempfile
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from image_variants import ImageServer, VariantStore, picture_html, ASSETS_DIR
+
+# (label, viewport width in CSS px, device pixel ratio)
+CLIENTS = [
+    ("Phone 390px @3x", 390, 3),
+    ("Tablet 1024px @2x", 1024, 2),
+    ("Laptop 1280px @1x", 1280, 1),
+]
+
+
+def slot_width(sizes, viewport):
+    # Evaluate the `sizes` attribute the way the browser does for our two forms
+    for part in sizes.split(","):
+        match = re.match(r"\s*(?:\(max-width: (\d+)px\)\s*)?(\d+)vw", part)
+        if match.group(1) is None or viewport <= int(match.group(1)):
+            return viewport * int(match.group(2)) / 100
+
+
+def pick(srcset, needed):
+    # The smallest candidate that is wide enough, else the largest
+    candidates = sorted((int(width[:-1]), url) for url, width in (c.split() for c in srcset.split(", ")))
+    return next((url for width, url in candidates if width >= needed), candidates[-1][1])
+
+
+def fetch(url, etag=None):
+    request = urllib.request.Request(url, headers={"If-None-Match": etag} if etag else {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return len(response.read()), response.headers["ETag"], response.headers["Cache-Control"]
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return 0, etag, e.headers["Cache-Control"]
+        raise
+
+
+def main():
+    images = sys.argv[1:] or sorted(glob.glob(os.path.join(ASSETS_DIR, "*.jpg")))
+    original = sum(os.path.getsize(image) for image in images)
+    per_row = 3 if len(images) % 3 == 0 else 2
+    sizes = f"(max-width: 640px) 100vw, {100 // per_row}vw"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = ImageServer(VariantStore(tmp), host="127.0.0.1", port=0).start()
+        base_url = f"http://127.0.0.1:{server.port}"
+        pages = [picture_html(server.store.variants(image), base_url, sizes=sizes) for image in images]
+        print(f"{len(images)} cards, {per_row} per row")
+        print(f"  before (st.image):    {original / 1024:7.1f} KiB on every page load, no cache headers")
+        for label, viewport, dpr in CLIENTS:
+            needed = slot_width(sizes, viewport) * dpr
+            cold = warm = 0
+            for page in pages:
+                srcset = re.search(r'<source type="image/webp" srcset="([^"]+)"', page).group(1)
+                url = pick(srcset, needed)
+                size, etag, cache_control = fetch(url)
+                cold += size
+                warm += fetch(url, etag)[0]
+            print(f"  {label:<20} {cold / 1024:7.1f} KiB on the first load ({original / cold:4.1f}x less), "
+                  f"{warm} bytes on later loads ({cache_control})")
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
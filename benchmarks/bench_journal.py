@@ -0,0 +1,94 @@
+"""Cost of the dispense journal on the pour path
+
+Run with `python benchmarks/bench_journal.py [pours]`. Measures the time a
+pour spends in the journal, the pump start latency on the FakeController
+with and without journaling, and how many records share one fdatasync
+when many pours are journaled at once. The journal file goes to a temporary
+directory; pass `--dir` to measure on the SD card instead.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from dispense_journal import DispenseJournal
+from pump_controller import FakeController, PumpController
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples) * 1e6, samples[int(len(samples) * 0.99)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pours", type=int, nargs="?", default=2000)
+    parser.add_argument("--dir", help="Directory for the journal file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        journal = DispenseJournal(os.path.join(tmp, "journal.log"))
+        slot_ml = {1: 40.0, 4: 120.0, 7: 240.0}
+
+        # Time inside begin/end on the calling thread
+        spent = []
+        for _ in range(args.pours):
+            start = time.perf_counter()
+            entry = journal.begin("Gin Tonic", slot_ml)
+            journal.end(entry)
+            spent.append(time.perf_counter() - start)
+        median, p99 = percentiles(spent)
+        print(f"begin + end on the pour path:   median {median:6.1f} us, p99 {p99:6.1f} us")
+
+        # Time until the records are on disk, for comparison
+        durable = []
+        for _ in range(min(args.pours, 200)):
+            start = time.perf_counter()
+            journal.end(journal.begin("Gin Tonic", slot_ml)).result()
+            durable.append(time.perf_counter() - start)
+        median, p99 = percentiles(durable)
+        print(f"until durable (not waited for): median {median:6.1f} us, p99 {p99:6.1f} us")
+
+        # Pump start (START frame until ACK), plain and journaled alternating so drift hits both
+        with FakeController() as fake, PumpController(fake.port) as pumps:
+            pumps.ping().result(1)
+            latencies = {False: [], True: []}
+            for i in range(2 * min(args.pours, 500)):
+                journaled = bool(i % 2)
+                start = time.perf_counter()
+                entry = journal.begin("Gin Tonic", slot_ml) if journaled else None
+                pumps.start({1: 10.0, 4: 10.0, 7: 10.0}).result(1)
+                latencies[journaled].append(time.perf_counter() - start)
+                pumps.stop().result(1)
+                if entry is not None:
+                    journal.end(entry)
+            for journaled, label in ((False, "plain"), (True, "journaled")):
+                median, p99 = percentiles(latencies[journaled])
+                print(f"pump start, {label + ':':<11}         median {median:6.1f} us, p99 {p99:6.1f} us")
+
+        # Group commit under load: eight stations pouring at once
+        records, commits = journal.records, journal.commits
+        start = time.perf_counter()
+
+        def station():
+            for _ in range(args.pours // 8):
+                journal.end(journal.begin("Aperol Spritz", slot_ml))
+        threads = [threading.Thread(target=station) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        journal.end(journal.begin("Aperol Spritz", slot_ml)).result()
+        elapsed = time.perf_counter() - start
+        records, commits = journal.records - records, journal.commits - commits
+        print(f"8 threads: {records} records in {commits} syncs ({records / commits:.1f} per sync), "
+              f"{records / elapsed:,.0f} records/s")
+        journal.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Peak memory of the Tk app with and without the low-memory profile
+
+Run with `python benchmarks/bench_memory.py [recipes ...] [--budget MB]`.
+Every run starts a fresh Python process that creates the MainWindow on a
+synthetic catalog with one image per recipe, pages through the whole grid,
+opens every admin section and goes back to the customer tab until the admin
+widgets are released. The peak RSS of that process is reported once with the
+normal profile and once with MIXMASTERX_MEMORY_MB set to the budget.
+
+The exit code is 1 if a run with the budget exceeds it; the automated check
+for the Pi Zero target is tests/test_memory_budget.py, which runs the same
+child process. Xvfb is started if DISPLAY is not set. Without either, or
+with `--headless`, the processes load the menu as MainWindow does and page
+through the grid with a thumbnail cache of the profile's size, but create no
+window. Tk's photo images are then estimated at four bytes per pixel for
+every cached thumbnail, and neither libtk, the widgets nor the admin
+sections are measured: the result is an estimate, never a pass, and the
+exit code stays 0.
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+from collections import OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from suite import Catalog, boot_menu, ensure_display, make_images, SRC_DIR
+from memory_profile import MEMORY_ENV, PHOTO_BYTES_PER_PIXEL, MemoryProfile, current_rss_bytes, peak_rss_bytes
+from thumbnail_pack import GRID_SIZE
+
+MB = 1024 * 1024
+
+
+def child(data_dir):
+    # Runs in the fresh process with the profile from the environment
+    sys.path.insert(0, SRC_DIR)
+    import complex_main
+    app = complex_main.MainWindow(data_dir=data_dir)
+    app.root.update()
+
+    page_size = app.memory.page_size
+    pages = math.ceil(len(app.recipes) / page_size) if page_size else 1
+    for page in range(pages):
+        app.show_grid_page(page)
+        app.root.update()
+
+    app.notebook.select(app.admin_frame)
+    app.root.update()
+    for index in range(len(app.admin_sections)):
+        app.admin_notebook.select(index)
+        app.root.update()
+    app.notebook.select(app.main_frame)
+    app.root.update()
+    app.teardown_admin_tab()
+    app.root.update()
+
+    print(json.dumps({"peak": peak_rss_bytes() / MB, "end": current_rss_bytes() / MB,
+                      "pages": pages, "thumbnails": len(app.thumbnail_cache)}), flush=True)
+    app.root.destroy()
+
+
+def headless_child(data_dir):
+    # Same profile and grid paging as the app, with the thumbnails Tk would get
+    memory = MemoryProfile.from_env(GRID_SIZE)
+    recipes, thumbnail, release = boot_menu(data_dir)
+    names = recipes.names()
+    page_size = memory.page_size or len(names)
+    pages = math.ceil(len(names) / page_size) if names else 1
+    cache = OrderedDict()
+    for page in range(pages):
+        for name in names[page * page_size:(page + 1) * page_size]:
+            image = recipes[name].image
+            if image in cache:
+                cache.move_to_end(image)
+                continue
+            cache[image] = thumbnail(image)
+            if len(cache) > memory.thumbnail_entries:
+                cache.popitem(last=False)
+        if memory.low:
+            release()
+    photos = len(cache) * GRID_SIZE[0] * GRID_SIZE[1] * PHOTO_BYTES_PER_PIXEL
+    print(json.dumps({"peak": peak_rss_bytes() / MB, "end": current_rss_bytes() / MB,
+                      "pages": pages, "thumbnails": len(cache), "photos": photos / MB}), flush=True)
+
+
+def image_catalog(size, tmp_dir):
+    """Return a Catalog of `size` recipes with an image of their own each"""
+    catalog = Catalog(size, tmp_dir)
+    images = make_images(catalog.assets_dir, size)
+    for i, recipe in enumerate(catalog.recipes.values()):
+        recipe["image"] = images[i]
+    catalog.write()
+    return catalog
+
+
+def run(data_dir, budget, headless=False):
+    env = dict(os.environ, MIXMASTERX_METRICS_PORT="0")
+    env.pop(MEMORY_ENV, None)
+    if budget is not None:
+        env[MEMORY_ENV] = str(budget)
+    command = [sys.executable, os.path.abspath(__file__), "--child", data_dir] + (["--headless"] if headless else [])
+    result = subprocess.run(command, env=env, stdout=subprocess.PIPE, text=True)
+    lines = result.stdout.strip().splitlines()
+    if result.returncode or not lines:
+        raise RuntimeError(f"Messprozess ist mit Code {result.returncode} beendet")
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", type=int, nargs="*", default=[100, 500])
+    parser.add_argument("--budget", type=float, default=100.0, help="Memory budget in MB")
+    parser.add_argument("--headless", action="store_true", help="Measure without a window, even with a display")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        if args.headless:
+            headless_child(args.child)
+        else:
+            child(args.child)
+        return
+
+    xvfb = None
+    headless = args.headless
+    if not headless:
+        xvfb, error = ensure_display()
+        if error:
+            print(f"{error}; measuring without a window, Tk photo images estimated")
+            headless = True
+    over = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for size in args.sizes:
+                catalog = image_catalog(size, tmp)
+                # The first start packs the thumbnails and writes the snapshot
+                run(catalog.data_dir, None, headless)
+                for budget in (None, args.budget):
+                    stats = run(catalog.data_dir, budget, headless)
+                    label = f"budget {budget:g} MB" if budget is not None else "no budget"
+                    peak = stats["peak"] + stats.get("photos", 0.0)
+                    if headless:
+                        print(f"{size:>6} recipes, {label + ':':<17} peak RSS {stats['peak']:6.1f} MB "
+                              f"+ Tk photos {stats['photos']:5.1f} MB (estimated) = {peak:6.1f} MB "
+                              f"({stats['pages']} grid pages, {stats['thumbnails']} cached thumbnails)")
+                    else:
+                        print(f"{size:>6} recipes, {label + ':':<17} peak RSS {stats['peak']:6.1f} MB, "
+                              f"after leaving admin {stats['end']:6.1f} MB "
+                              f"({stats['pages']} grid pages, {stats['thumbnails']} cached thumbnails)")
+                    if budget is not None and peak > budget:
+                        over.append(size)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+    if headless:
+        print("Estimate only: run tests/test_memory_budget.py with a display for the check")
+    elif over:
+        print(f"Over the {args.budget:g} MB budget with {', '.join(map(str, over))} recipes")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
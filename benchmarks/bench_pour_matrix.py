@@ -0,0 +1,79 @@
+"""Benchmark: per-dict ml loops vs. the vectorized PourMatrix
+
+Run with `python benchmarks/bench_pour_matrix.py [num_recipes]`.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from recipe_model import RecipeStore
+from pour_matrix import PourMatrix, NUM_SLOTS
+from bench_recipe_model import INGREDIENTS, make_recipe_dicts
+
+GLASS_SIZES = list(range(100, 1001, 50))
+SLOTS = {name: (i % NUM_SLOTS) + 1 for i, name in enumerate(INGREDIENTS[:NUM_SLOTS])}
+
+
+def loops(recipes, slots, glass_sizes):
+    """The per-recipe, per-ingredient loops the frontends use today"""
+    tables = []
+    for glass_size in glass_sizes:
+        table = {}
+        demand = [0.0] * NUM_SLOTS
+        available = {}
+        for name, data in recipes.items():
+            amounts = {}
+            makeable = True
+            for ing, percentage in data["ingredients"].items():
+                ml_amount = (percentage / 100) * glass_size
+                amounts[ing] = ml_amount
+                slot = slots.get(ing, "-")
+                if slot == "-":
+                    makeable = False
+                else:
+                    demand[slot - 1] += ml_amount
+            table[name] = amounts
+            available[name] = makeable
+        tables.append((table, demand, available))
+    return tables
+
+
+def vectorized(matrix, glass_sizes):
+    return matrix.ml_amounts(glass_sizes), matrix.slot_demand(glass_sizes), matrix.available()
+
+
+def best_of(func, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000
+    recipes = make_recipe_dicts(count)
+    store = RecipeStore.from_dicts(recipes)
+
+    build = best_of(lambda: PourMatrix(store, SLOTS))
+    matrix = PourMatrix(store, SLOTS)
+
+    # Sanity check: both approaches agree on slot demand
+    expected = loops(recipes, SLOTS, [400])[0][1]
+    assert np.allclose(matrix.slot_demand(400), expected)
+
+    loop_time = best_of(lambda: loops(recipes, SLOTS, GLASS_SIZES))
+    vector_time = best_of(lambda: vectorized(matrix, GLASS_SIZES))
+
+    print(f"Recipes x glass sizes:   {count} x {len(GLASS_SIZES)}")
+    print(f"Matrix build:            {build * 1000:10.2f} ms")
+    print(f"Per-dict loops:          {loop_time * 1000:10.2f} ms")
+    print(f"PourMatrix:              {vector_time * 1000:10.2f} ms ({loop_time / vector_time:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
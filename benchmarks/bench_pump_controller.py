@@ -0,0 +1,76 @@
+"""Round-trip and throughput benchmark for the pump controller driver
+
+Run with `python benchmarks/bench_pump_controller.py [commands]`. Uses the
+pty-based FakeController, so it measures the driver and the OS, not the
+serial line; the wire time at 115200 baud is printed for comparison.
+"""
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from pump_controller import CMD_PING, CMD_START, FakeController, PumpController, encode_frame
+
+BAUDRATE = 115200
+
+
+def wire_ms(frame_bytes):
+    # 8N1: ten bits per byte
+    return frame_bytes * 10 / BAUDRATE * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with FakeController() as fake, PumpController(fake.port, max_in_flight=64) as pumps:
+        pumps.ping().result(1)
+
+        # One command at a time, waiting for every reply
+        rtts = []
+        for _ in range(count):
+            start = time.perf_counter()
+            pumps.ping().result(1)
+            rtts.append(time.perf_counter() - start)
+        rtts.sort()
+        print(f"Round trip (ping, {count}x):    median {statistics.median(rtts) * 1e6:7.0f} us, "
+              f"p99 {rtts[int(len(rtts) * 0.99)] * 1e6:7.0f} us")
+
+        start = time.perf_counter()
+        for _ in range(count):
+            pumps.ping().result(1)
+        serial_rate = count / (time.perf_counter() - start)
+
+        # Pipelined: everything in flight, replies matched by sequence number
+        start = time.perf_counter()
+        futures = pumps.send_many([(CMD_PING, b"")] * count)
+        for future in futures:
+            future.result(5)
+        pipelined_rate = count / (time.perf_counter() - start)
+        print(f"Throughput one-by-one:          {serial_rate:10,.0f} commands/s")
+        print(f"Throughput pipelined:           {pipelined_rate:10,.0f} commands/s ({pipelined_rate / serial_rate:.1f}x)")
+
+        # Starting a ten-ingredient drink: one batched frame vs one frame per slot
+        slots = {slot: 60.0 for slot in range(1, 11)}
+        runs = max(1, count // 20)
+        start = time.perf_counter()
+        for _ in range(runs):
+            pumps.start(slots).result(1)
+            pumps.stop().result(1)
+        batched = (time.perf_counter() - start) / runs
+        start = time.perf_counter()
+        for _ in range(runs):
+            for slot, seconds in slots.items():
+                pumps.start({slot: seconds}).result(1)
+            pumps.stop().result(1)
+        per_slot = (time.perf_counter() - start) / runs
+        print(f"Start 10 slots, one frame:      {batched * 1000:7.2f} ms")
+        print(f"Start 10 slots, frame per slot: {per_slot * 1000:7.2f} ms")
+
+        ping_bytes = len(encode_frame(1, CMD_PING))
+        start_bytes = len(encode_frame(1, CMD_START, bytes(50)))
+        print(f"Wire time at {BAUDRATE} baud: ping {2 * wire_ms(ping_bytes):.2f} ms round trip, "
+              f"10-slot START frame {wire_ms(start_bytes):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
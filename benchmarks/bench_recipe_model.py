@@ -0,0 +1,83 @@
+"""Memory and throughput benchmark: nested recipe dicts vs. RecipeStore
+
+Run with `python benchmarks/bench_recipe_model.py [num_recipes]`.
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from recipe_model import RecipeStore
+
+INGREDIENTS = [f"Zutat {i}" for i in range(40)]
+
+
+def make_recipe_dicts(count, seed=42):
+    """Build `count` synthetic recipes in the recipes.json shape"""
+    rng = random.Random(seed)
+    recipes = {}
+    for i in range(count):
+        # Build names and keys fresh per recipe, like json.load does
+        chosen = rng.sample(INGREDIENTS, rng.randint(2, 5))
+        weights = [rng.randint(1, 10) for _ in chosen]
+        total = sum(weights)
+        recipes[f"Cocktail {i}"] = {
+            "image": f"/assets/cocktail_{i}.jpg",
+            "glass_size": 400,
+            "ingredients": {"".join(ing): 100 * w / total for ing, w in zip(chosen, weights)},
+        }
+    return recipes
+
+
+def measure(build):
+    """Return (result, peak bytes, seconds) for building a structure"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def ml_table_dicts(recipes, glass_size):
+    return {name: {ing: pct / 100 * glass_size for ing, pct in data["ingredients"].items()}
+            for name, data in recipes.items()}
+
+
+def ml_table_store(store, glass_size):
+    factor = glass_size / 100
+    return {recipe.name: [pct * factor for pct in recipe.percentages] for recipe in store}
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+
+    dicts, dict_bytes, dict_time = measure(lambda: make_recipe_dicts(count))
+    store, store_bytes, store_time = measure(lambda: RecipeStore.from_dicts(make_recipe_dicts(count)))
+
+    start = time.perf_counter()
+    ml_table_dicts(dicts, 400)
+    dict_iter = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ml_table_store(store, 400)
+    store_iter = time.perf_counter() - start
+
+    start = time.perf_counter()
+    RecipeStore.from_dicts(dicts)
+    convert_time = time.perf_counter() - start
+
+    print(f"Recipes:                 {count}")
+    print(f"Nested dicts memory:     {dict_bytes / 1024:10.1f} KiB")
+    print(f"RecipeStore memory:      {store_bytes / 1024:10.1f} KiB ({store_bytes / dict_bytes:.0%})")
+    print(f"Load from dicts:         {convert_time * 1000:10.1f} ms ({count / convert_time:,.0f} recipes/s)")
+    print(f"ml table (dicts):        {dict_iter * 1000:10.1f} ms")
+    print(f"ml table (RecipeStore):  {store_iter * 1000:10.1f} ms")
+    print(f"Build (dicts / store):   {dict_time * 1000:.1f} ms / {store_time * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""Latency benchmark for RecipeSearchIndex on a large synthetic catalog
+
+Run with `python benchmarks/bench_recipe_search.py [num_recipes]`.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from recipe_model import RecipeStore
+from recipe_search import RecipeSearchIndex
+from bench_recipe_model import INGREDIENTS, make_recipe_dicts
+
+QUERIES = [
+    ("empty query", dict()),
+    ("prefix 'Cocktail 12'", dict(query="Cocktail 12")),
+    ("prefix '999'", dict(query="999")),
+    ("fuzzy 'coktail 4711'", dict(query="coktail 4711")),
+    ("without Zutat 0", dict(exclude=["Zutat 0"])),
+    ("with Zutat 1 + Zutat 2", dict(include=["Zutat 1", "Zutat 2"])),
+    ("makeable with 10 slots", dict(loaded=set(INGREDIENTS[:10]))),
+    ("prefix + makeable, limit 20", dict(query="Cocktail 1", loaded=set(INGREDIENTS[:30]), limit=20)),
+]
+
+
+def per_call(func, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    store = RecipeStore.from_dicts(make_recipe_dicts(count))
+
+    start = time.perf_counter()
+    index = RecipeSearchIndex(store)
+    print(f"Index build ({count} recipes): {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for label, kwargs in QUERIES:
+        hits = len(index.search(**kwargs))
+        print(f"{label:32} {per_call(lambda: index.search(**kwargs)) * 1e6:9.1f} us  ({hits} hits)")
+
+    recipe = store["Cocktail 0"]
+    print(f"{'incremental remove + add':32} {per_call(lambda: (index.remove(recipe.name), index.add(recipe))) * 1e6:9.1f} us")
+
+
+if __name__ == "__main__":
+    main()
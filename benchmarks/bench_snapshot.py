@@ -0,0 +1,59 @@
+"""Cold boot from the JSON files versus warm boot from the startup snapshot
+
+Run with `python benchmarks/bench_snapshot.py [recipes ...]`. The cold path
+parses the JSON files, builds the pour matrix and decodes and scales the grid
+images, as MainWindow does without a snapshot; the warm path maps the
+snapshot and reads the same state from it. Runs without a display, so only
+the PIL side of the thumbnails is timed, not the Tk PhotoImage.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from suite import Catalog, measure, read_menu
+from startup_snapshot import (open_snapshot, source_stamps, make_thumbnail, SnapshotWriter,
+                              SNAPSHOT_FILE, THUMBNAIL_LIMIT)
+from pour_matrix import PourMatrix
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [3, 100, 1000, 5000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            catalog = Catalog(size, tmp)
+            data_dir = catalog.data_dir
+            path = os.path.join(data_dir, SNAPSHOT_FILE)
+            images = list(dict.fromkeys(recipe["image"] for recipe in catalog.recipes.values()))[:THUMBNAIL_LIMIT]
+
+            def cold():
+                ingredients, store, _, _ = read_menu(data_dir)
+                PourMatrix(store, ingredients).available()
+                for image in images:
+                    make_thumbnail(image).load()
+
+            writer = SnapshotWriter(path, data_dir, lambda: read_menu(data_dir))
+            start = time.perf_counter()
+            writer.build()
+            build = time.perf_counter() - start
+            writer.close()
+
+            def warm():
+                snapshot = open_snapshot(path)
+                assert snapshot.is_current(source_stamps(data_dir))
+                store = snapshot.recipe_store()
+                snapshot.pour_matrix(store).available()
+                for image in images:
+                    snapshot.thumbnail(image, os.stat(image).st_mtime_ns).load()
+
+            cold_ms = statistics.median(measure(cold)) * 1000
+            warm_ms = statistics.median(measure(warm)) * 1000
+            print(f"{size:>6} recipes: cold {cold_ms:8.2f} ms, warm {warm_ms:8.2f} ms "
+                  f"({cold_ms / warm_ms:4.1f}x), snapshot {os.path.getsize(path) / 1024:7.0f} KiB "
+                  f"built in {build * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Time to the first frame of the customer tab
+
+Run with `python benchmarks/bench_startup.py [recipes ...]`. Every run starts
+a fresh Python process that imports complex_main, creates the MainWindow on a
+synthetic catalog and draws it once; the time until the window is on screen
+is what a guest waits after the Pi boots. Each size is measured as a cold
+boot, right after the JSON files changed so there is no current startup
+snapshot, and as a warm boot from the snapshot. The thumbnail pack is built
+by a first, unmeasured run in both cases, and the OS page cache is warm.
+With `--eager` all admin sections are built before the first frame too, as
+before they became lazy.
+
+Xvfb is started if DISPLAY is not set. Without either, or with
+`--headless`, the processes import complex_main and load the menu and the
+grid thumbnails as MainWindow does (suite.boot_menu) but create no window,
+so the time Tk needs for the widgets and photo images is not included.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from suite import Catalog, boot_menu, ensure_display, read_menu, SRC_DIR
+from startup_snapshot import SnapshotWriter, SNAPSHOT_FILE
+
+
+def child(data_dir, eager):
+    # Runs in the fresh process; everything from the first import on is measured
+    start = time.perf_counter()
+    sys.path.insert(0, SRC_DIR)
+    import complex_main
+    imported = time.perf_counter()
+    app = complex_main.MainWindow(data_dir=data_dir)
+    if eager:
+        for index in range(len(app.admin_sections)):
+            app.build_admin_section(index)
+    built = time.perf_counter()
+    app.root.update()
+    drawn = time.perf_counter()
+    print(json.dumps({"import": imported - start, "build": built - imported, "draw": drawn - built}), flush=True)
+    app.root.destroy()
+
+
+def headless_child(data_dir):
+    # The same imports and data path, up to the thumbnails Tk would get
+    start = time.perf_counter()
+    sys.path.insert(0, SRC_DIR)
+    import complex_main
+    imported = time.perf_counter()
+    recipes, thumbnail, _ = boot_menu(data_dir)
+    # MainWindow's thumbnail cache decodes every image once
+    thumbnails = {}
+    for name in recipes.names():
+        image = recipes[name].image
+        if image not in thumbnails:
+            thumbnails[image] = thumbnail(image)
+    built = time.perf_counter()
+    print(json.dumps({"import": imported - start, "build": built - imported, "draw": 0.0}), flush=True)
+
+
+def run(data_dir, eager, headless=False):
+    """Return (wall seconds until the first frame, breakdown from the process)"""
+    command = [sys.executable, os.path.abspath(__file__), "--child", data_dir]
+    command += ["--eager"] if eager else []
+    command += ["--headless"] if headless else []
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    wall = time.perf_counter() - start
+    process.wait()
+    if not line:
+        raise RuntimeError(f"Startprozess ist mit Code {process.returncode} beendet")
+    return wall, json.loads(line)
+
+
+def prepare(data_dir, warm):
+    """Write a current snapshot for a warm boot, or remove it for a cold one"""
+    path = os.path.join(data_dir, SNAPSHOT_FILE)
+    if warm:
+        writer = SnapshotWriter(path, data_dir, lambda: read_menu(data_dir))
+        writer.build()
+        writer.close()
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", type=int, nargs="*", default=[3, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--eager", action="store_true", help="Also build the admin sections before the first frame")
+    parser.add_argument("--headless", action="store_true", help="Measure without a window, even with a display")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        if args.headless:
+            headless_child(args.child)
+        else:
+            child(args.child, args.eager)
+        return
+
+    xvfb = None
+    headless = args.headless
+    if not headless:
+        xvfb, error = ensure_display()
+        if error:
+            print(f"{error}; measuring without a window, Tk widgets not included")
+            headless = True
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            modes = [False, True] if args.eager and not headless else [False]
+            for size in args.sizes:
+                catalog = Catalog(size, tmp)
+                # Packs the thumbnails, which survive changes to the JSON files
+                run(catalog.data_dir, False, headless)
+                for warm in (False, True):
+                    for eager in modes:
+                        runs = []
+                        for _ in range(args.repeat):
+                            prepare(catalog.data_dir, warm)
+                            runs.append(run(catalog.data_dir, eager, headless))
+                        wall = statistics.median(wall for wall, _ in runs)
+                        parts = {key: statistics.median(parts[key] for _, parts in runs) * 1000
+                                 for key in ("import", "build", "draw")}
+                        label = ("warm" if warm else "cold") + (", eager" if eager else "")
+                        if headless:
+                            print(f"{size:>6} recipes, {label + ':':<12} menu loaded {wall * 1000:8.1f} ms "
+                                  f"(import {parts['import']:.1f}, menu and thumbnails {parts['build']:.1f} ms)")
+                        else:
+                            print(f"{size:>6} recipes, {label + ':':<12} first frame {wall * 1000:8.1f} ms "
+                                  f"(import {parts['import']:.1f}, MainWindow {parts['build']:.1f}, "
+                                  f"draw {parts['draw']:.1f} ms)")
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+
+if __name__ == "__main__":
+    main()
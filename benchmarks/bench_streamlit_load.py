@@ -0,0 +1,524 @@
+"""Load test for the Streamlit frontend: how many tablets can one server take?
+
+Run with:
+    python benchmarks/bench_streamlit_load.py                          # 1, 5, 10, 20, 40 sessions
+    python benchmarks/bench_streamlit_load.py --sessions 10 50 100 --duration 60 --output load.json
+    python benchmarks/bench_streamlit_load.py --url http://127.0.0.1:8501 --pid 1234
+
+Starts `streamlit run 1_🏠_APP.py` on a free local port (or uses --url) and
+drives simulated tablets against it over Streamlit's own websocket protocol,
+the way the browser does. Every session opens the app and then keeps
+browsing (typing a search), ordering (clicking a cocktail button) and
+editing (changing a recipe on the admin page), with a random think time in
+between. Each step runs its number of sessions in parallel for --duration
+seconds.
+
+For every step the report holds the rerun latency percentiles (from sending
+a widget change until the script run has finished; opening the app is only
+listed per action), reruns per second, failed reruns, and the server's CPU
+use and peak RSS read from /proc. The capacity is the largest step whose p95
+stays below --target-p95 without failures.
+
+Everything runs locally and offline: the websocket client is a small asyncio
+implementation and the messages are the protobufs that ship with Streamlit.
+All sessions share this one process; if it uses a whole core, the client
+rather than the server is the limit.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import random
+import shutil
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_FILE = os.path.join(ROOT_DIR, "1_🏠_APP.py")
+STREAM_PATH = "/_stcore/stream"
+HEALTH_PATH = "/_stcore/health"
+
+DEFAULT_SESSIONS = [1, 5, 10, 20, 40]
+# Share of the actions of a session
+DEFAULT_MIX = {"browse": 0.5, "order": 0.4, "edit": 0.1}
+SEARCH_TERMS = ["", "gin", "spritz", "lillet", "aperol", "tonic", "secco", "berry"]
+# A rerun that takes longer than this counts as failed
+RERUN_TIMEOUT = 30.0
+
+
+# Websocket client -------------------------------------------------------------
+
+class WebSocket:
+    """Minimal client side of RFC 6455 for binary messages"""
+
+    GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, host, port, path, subprotocol="streamlit"):
+        reader, writer = await asyncio.open_connection(host, port)
+        key = base64.b64encode(os.urandom(16))
+        writer.write(b"GET %s HTTP/1.1\r\nHost: %s:%d\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                     b"Sec-WebSocket-Key: %s\r\nSec-WebSocket-Version: 13\r\nSec-WebSocket-Protocol: %s\r\n\r\n"
+                     % (path.encode(), host.encode(), port, key, subprotocol.encode()))
+        response = await reader.readuntil(b"\r\n\r\n")
+        status, _, header_lines = response.decode("latin-1").partition("\r\n")
+        headers = {name.strip().lower(): value.strip() for name, _, value in
+                   (line.partition(":") for line in header_lines.split("\r\n") if line)}
+        accept = base64.b64encode(hashlib.sha1(key + cls.GUID).digest()).decode()
+        if " 101 " not in status or headers.get("sec-websocket-accept") != accept:
+            writer.close()
+            raise ConnectionError(f"Websocket handshake failed: {status}")
+        return cls(reader, writer)
+
+    async def send(self, data, opcode=0x2):
+        # Client frames are always masked
+        header = bytearray([0x80 | opcode])
+        length = len(data)
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 1 << 16:
+            header.append(0x80 | 126)
+            header += struct.pack("!H", length)
+        else:
+            header.append(0x80 | 127)
+            header += struct.pack("!Q", length)
+        mask = os.urandom(4)
+        payload = (np.frombuffer(data, dtype=np.uint8) ^ np.resize(np.frombuffer(mask, dtype=np.uint8), length)
+                   if length else b"")
+        self.writer.write(bytes(header) + mask + bytes(payload))
+        await self.writer.drain()
+
+    async def recv(self):
+        """Return the next complete data message; answers pings on the way"""
+        message = bytearray()
+        while True:
+            first, second = await self.reader.readexactly(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length, = struct.unpack("!H", await self.reader.readexactly(2))
+            elif length == 127:
+                length, = struct.unpack("!Q", await self.reader.readexactly(8))
+            payload = await self.reader.readexactly(length)
+            if opcode == 0x8:
+                raise ConnectionError("Websocket closed by the server")
+            if opcode == 0x9:
+                await self.send(payload, opcode=0xA)
+                continue
+            if opcode == 0xA:
+                continue
+            message += payload
+            if first & 0x80:
+                return bytes(message)
+
+    async def close(self):
+        try:
+            await self.send(b"", opcode=0x8)
+        except (ConnectionError, OSError):
+            pass
+        self.writer.close()
+
+
+# Simulated tablet --------------------------------------------------------------
+
+class Session:
+    """One browser tab talking to the server
+
+    Keeps the widgets of the last run and the values the "user" entered, and
+    sends them with every rerun like the frontend does.
+    """
+
+    def __init__(self, host, port, rng, record):
+        self.host = host
+        self.port = port
+        self.rng = rng
+        self.record = record         # record(action, seconds, ok)
+        self.ws = None
+        self.pages = {}              # page name -> script hash
+        self.page = ""               # script hash of the page shown, "" for the main page
+        self.widgets = {}            # id -> (type, element proto) of the last run
+        self.values = {}             # page hash -> {id: WidgetState}
+
+    async def open(self):
+        """Load the app; the recipes are only in the session once the admin page ran"""
+        self.ws = await WebSocket.connect(self.host, self.port, STREAM_PATH)
+        await self.rerun("open")
+        admin_page = self.page_hash("ADMIN")
+        if admin_page is not None:
+            await self.rerun("open", page=admin_page)
+        await self.show_main_page("open")
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self, action, page=None, value=None, trigger=None):
+        """Rerun the page with a changed widget value or a button click; records the latency"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        if page is not None and page != self.page:
+            self.page = page
+            self.widgets = {}
+        values = self.values.setdefault(self.page, {})
+        if value is not None:
+            values[value.id] = value
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.query_string = ""
+        state.page_script_hash = self.page
+        for widget_state in values.values():
+            state.widget_states.widgets.append(widget_state)
+        if trigger is not None:
+            clicked = state.widget_states.widgets.add()
+            clicked.id = trigger
+            clicked.trigger_value = True
+
+        start = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        widgets = {}
+        ok = True
+        try:
+            while True:
+                forward = ForwardMsg()
+                forward.ParseFromString(await asyncio.wait_for(self.ws.recv(), RERUN_TIMEOUT))
+                kind = forward.WhichOneof("type")
+                if kind == "navigation":
+                    self.pages = {page.page_name: page.page_script_hash for page in forward.navigation.app_pages}
+                    if not self.page:
+                        self.page = forward.navigation.page_script_hash
+                        self.values[self.page] = self.values.pop("", {})
+                elif kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                    element = forward.delta.new_element
+                    element_type = element.WhichOneof("type")
+                    if element_type == "exception":
+                        ok = False
+                    elif element_type in ("button", "text_input", "number_input"):
+                        widget = getattr(element, element_type)
+                        widgets[widget.id] = (element_type, widget)
+                elif kind == "script_finished":
+                    status = forward.script_finished
+                    if status == ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                        # st.rerun(); the next run follows on its own
+                        widgets = {}
+                        continue
+                    ok = ok and status != ForwardMsg.FINISHED_WITH_COMPILE_ERROR
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, OSError):
+            ok = False
+            raise
+        finally:
+            self.record(action, time.perf_counter() - start, ok)
+        self.widgets = widgets
+
+    def page_hash(self, name):
+        return self.pages.get(name)
+
+    def find(self, element_type, predicate=lambda widget: True):
+        return [widget for kind, widget in self.widgets.values() if kind == element_type and predicate(widget)]
+
+    # Actions ---------------------------------------------------------------------
+
+    async def show_main_page(self, action="navigate"):
+        main_page = self.page_hash("APP")
+        if main_page is not None and self.page != main_page:
+            await self.rerun(action, page=main_page)
+
+    async def browse(self):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        await self.show_main_page()
+        inputs = self.find("text_input", lambda widget: widget.label.startswith("Suche"))
+        if not inputs:
+            return await self.rerun("browse")
+        value = WidgetState(id=inputs[0].id, string_value=self.rng.choice(SEARCH_TERMS))
+        await self.rerun("browse", value=value)
+
+    async def order(self):
+        await self.show_main_page()
+        buttons = self.find("button", lambda widget: "btn_" in widget.id and not widget.disabled)
+        if not buttons:
+            # Nothing to click with the current search; clear it first
+            return await self.browse()
+        await self.rerun("order", trigger=self.rng.choice(buttons).id)
+
+    async def edit(self):
+        """Move a few percent from one ingredient of a recipe to another on the admin page"""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        admin_page = self.page_hash("ADMIN")
+        if admin_page is None:
+            return await self.browse()
+        if self.page != admin_page:
+            await self.rerun("navigate", page=admin_page)
+        values = self.values.setdefault(self.page, {})
+        recipes = {}
+        for widget in self.find("number_input", lambda widget: widget.label.endswith("(%):")):
+            # Widget keys are "<cocktail>_<ingredient>"; the id ends with the key
+            key = widget.id.split("-", 2)[-1]
+            cocktail, _, _ = key.rpartition("_")
+            if cocktail and cocktail != "new":
+                recipes.setdefault(cocktail, []).append(widget)
+        recipes = [inputs for inputs in recipes.values() if len(inputs) >= 2]
+        if not recipes:
+            return await self.rerun("edit")
+        give, take = self.rng.sample(self.rng.choice(recipes), 2)
+        current = {widget.id: values[widget.id].double_value if widget.id in values else widget.default
+                   for widget in (give, take)}
+        amount = min(self.rng.choice([0.5, 1.0, 2.0]), current[give.id])
+        values[give.id] = WidgetState(id=give.id, double_value=round(current[give.id] - amount, 1))
+        await self.rerun("edit", value=WidgetState(id=take.id, double_value=round(current[take.id] + amount, 1)))
+
+    async def run(self, stop_at, think, mix):
+        actions = list(mix)
+        weights = [mix[action] for action in actions]
+        loop = asyncio.get_running_loop()
+        await self.open()
+        while loop.time() < stop_at:
+            await asyncio.sleep(min(self.rng.expovariate(1 / think) if think > 0 else 0,
+                                    max(0.0, stop_at - loop.time())))
+            if loop.time() >= stop_at:
+                break
+            await getattr(self, self.rng.choices(actions, weights)[0])()
+
+
+# Server and its resources -----------------------------------------------------
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port, data_dir):
+    """Start `streamlit run` on the app, headless and without telemetry
+
+    The app's metrics file and image variants go to data_dir instead of data/.
+    """
+    env = dict(os.environ, MIXMASTERX_METRICS_PORT="0", MIXMASTERX_DATA_DIR=data_dir)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_FILE, "--server.headless=true",
+         f"--server.port={port}", "--server.address=127.0.0.1", "--browser.gatherUsageStats=false",
+         "--server.fileWatcherType=none", "--server.runOnSave=false"],
+        cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Streamlit ist mit Code {process.returncode} beendet")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}{HEALTH_PATH}", timeout=1) as response:
+                if response.status == 200:
+                    return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Streamlit hat nicht innerhalb von 60 s geantwortet")
+
+
+class ResourceSampler:
+    """Samples CPU time and RSS of a process from /proc on a background thread"""
+
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.page_size = os.sysconf("SC_PAGE_SIZE")
+        self._samples = []           # (monotonic time, cpu seconds, rss bytes)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+
+    def sample(self):
+        try:
+            with open(f"/proc/{self.pid}/stat", 'r') as f:
+                # The command name may contain spaces; the fields after it don't
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{self.pid}/statm", 'r') as f:
+                rss = int(f.read().split()[1]) * self.page_size
+        except (OSError, ValueError, IndexError):
+            return None
+        return time.monotonic(), (int(fields[11]) + int(fields[12])) / self.ticks, rss
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            sample = self.sample()
+            if sample is not None:
+                with self._lock:
+                    self._samples.append(sample)
+
+    def window(self, start, end):
+        """Return (CPU % of one core, peak RSS MB) between two monotonic times"""
+        with self._lock:
+            samples = [sample for sample in self._samples if start <= sample[0] <= end]
+        if len(samples) < 2:
+            return 0.0, max((rss for _, _, rss in samples), default=0) / (1024 * 1024)
+        cpu = (samples[-1][1] - samples[0][1]) / (samples[-1][0] - samples[0][0]) * 100
+        return cpu, max(rss for _, _, rss in samples) / (1024 * 1024)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+# Steps and report ----------------------------------------------------------------
+
+async def run_step(host, port, sessions, duration, think, mix, seed):
+    """Run `sessions` tablets for `duration` seconds; returns the recorded reruns"""
+    reruns = []                      # (action, seconds, ok)
+    errors = []
+    loop = asyncio.get_running_loop()
+    stop_at = loop.time() + duration
+
+    async def tablet(index):
+        session = Session(host, port, random.Random(seed * 100003 + index),
+                          lambda action, seconds, ok: reruns.append((action, seconds, ok)))
+        try:
+            await session.run(stop_at, think, mix)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            errors.append(f"{type(e).__name__}: {e}")
+        finally:
+            await session.close()
+
+    await asyncio.gather(*(tablet(index) for index in range(sessions)))
+    return reruns, errors
+
+
+def summarize(sessions, reruns, errors, seconds, cpu, rss_mb):
+    # Opening the app is a one-off per tablet; it is only listed per action
+    latencies = np.array([latency for action, latency, ok in reruns if ok and action != "open"]) * 1000
+    failed = sum(1 for _, _, ok in reruns if not ok)
+    percentile = lambda q: round(float(np.percentile(latencies, q)), 1) if len(latencies) else None
+    by_action = {}
+    for action in sorted({action for action, _, _ in reruns}):
+        times = np.array([latency for name, latency, ok in reruns if name == action and ok]) * 1000
+        by_action[action] = {"reruns": len(times),
+                             "p50_ms": round(float(np.percentile(times, 50)), 1) if len(times) else None,
+                             "p95_ms": round(float(np.percentile(times, 95)), 1) if len(times) else None}
+    return {
+        "sessions": sessions,
+        "reruns": len(reruns),
+        "reruns_per_s": round(len(reruns) / seconds, 1),
+        "failed": failed + len(errors),
+        "p50_ms": percentile(50),
+        "p95_ms": percentile(95),
+        "p99_ms": percentile(99),
+        "max_ms": round(float(latencies.max()), 1) if len(latencies) else None,
+        "server_cpu_percent": round(cpu, 1),
+        "server_peak_rss_mb": round(rss_mb, 1),
+        "actions": by_action,
+        "errors": errors[:5],
+    }
+
+
+def capacity(steps, target_p95_ms):
+    """Return the largest session count that met the target, or 0"""
+    good = [step["sessions"] for step in steps
+            if not step["failed"] and step["p95_ms"] is not None and step["p95_ms"] <= target_p95_ms]
+    return max(good, default=0)
+
+
+def print_report(steps, target_p95_ms):
+    print(f"{'sessions':>8} {'reruns/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'failed':>7} {'CPU %':>7} {'RSS MB':>8}")
+    for step in steps:
+        fmt = lambda value: f"{value:8.1f}" if value is not None else f"{'-':>8}"
+        print(f"{step['sessions']:>8} {step['reruns_per_s']:>9.1f} {fmt(step['p50_ms'])} {fmt(step['p95_ms'])} "
+              f"{fmt(step['p99_ms'])} {step['failed']:>7} {step['server_cpu_percent']:>7.1f} "
+              f"{step['server_peak_rss_mb']:>8.1f}")
+    for step in steps:
+        for error in step["errors"]:
+            print(f"  {step['sessions']} sessions: {error}")
+    supported = capacity(steps, target_p95_ms)
+    if supported:
+        print(f"Capacity: {supported} concurrent sessions with p95 <= {target_p95_ms:g} ms and no failures")
+    else:
+        print(f"Capacity: no step met p95 <= {target_p95_ms:g} ms without failures")
+    return supported
+
+
+def parse_mix(items):
+    mix = dict(DEFAULT_MIX)
+    for item in items or ():
+        action, _, share = item.partition("=")
+        if action not in DEFAULT_MIX:
+            raise SystemExit(f"Unbekannte Aktion: {action}")
+        mix[action] = float(share)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=DEFAULT_SESSIONS,
+                        help="Concurrent sessions per step")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per step")
+    parser.add_argument("--think", type=float, default=2.0, help="Mean think time between actions (s)")
+    parser.add_argument("--mix", nargs="*", metavar="ACTION=SHARE",
+                        help="Action mix, e.g. browse=0.5 order=0.4 edit=0.1")
+    parser.add_argument("--target-p95", type=float, default=500.0, help="p95 rerun latency target (ms)")
+    parser.add_argument("--url", help="Use a running local server instead of starting one")
+    parser.add_argument("--pid", type=int, help="Server process to sample with --url")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write the report as JSON")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    server = None
+    data_dir = None
+    if args.url:
+        url = urllib.parse.urlsplit(args.url)
+        host, port, pid = url.hostname, url.port or 80, args.pid
+    else:
+        host, port = "127.0.0.1", free_port()
+        data_dir = tempfile.mkdtemp(prefix="mixmasterx-load-")
+        try:
+            server = start_server(port, data_dir)
+        except Exception:
+            shutil.rmtree(data_dir, ignore_errors=True)
+            raise
+        pid = server.pid
+    sampler = ResourceSampler(pid).start() if pid is not None else None
+    steps = []
+    try:
+        for sessions in args.sessions:
+            start = time.monotonic()
+            reruns, errors = asyncio.run(run_step(host, port, sessions, args.duration, args.think, mix,
+                                                  args.seed + len(steps)))
+            end = time.monotonic()
+            cpu, rss_mb = sampler.window(start, end) if sampler is not None else (0.0, 0.0)
+            steps.append(summarize(sessions, reruns, errors, end - start, cpu, rss_mb))
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        if server is not None:
+            server.terminate()
+            server.wait()
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    supported = print_report(steps, args.target_p95)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"target_p95_ms": args.target_p95, "duration_s": args.duration, "think_s": args.think,
+                       "mix": mix, "capacity_sessions": supported, "steps": steps}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark: alternatives for drinks that can't be made
+
+Run with `python benchmarks/bench_substitutions.py [num_recipes ...]`.
+Only the first ten of the synthetic ingredients are loaded, so most drinks
+need an alternative. Compares one suggestion computed with per-dict loops
+over the catalog with the precomputed SubstitutionEngine, and times the
+batch for a full grid.
+"""
+import math
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from suite import measure
+from bench_recipe_model import INGREDIENTS, make_recipe_dicts
+from recipe_model import RecipeStore
+from pour_matrix import PourMatrix, NUM_SLOTS
+from substitutions import SubstitutionEngine, MIN_SIMILARITY
+
+SLOTS = {name: i + 1 for i, name in enumerate(INGREDIENTS[:NUM_SLOTS])}
+# Pairs of the unloaded ingredients may stand in for each other or for a loaded one
+GROUPS = [[INGREDIENTS[i], INGREDIENTS[i + NUM_SLOTS]] for i in range(0, 2 * NUM_SLOTS, 2)]
+
+
+def loops(recipes, name):
+    """Most similar makeable drink by comparing the recipe dicts one by one"""
+    def norm(ingredients):
+        return math.sqrt(sum(pct * pct for pct in ingredients.values()))
+
+    target = recipes[name]["ingredients"]
+    target_norm = norm(target)
+    best, best_score = None, MIN_SIMILARITY
+    for other, data in recipes.items():
+        ingredients = data["ingredients"]
+        if other == name or any(ing not in SLOTS for ing in ingredients):
+            continue
+        score = sum(pct * ingredients.get(ing, 0.0) for ing, pct in target.items()) / (target_norm * norm(ingredients))
+        if score > best_score:
+            best, best_score = other, score
+    return best
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100, 1000, 5000]
+    for size in sizes:
+        recipes = make_recipe_dicts(size)
+        store = RecipeStore.from_dicts(recipes)
+        matrix = PourMatrix(store, SLOTS)
+        build_ms = statistics.median(measure(lambda: SubstitutionEngine(matrix, GROUPS))) * 1000
+        engine = SubstitutionEngine(matrix, GROUPS)
+        missing = [name for name in store.names() if not engine.makeable[matrix.row_of[name]]]
+        name = missing[0]
+
+        loop_ms = statistics.median(measure(lambda: loops(recipes, name))) * 1000
+        engine_ms = statistics.median(measure(lambda: engine.suggest(name))) * 1000
+        grid_ms = statistics.median(measure(lambda: engine.best_alternatives(store.names()))) * 1000
+        found = len(engine.best_alternatives(store.names()))
+        print(f"{size:>6} recipes ({len(missing)} not makeable): build {build_ms:7.2f} ms, "
+              f"one drink loops {loop_ms:8.2f} ms vs engine {engine_ms:6.3f} ms, "
+              f"whole grid {grid_ms:7.2f} ms ({found} alternatives)")
+
+
+if __name__ == "__main__":
+    main()
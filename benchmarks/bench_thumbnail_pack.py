@@ -0,0 +1,54 @@
+"""JPEG decoding versus the packed thumbnail tiles
+
+Run with `python benchmarks/bench_thumbnail_pack.py [images]`. Compares
+loading every grid thumbnail by decoding and scaling its JPEG with reading
+the tiles from data/thumbnails.pack, and times repacking after one image
+changed. Runs without a display; the Tk side (handing the PPM bytes to a
+photo image) is not included.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from suite import make_images, measure
+from thumbnail_pack import ThumbnailPack, make_tile, GRID_SIZE, DISPLAY_SIZE
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    with tempfile.TemporaryDirectory() as tmp:
+        images = make_images(os.path.join(tmp, "assets"), count)
+        data_dir = os.path.join(tmp, "data")
+
+        def decode():
+            for image in images:
+                make_tile(image, GRID_SIZE)
+
+        pack = ThumbnailPack(data_dir)
+        start = time.perf_counter()
+        pack.update(images, [GRID_SIZE, DISPLAY_SIZE])
+        initial = time.perf_counter() - start
+
+        def read_pack():
+            # A fresh process: open the index, map the pack, copy out every tile
+            fresh = ThumbnailPack(data_dir)
+            for image in images:
+                bytes(fresh.get(image, GRID_SIZE))
+
+        decode_ms = statistics.median(measure(decode)) * 1000
+        pack_ms = statistics.median(measure(read_pack)) * 1000
+        print(f"{count} images: decode {decode_ms:8.2f} ms, pack {pack_ms:8.2f} ms ({decode_ms / pack_ms:.0f}x)")
+
+        time.sleep(0.01)
+        os.utime(images[0])
+        start = time.perf_counter()
+        written = pack.update(images, [GRID_SIZE, DISPLAY_SIZE])
+        print(f"initial pack {initial * 1000:.0f} ms, repack after one change {written} tiles in "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms, pack {os.path.getsize(pack.path) / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,411 @@
+"""Reproducible benchmark suite for the render, persistence and pour-planning hot paths
+
+Run with:
+    python benchmarks/suite.py                          # all sizes, compare to baseline
+    python benchmarks/suite.py --sizes 3 100 --only tk  # subset
+    python benchmarks/suite.py --save-baseline          # store the results as new baseline
+
+Every benchmark runs against synthetic catalogs in a temporary directory.
+The Streamlit pages start their metrics file and image variants there too
+(MIXMASTERX_DATA_DIR), with the metrics endpoint off, so the real data/
+files are never touched. Tk benchmarks need a display; if
+DISPLAY is not set and Xvfb is installed, the suite starts one itself.
+Streamlit pages are run headless through streamlit.testing.
+
+Results are written as JSON. When a baseline exists, every benchmark whose
+median is more than --tolerance slower than the baseline is reported as a
+regression and the exit code is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+sys.path.insert(0, SRC_DIR)
+
+DEFAULT_SIZES = [3, 100, 1000, 5000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# The admin page renders one expander per recipe; AppTest needs minutes
+# beyond this size, so larger catalogs only run the other benchmarks
+ADMIN_MAX_RECIPES = 1000
+
+INGREDIENTS = {
+    "Aperol": 1,
+    "Lillet": 2,
+    "Schweppes Raspberry": 3,
+    "Secco": 4,
+    "Mineralwasser": 5,
+    "Gin": 6,
+    "Tonic": 7
+}
+
+
+def measure(func, setup=None, repeat=5, budget=2.0):
+    """Run `func` up to `repeat` times within a time budget and return the durations
+
+    `setup` runs untimed before every call. At least one run always happens.
+    """
+    durations = []
+    spent = 0.0
+    while len(durations) < repeat and (not durations or spent < budget):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        durations.append(elapsed)
+        spent += elapsed
+    return durations
+
+
+class Catalog:
+    """A synthetic catalog of `size` recipes written to a temporary data dir"""
+
+    def __init__(self, size, tmp_dir, seed=42):
+        self.size = size
+        self.data_dir = os.path.join(tmp_dir, f"data_{size}")
+        self.assets_dir = os.path.join(tmp_dir, "assets")
+        os.makedirs(self.data_dir, exist_ok=True)
+        self.images = make_images(self.assets_dir)
+
+        rng = random.Random(seed)
+        names = list(INGREDIENTS)
+        self.recipes = {}
+        for i in range(size):
+            chosen = rng.sample(names, rng.randint(2, 4))
+            weights = [rng.randint(1, 9) for _ in chosen]
+            percentages = [round(100 * w / sum(weights), 1) for w in weights]
+            percentages[0] = round(percentages[0] + 100 - sum(percentages), 1)
+            self.recipes[f"Cocktail {i}"] = {
+                "image": self.images[i % len(self.images)],
+                "glass_size": 400,
+                "ingredients": dict(zip(chosen, percentages))
+            }
+        self.write()
+
+    def write(self):
+        with open(os.path.join(self.data_dir, "ingredients.json"), 'w') as f:
+            json.dump(INGREDIENTS, f, indent=4)
+        with open(os.path.join(self.data_dir, "recipes.json"), 'w') as f:
+            json.dump(self.recipes, f, indent=4)
+        with open(os.path.join(self.data_dir, "glass_size.json"), 'w') as f:
+            json.dump({"glass_size": 400}, f, indent=4)
+
+
+def make_images(assets_dir, count=8):
+    """Create a few 700x933 JPEGs like the ones the admin pages store"""
+    from PIL import Image
+
+    os.makedirs(assets_dir, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(assets_dir, f"synthetic_{i}.jpg")
+        if not os.path.exists(path):
+            Image.new("RGB", (700, 933), (40 * i % 256, 90, 160)).save(path, format='JPEG', quality=95)
+        paths.append(path)
+    return paths
+
+
+# Pour planning and data model -------------------------------------------------
+
+def bench_core(catalog):
+    from recipe_model import RecipeStore, IngredientRegistry
+    from pour_matrix import PourMatrix
+    from recipe_search import RecipeSearchIndex
+    from recipe_domain import validate_catalog
+
+    store = RecipeStore.from_dicts(catalog.recipes, IngredientRegistry(INGREDIENTS))
+    matrix = PourMatrix(store, INGREDIENTS)
+    glass_sizes = list(range(100, 1001, 50))
+    return {
+        "core.recipe_store_load": measure(lambda: RecipeStore.from_dicts(catalog.recipes)),
+        "core.pour_matrix_build": measure(lambda: PourMatrix(store, INGREDIENTS)),
+        "core.pour_plan_all_glass_sizes": measure(lambda: (matrix.ml_amounts(glass_sizes),
+                                                           matrix.slot_demand(glass_sizes))),
+        "core.search_index_build": measure(lambda: RecipeSearchIndex(store)),
+        "core.validate_catalog": measure(lambda: validate_catalog(store)),
+    }
+
+
+# Tk frontends -----------------------------------------------------------------
+
+def bench_tk(catalog):
+    import tkinter as tk
+    from tkinter import ttk
+    import complex_main
+    import main as display_main
+
+    results = {}
+    app = complex_main.MainWindow(data_dir=catalog.data_dir)
+    try:
+        app.root.update()
+
+        def render_grid():
+            app.update_cocktail_grid()
+            app.root.update_idletasks()
+        results["tk.update_cocktail_grid"] = measure(render_grid)
+
+        frames = []
+
+        def new_frame():
+            for frame in frames:
+                frame.destroy()
+            frames[:] = [ttk.Frame(app.root)]
+
+        def build_recipes_tab():
+            app.setup_existing_recipes_tab(frames[0])
+            app.root.update_idletasks()
+        results["tk.setup_existing_recipes_tab"] = measure(build_recipes_tab, setup=new_frame)
+
+        # Every recipe, as when the whole catalog is saved at once
+        results["tk.save_data"] = measure(lambda: app.save_data(recipes=app.recipes.names()))
+        results["tk.load_data"] = measure(app.load_data)
+    finally:
+        app.root.destroy()
+
+    # The display app always shows its three bundled images
+    root = tk.Tk()
+    try:
+        display = display_main.CocktailDisplayApp(root)
+
+        def clear_images():
+            for widget in display.images_frame.winfo_children():
+                widget.destroy()
+
+        def load_images():
+            display.load_images()
+            root.update_idletasks()
+        results["tk.CocktailDisplayApp.load_images"] = measure(load_images, setup=clear_images)
+    finally:
+        root.destroy()
+    return results
+
+
+# Streamlit pages --------------------------------------------------------------
+
+def bench_streamlit(catalog):
+    from streamlit.testing.v1 import AppTest
+    from recipe_model import RecipeStore, IngredientRegistry
+    from recipe_search import RecipeSearchIndex
+
+    results = {}
+    pages = {
+        "streamlit.app_rerun": os.path.join(ROOT_DIR, "1_🏠_APP.py"),
+        "streamlit.admin_rerun": os.path.join(ROOT_DIR, "pages", "2_⚙️_ADMIN.py"),
+    }
+    for key, path in pages.items():
+        if key == "streamlit.admin_rerun" and catalog.size > ADMIN_MAX_RECIPES:
+            continue
+        store = RecipeStore.from_dicts(catalog.recipes, IngredientRegistry(INGREDIENTS))
+        at = AppTest.from_file(path, default_timeout=600)
+        at.session_state["ingredients"] = dict(INGREDIENTS)
+        at.session_state["recipes"] = store
+        at.session_state["search_index"] = RecipeSearchIndex(store)
+        at.session_state["cocktails"] = {name: data["image"] for name, data in catalog.recipes.items()}
+        at.session_state["glass_size"] = 400
+        at.run()
+        if at.exception:
+            raise RuntimeError(f"{key} failed: {at.exception[0].message}")
+        results[key] = measure(at.run)
+    return results
+
+
+# Runner -------------------------------------------------------------------------
+
+GROUPS = {
+    "core": bench_core,
+    "tk": bench_tk,
+    "streamlit": bench_streamlit,
+}
+
+
+def ensure_display():
+    """Make sure Tk can open windows, starting Xvfb if needed
+
+    Returns the Xvfb process (or None) and an error message if no display
+    is available.
+    """
+    if os.environ.get("DISPLAY"):
+        return None, None
+    xvfb = shutil.which("Xvfb")
+    if xvfb is None:
+        return None, "DISPLAY ist nicht gesetzt und Xvfb ist nicht installiert"
+    display = ":99"
+    process = subprocess.Popen([xvfb, display, "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1.0)
+    os.environ["DISPLAY"] = display
+    return process, None
+
+
+def read_menu(data_dir):
+    """Return (ingredients, recipes, glass size, pitcher size) from the JSON files of a catalog"""
+    from recipe_model import load_recipe_store
+
+    with open(os.path.join(data_dir, "ingredients.json")) as f:
+        ingredients = json.load(f)
+    recipes = load_recipe_store(os.path.join(data_dir, "recipes.json"))
+    for ingredient in ingredients:
+        recipes.registry.intern(ingredient)
+    with open(os.path.join(data_dir, "glass_size.json")) as f:
+        glass_size = json.load(f)["glass_size"]
+    return ingredients, recipes, glass_size, 1500
+
+
+def boot_menu(data_dir):
+    """Load the menu as MainWindow does before its first frame, without Tk
+
+    Maps a current startup snapshot or parses the JSON files, and builds the
+    pour matrix and the search index. Returns (recipes, thumbnail, release),
+    where `thumbnail(image_path)` returns a grid thumbnail as MainWindow gets
+    it before handing it to Tk: a PIL image from the snapshot or a PPM tile
+    from the thumbnail pack. `release()` gives back the mapped pages, as
+    MainWindow.release_mapped does. For the benchmarks that run without a
+    display.
+    """
+    from pour_matrix import PourMatrix
+    from recipe_search import RecipeSearchIndex
+    from startup_snapshot import open_snapshot, source_stamps, SNAPSHOT_FILE
+    from thumbnail_pack import ThumbnailPack, GRID_SIZE
+
+    snapshot = open_snapshot(os.path.join(data_dir, SNAPSHOT_FILE))
+    if snapshot is not None and snapshot.is_current(source_stamps(data_dir)):
+        recipes = snapshot.recipe_store()
+        snapshot.pour_matrix(recipes).available()
+    else:
+        ingredients, recipes, _, _ = read_menu(data_dir)
+        PourMatrix(recipes, ingredients).available()
+    RecipeSearchIndex(recipes)
+    pack = ThumbnailPack(data_dir)
+
+    def thumbnail(image_path):
+        mtime = os.stat(image_path).st_mtime_ns
+        img = snapshot.thumbnail(image_path, mtime) if snapshot is not None else None
+        if img is not None:
+            img.load()
+            return img
+        return bytes(pack.tile(image_path, GRID_SIZE))
+
+    def release():
+        pack.release()
+        if snapshot is not None:
+            snapshot.release()
+    return recipes, thumbnail, release
+
+
+def summarize(durations):
+    return {
+        "min": min(durations),
+        "median": statistics.median(durations),
+        "runs": len(durations),
+    }
+
+
+def run_suite(sizes, groups):
+    results = {}
+    skipped = {}
+    xvfb = None
+    if "tk" in groups:
+        xvfb, error = ensure_display()
+        if error:
+            skipped["tk"] = error
+            groups = [group for group in groups if group != "tk"]
+
+    tmp_dir = tempfile.mkdtemp(prefix="mixmasterx-bench-")
+    # The Streamlit pages run in this process and write their runtime files to DATA_DIR
+    saved_env = {key: os.environ.get(key) for key in ("MIXMASTERX_DATA_DIR", "MIXMASTERX_METRICS_PORT")}
+    os.environ.update(MIXMASTERX_DATA_DIR=tmp_dir, MIXMASTERX_METRICS_PORT="0")
+    try:
+        for size in sizes:
+            catalog = Catalog(size, tmp_dir)
+            for group in groups:
+                try:
+                    timings = GROUPS[group](catalog)
+                except Exception as e:
+                    skipped[f"{group}[{size}]"] = f"{type(e).__name__}: {e}"
+                    continue
+                for name, durations in timings.items():
+                    results[f"{name}[{size}]"] = summarize(durations)
+                    print(f"{name + f'[{size}]':50} {statistics.median(durations) * 1000:12.2f} ms", flush=True)
+    finally:
+        for key, value in saved_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if xvfb is not None:
+            xvfb.terminate()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "sizes": sizes,
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Return the benchmarks that got slower than the baseline by more than `tolerance`"""
+    regressions = {}
+    for name, current in report["results"].items():
+        previous = baseline.get("results", {}).get(name)
+        if previous is None:
+            continue
+        ratio = current["median"] / previous["median"] if previous["median"] else 1.0
+        current["baseline_median"] = previous["median"]
+        current["ratio"] = ratio
+        if ratio > 1 + tolerance:
+            regressions[name] = ratio
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MixMasterX Benchmark-Suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Katalog-Größen")
+    parser.add_argument("--only", nargs="+", choices=sorted(GROUPS), default=sorted(GROUPS),
+                        help="Nur diese Benchmark-Gruppen ausführen")
+    parser.add_argument("--output", default="bench_results.json", help="JSON-Datei für die Ergebnisse")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline zum Vergleich")
+    parser.add_argument("--save-baseline", action="store_true", help="Ergebnisse als neue Baseline speichern")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Erlaubte Verlangsamung gegenüber der Baseline (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    report = run_suite(sorted(args.sizes), args.only)
+    for name, reason in report["skipped"].items():
+        print(f"Übersprungen: {name}: {reason}", file=sys.stderr)
+
+    regressions = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+        for name, ratio in sorted(regressions.items()):
+            print(f"REGRESSION {name}: {ratio:.2f}x langsamer als die Baseline", file=sys.stderr)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=4)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"Baseline gespeichert: {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
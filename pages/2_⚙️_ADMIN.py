@@ -1,8 +1,17 @@
 import streamlit as st
 import os
+import sys
 from PIL import Image
 import io
 
+# Make the shared recipe modules in src/ importable
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+from recipe_model import IngredientRegistry, RecipeStore
+from pour_matrix import preview_pours, DEFAULT_PITCHER_SIZE
+from recipe_search import RecipeSearchIndex
+from recipe_domain import validate_recipe, validate_catalog, format_catalog_errors, normalize_percentages
+from catalog_store import CatalogStore, Change, VersionConflict, version_of, RECIPE, SLOT, SIZES
+
 # Get the absolute path to the assets directory
 ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "assets")
 
@@ -75,30 +84,133 @@ DEFAULT_RECIPES = {
 # Set of default cocktail names for deletion protection
 DEFAULT_COCKTAIL_NAMES = set(DEFAULT_RECIPES.keys())
 
+# Mit MIXMASTERX_CATALOG_DIR (z.B. das data/-Verzeichnis der Tk-App) arbeiten alle
+# Admins auf denselben Dateien; jede Änderung wird mit ihrer Version gespeichert
+CATALOG_DIR = os.environ.get("MIXMASTERX_CATALOG_DIR")
+catalog = CatalogStore(CATALOG_DIR) if CATALOG_DIR else None
+
+if catalog is not None and "versions" not in st.session_state:
+    state = catalog.read()
+    ingredients = state.ingredients if state.ingredients is not None else DEFAULT_INGREDIENTS
+    recipes = state.recipes if state.recipes is not None else DEFAULT_RECIPES
+    sizes = state.sizes or {}
+    st.session_state["ingredients"] = dict(ingredients)
+    st.session_state["recipes"] = RecipeStore.from_dicts(recipes, IngredientRegistry(ingredients))
+    st.session_state["search_index"] = RecipeSearchIndex(st.session_state["recipes"])
+    st.session_state["cocktails"] = {name: recipe.get("image") for name, recipe in recipes.items()}
+    st.session_state["glass_size"] = sizes.get("glass_size", 400)
+    st.session_state["pitcher_size"] = sizes.get("pitcher_size", DEFAULT_PITCHER_SIZE)
+    st.session_state["versions"] = state.versions
+    catalog.initialize(ingredients, recipes, {"glass_size": st.session_state["glass_size"],
+                                              "pitcher_size": st.session_state["pitcher_size"]})
+
+def take_record(kind, key, value, version):
+    """Übernimmt den Stand eines Datensatzes aus dem Katalog und verwirft dessen Eingabefelder"""
+    versions = st.session_state["versions"]
+    if kind == SIZES:
+        versions[SIZES] = version
+        if value is not None:
+            st.session_state["glass_size"] = value.get("glass_size", st.session_state["glass_size"])
+            st.session_state["pitcher_size"] = value.get("pitcher_size", st.session_state["pitcher_size"])
+        for widget in ("glass_slider", "pitcher_slider"):
+            st.session_state.pop(widget, None)
+        return
+    versions.setdefault(kind, {})[key] = version
+    if kind == SLOT:
+        if value is None:
+            st.session_state["ingredients"].pop(key, None)
+        else:
+            st.session_state["ingredients"][key] = value
+            st.session_state["recipes"].registry.intern(key)
+        st.session_state.pop(f"slot_{key}", None)
+        return
+    recipes = st.session_state["recipes"]
+    if key in recipes:
+        for ing in recipes[key].ingredients():
+            st.session_state.pop(f"{key}_{ing}", None)
+        del recipes[key]
+        st.session_state["search_index"].remove(key)
+        st.session_state["cocktails"].pop(key, None)
+    if value is not None:
+        recipe = recipes.add(key, value.get("image"), value.get("ingredients", {}), value.get("glass_size"))
+        st.session_state["search_index"].add(recipe)
+        st.session_state["cocktails"][key] = value.get("image")
+
+def persist(changes):
+    """Speichert (kind, key, value)-Änderungen im Katalog; True, wenn alle gespeichert wurden
+    
+    Datensätze, die inzwischen woanders geändert wurden, werden nicht
+    überschrieben, sondern neu geladen; die Meldung erscheint nach dem Rerun.
+    """
+    if catalog is None:
+        return True
+    versions = st.session_state["versions"]
+    changes = [Change(kind, key, value, version_of(versions, kind, key)) for kind, key, value in changes]
+    try:
+        written = catalog.apply(changes, partial=True)
+        conflicts = []
+    except VersionConflict as e:
+        written, conflicts = e.versions, e.conflicts
+    outdated = {(conflict.kind, conflict.key) for conflict in conflicts}
+    if written is not None:
+        for change in changes:
+            if (change.kind, change.key) in outdated:
+                continue
+            if change.kind == SIZES:
+                versions[SIZES] = written[SIZES]
+            else:
+                versions.setdefault(change.kind, {})[change.key] = version_of(written, change.kind, change.key)
+    if not conflicts:
+        return True
+    for conflict in conflicts:
+        take_record(conflict.kind, conflict.key, conflict.current, conflict.actual)
+    st.session_state["catalog_conflicts"] = [conflict.message() for conflict in conflicts]
+    st.rerun()
+
 # Session State initialisieren
 if "ingredients" not in st.session_state:
     st.session_state["ingredients"] = DEFAULT_INGREDIENTS
 if "recipes" not in st.session_state:
-    st.session_state["recipes"] = DEFAULT_RECIPES
+    st.session_state["recipes"] = RecipeStore.from_dicts(DEFAULT_RECIPES, IngredientRegistry(DEFAULT_INGREDIENTS))
+if "search_index" not in st.session_state:
+    st.session_state["search_index"] = RecipeSearchIndex(st.session_state["recipes"])
 if "cocktails" not in st.session_state:
     st.session_state["cocktails"] = {name: recipe["image"] for name, recipe in DEFAULT_RECIPES.items()}
 
 # Add glass size to session state if not present
 if "glass_size" not in st.session_state:
     st.session_state["glass_size"] = 400  # Default glass size in ml
+if "pitcher_size" not in st.session_state:
+    st.session_state["pitcher_size"] = DEFAULT_PITCHER_SIZE
 
 st.title("Adminbereich ⚙️")
 
+for message in st.session_state.pop("catalog_conflicts", []):
+    st.error(message + " – die aktuelle Fassung wurde geladen.")
+
 # Global glass size setting
 st.header("Glasgröße einstellen")
+sizes_before = (st.session_state["glass_size"], st.session_state["pitcher_size"])
 st.session_state["glass_size"] = st.slider(
     "Standard Glasgröße (ml):",
     min_value=100,
     max_value=1000,
     value=st.session_state["glass_size"],
     step=50,
+    key="glass_slider",
 )
 st.write(f"Aktuelle Glasgröße: {st.session_state['glass_size']}ml")
+st.session_state["pitcher_size"] = st.slider(
+    "Krug-Größe für Runden (ml):",
+    min_value=500,
+    max_value=5000,
+    value=st.session_state["pitcher_size"],
+    step=100,
+    key="pitcher_slider",
+)
+if (st.session_state["glass_size"], st.session_state["pitcher_size"]) != sizes_before:
+    persist([(SIZES, None, {"glass_size": st.session_state["glass_size"],
+                            "pitcher_size": st.session_state["pitcher_size"]})])
 
 # Sektion 1: Zutaten und Slots verwalten
 st.header("1. Zutaten und Slots verwalten")
@@ -135,7 +247,10 @@ with col1:
     
     # Update ingredients only if all slots are valid
     if all(ingredient in updated_ingredients for ingredient in st.session_state["ingredients"]):
+        changed = [ing for ing, slot in updated_ingredients.items() if st.session_state["ingredients"][ing] != slot]
         st.session_state["ingredients"] = updated_ingredients
+        if changed:
+            persist([(SLOT, ing, updated_ingredients[ing]) for ing in changed])
 
 with col2:
     st.subheader("Neue Zutat hinzufügen")
@@ -147,6 +262,7 @@ with col2:
         if new_ingredient and new_slot != "-":
             if new_ingredient not in st.session_state["ingredients"]:
                 st.session_state["ingredients"][new_ingredient] = int(new_slot)
+                persist([(SLOT, new_ingredient, int(new_slot))])
                 st.success(f"{new_ingredient} wurde hinzugefügt!")
                 st.rerun()
             else:
@@ -154,19 +270,29 @@ with col2:
         else:
             st.error("Bitte geben Sie einen Namen ein und wählen Sie einen gültigen Slot")
 
-# Funktion zur Überprüfung der Prozentsumme
-def validate_percentages(ingredients):
-    total = sum(ingredients.values())
-    return abs(total - 100) < 0.1  # Erlaubt kleine Rundungsfehler
+# Callback: skaliert die Prozent-Eingabefelder (Widget-Keys) auf 100%
+def normalize_inputs(keys):
+    try:
+        normalized = normalize_percentages({key: st.session_state.get(key, 0.0) for key in keys})
+    except ValueError:
+        return  # Nichts zu skalieren
+    for key in keys:
+        st.session_state[key] = normalized.get(key, 0.0)
 
 # Sektion 2: Cocktail-Rezepte verwalten
 st.header("2. Cocktail-Rezepte verwalten")
 
+# Alle gespeicherten Rezepte in einem Durchlauf prüfen
+catalog_errors = validate_catalog(st.session_state["recipes"])
+if catalog_errors:
+    st.warning("Fehlerhafte Rezepte:\n\n" + format_catalog_errors(catalog_errors))
+
 # Existierende Rezepte bearbeiten
 st.subheader("Existierende Rezepte")
 cocktails_to_delete = []  # Liste für zu löschende Cocktails
+recipe_query = st.text_input("Rezepte durchsuchen:", key="admin_search_query")
 
-for cocktail_name in st.session_state["recipes"].keys():
+for cocktail_name in st.session_state["search_index"].search(recipe_query):
     with st.expander(f"Rezept: {cocktail_name}"):
         # Delete button in the top right corner
         col1, col2 = st.columns([6, 1])
@@ -183,7 +309,7 @@ for cocktail_name in st.session_state["recipes"].keys():
             recipe = st.session_state["recipes"][cocktail_name]
             
             updated_ingredients = {}
-            for ing, percentage in recipe["ingredients"].items():
+            for ing, percentage in recipe.items():
                 new_percentage = st.number_input(
                     f"{ing} (%):",
                     min_value=0.0,
@@ -195,23 +321,30 @@ for cocktail_name in st.session_state["recipes"].keys():
                 updated_ingredients[ing] = new_percentage
             
             # Überprüfe ob die Summe 100% ergibt
-            if not validate_percentages(updated_ingredients):
-                st.error("Die Summe der Prozente muss 100% ergeben!")
-                st.write(f"Aktuelle Summe: {sum(updated_ingredients.values()):.1f}%")
-            else:
-                recipe["ingredients"] = updated_ingredients
+            errors = validate_recipe(updated_ingredients)
+            if errors:
+                for error in errors:
+                    st.error(error)
+            elif updated_ingredients != recipe.ingredients():
+                recipe.set_ingredients(updated_ingredients)
+                st.session_state["search_index"].update(recipe)
+                persist([(RECIPE, cocktail_name, recipe.to_dict())])
+            st.button("Auf 100% skalieren", key=f"normalize_{cocktail_name}", on_click=normalize_inputs,
+                      args=([f"{cocktail_name}_{ing}" for ing in updated_ingredients],))
                 
             # Zeige die ml-Werte an
             st.write("\nMengen in ml (basierend auf Glasgröße):")
-            for ing, percentage in updated_ingredients.items():
-                ml_amount = (percentage / 100) * st.session_state["glass_size"]
+            for ing, _, ml_amount in preview_pours(updated_ingredients, st.session_state["glass_size"]):
                 st.write(f"{ing}: {ml_amount:.1f}ml")
 
 # Lösche die markierten Cocktails
 for cocktail_name in cocktails_to_delete:
     if cocktail_name not in DEFAULT_COCKTAIL_NAMES:  # Extra safety check
+        # Im Katalog zuerst; wurde der Cocktail inzwischen geändert, bleibt er
+        persist([(RECIPE, cocktail_name, None)])
+        
         # Remove the cocktail's image file if it exists
-        image_path = st.session_state["recipes"][cocktail_name]["image"]
+        image_path = st.session_state["recipes"][cocktail_name].image
         try:
             if os.path.exists(image_path):
                 os.remove(image_path)
@@ -221,6 +354,7 @@ for cocktail_name in cocktails_to_delete:
         # Remove the cocktail from both recipes and cocktails
         del st.session_state["recipes"][cocktail_name]
         del st.session_state["cocktails"][cocktail_name]
+        st.session_state["search_index"].remove(cocktail_name)
         
         # Rerun the app to update the display
         if cocktails_to_delete:
@@ -279,38 +413,45 @@ if new_cocktail:
         total_percentage = sum(new_ingredients.values())
         st.write(f"Gesamtsumme: {total_percentage:.1f}%")
         
-        if not validate_percentages(new_ingredients):
-            st.error("Die Summe der Prozente muss 100% ergeben!")
+        errors = validate_recipe(new_ingredients)
+        if errors:
+            for error in errors:
+                st.error(error)
         else:
             st.success("Die Prozente ergeben 100%!")
             
             # Zeige die ml-Werte an
             st.write("\nMengen in ml (basierend auf Glasgröße):")
-            for ing, percentage in new_ingredients.items():
-                ml_amount = (percentage / 100) * st.session_state["glass_size"]
+            for ing, _, ml_amount in preview_pours(new_ingredients, st.session_state["glass_size"]):
                 st.write(f"{ing}: {ml_amount:.1f}ml")
 
+    st.button("Auf 100% skalieren", key="normalize_new", on_click=normalize_inputs,
+              args=([f"new_{ingredient}" for ingredient in st.session_state["ingredients"]],))
+
     if st.button("Cocktail hinzufügen"):
         if "temp_image_path" in st.session_state and new_ingredients:
-            if validate_percentages(new_ingredients):
+            errors = validate_recipe(new_ingredients, new_cocktail)
+            if not errors:
                 image_path = st.session_state["temp_image_path"]
-                st.session_state["recipes"][new_cocktail] = {
-                    "image": image_path,
-                    "ingredients": new_ingredients
-                }
+                recipe = st.session_state["recipes"].add(
+                    new_cocktail, image_path, new_ingredients, st.session_state["glass_size"]
+                )
+                st.session_state["search_index"].add(recipe)
                 st.session_state["cocktails"][new_cocktail] = image_path
+                persist([(RECIPE, new_cocktail, recipe.to_dict())])
                 
                 del st.session_state["temp_image_path"]
                 
                 st.success(f"{new_cocktail} wurde erfolgreich hinzugefügt!")
                 st.rerun()
             else:
-                st.error("Die Summe der Prozente muss 100% ergeben!")
+                for error in errors:
+                    st.error(error)
         else:
             st.error("Bitte laden Sie ein Bild hoch und fügen Sie mindestens eine Zutat hinzu!")
 
 # Debug-Informationen (optional)
 if st.checkbox("Debug-Informationen anzeigen"):
     st.write("Aktuelle Zutaten und Slots:", st.session_state["ingredients"])
-    st.write("Aktuelle Rezepte:", st.session_state["recipes"])
+    st.write("Aktuelle Rezepte:", st.session_state["recipes"].to_dicts())
     st.write("Aktuelle Glasgröße:", st.session_state["glass_size"])
@@ -0,0 +1,365 @@
+"""Bulk import and export of recipe catalogs (CSV or JSON lines)
+
+Usage:
+    python src/catalog_io.py import catalog.csv [--replace] [--assign-slots] [--dry-run]
+    python src/catalog_io.py export catalog.jsonl
+
+CSV files have the columns `name`, `image` and `glass_size`; every other
+column is an ingredient holding its percentage (empty cells are skipped).
+JSON lines files hold one {"name", "image", "glass_size", "ingredients"}
+object per line.
+
+Imports stream the file in batches and spool valid recipes to a temporary
+SQLite database on disk, which also finds duplicate names, so memory use
+does not grow with the size of the file. Only the names of the recipes
+already in recipes.json are kept, and the existing catalog is read once
+more when recipes.json is rewritten. The files are written under the
+catalog lock, and the import raises the catalog version (see
+catalog_store.py), so admins editing at the same time are not overwritten
+unnoticed.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+from contextlib import closing
+from itertools import islice
+
+from recipe_model import load_json, load_recipe_store
+from pour_matrix import NUM_SLOTS
+from recipe_domain import validate_recipe
+from catalog_store import CatalogStore
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+
+BASE_COLUMNS = ("name", "image", "glass_size")
+BATCH_SIZE = 1000
+
+
+class CatalogRecord:
+    """One recipe read from a catalog file, with any errors found so far"""
+
+    __slots__ = ("line", "name", "image", "glass_size", "ingredients", "errors")
+
+    def __init__(self, line, name="", image="", glass_size=None, ingredients=None):
+        self.line = line
+        self.name = name
+        self.image = image
+        self.glass_size = glass_size
+        self.ingredients = ingredients if ingredients is not None else {}
+        self.errors = []
+
+    def to_dict(self):
+        """Return the recipe in the JSON shape used by recipes.json"""
+        data = {"image": self.image}
+        if self.glass_size is not None:
+            data["glass_size"] = self.glass_size
+        data["ingredients"] = self.ingredients
+        return data
+
+
+def parse_number(text):
+    """Parse "33", "33.5", "33,5" or "33 %" into a float"""
+    return float(str(text).replace("%", "").replace(",", ".").strip())
+
+
+def iter_csv(f):
+    """Stream CatalogRecords from a wide CSV file"""
+    reader = csv.reader(f)
+    header = [column.strip() for column in next(reader, [])]
+    base = {column.lower(): i for i, column in enumerate(header) if column.lower() in BASE_COLUMNS}
+    ingredient_columns = [(i, column) for i, column in enumerate(header)
+                          if column.lower() not in BASE_COLUMNS and column]
+
+    for line, row in enumerate(reader, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        cell = lambda column: row[base[column]].strip() if column in base and base[column] < len(row) else ""
+        record = CatalogRecord(line, cell("name"), cell("image"))
+
+        if cell("glass_size"):
+            try:
+                record.glass_size = int(parse_number(cell("glass_size")))
+            except ValueError:
+                record.errors.append(f"Ungültige Glasgröße: {cell('glass_size')}")
+
+        for i, ingredient in ingredient_columns:
+            value = row[i].strip() if i < len(row) else ""
+            if not value:
+                continue
+            if ingredient in record.ingredients:
+                record.errors.append(f"Zutat {ingredient} kommt mehrfach vor")
+                continue
+            try:
+                record.ingredients[ingredient] = parse_number(value)
+            except ValueError:
+                record.errors.append(f"Ungültiger Prozentwert für {ingredient}: {value}")
+        yield record
+
+
+def iter_jsonl(f):
+    """Stream CatalogRecords from a JSON lines file"""
+    for line, text in enumerate(f, start=1):
+        if not text.strip():
+            continue
+        record = CatalogRecord(line)
+        try:
+            data = json.loads(text)
+            record.name = str(data.get("name", "")).strip()
+            record.image = data.get("image") or ""
+            if data.get("glass_size") is not None:
+                record.glass_size = int(parse_number(data["glass_size"]))
+            record.ingredients = {ing: parse_number(pct) for ing, pct in data.get("ingredients", {}).items()}
+        except (ValueError, AttributeError, TypeError) as e:
+            record.errors.append(f"Ungültiger Eintrag: {e}")
+        yield record
+
+
+def open_catalog(path):
+    """Return (file, record iterator) for a catalog, chosen by file extension"""
+    f = open(path, 'r', newline='', encoding='utf-8-sig')
+    if os.path.splitext(path)[1].lower() == ".csv":
+        return f, iter_csv(f)
+    return f, iter_jsonl(f)
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def validate_batch(records):
+    """Check a batch of records for missing names, bad percentages and wrong sums"""
+    for record in records:
+        record.errors.extend(validate_recipe(record.ingredients, record.name))
+
+
+class SlotMapper:
+    """Maps catalog ingredient names onto the configured slots"""
+
+    def __init__(self, ingredients, assign_slots=False):
+        self.ingredients = ingredients
+        self.assign_slots = assign_slots
+        self.changed = False
+        self.assigned = {}       # ingredient -> slot given by this import
+        self._by_key = {name.casefold(): name for name in ingredients}
+
+    def free_slots(self):
+        used = {slot for slot in self.ingredients.values() if slot != "-"}
+        return [slot for slot in range(1, NUM_SLOTS + 1) if slot not in used]
+
+    def map_record(self, record):
+        """Rename ingredients to their configured spelling and check their slots
+
+        Names that differ only in case ("Gin", "gin") would end up as one
+        ingredient; such a record is rejected instead of keeping one value.
+        """
+        mapped = {}
+        spelled = {}             # casefolded name -> spelling in the record
+        missing = []
+        for ing, pct in record.ingredients.items():
+            key = ing.casefold()
+            if key in spelled:
+                record.errors.append(f"Zutat {ing} kommt mehrfach vor (auch als {spelled[key]})")
+                continue
+            spelled[key] = ing
+            name = self._by_key.get(key, ing)
+            mapped[name] = pct
+            if self.ingredients.get(name, "-") == "-":
+                missing.append(name)
+        if len(spelled) < len(record.ingredients):
+            record.ingredients = mapped
+            return
+
+        if missing and self.assign_slots and len(missing) <= len(self.free_slots()):
+            for name, slot in zip(missing, self.free_slots()):
+                self.ingredients[name] = slot
+                self.assigned[name] = slot
+                self._by_key[name.casefold()] = name
+            self.changed = True
+            missing = []
+
+        for name in missing:
+            record.errors.append(f"Zutat {name} ist keinem Slot zugeordnet")
+        record.ingredients = mapped
+
+
+def open_spool():
+    """Return a temporary on-disk database for the valid recipes of an import"""
+    spool = sqlite3.connect("")
+    spool.execute("PRAGMA journal_mode = OFF")
+    spool.execute("PRAGMA synchronous = OFF")
+    spool.execute("CREATE TABLE recipes (name TEXT PRIMARY KEY, data TEXT NOT NULL)")
+    return spool
+
+
+def spooled(spool, names):
+    """Return which of `names` are in the spool already"""
+    names = list(names)
+    found = set()
+    # SQLite allows 999 parameters per statement in older versions
+    for start in range(0, len(names), 900):
+        chunk = names[start:start + 900]
+        query = f"SELECT name FROM recipes WHERE name IN ({', '.join('?' * len(chunk))})"
+        found.update(name for name, in spool.execute(query, chunk))
+    return found
+
+
+class ImportResult:
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.slots_assigned = False
+
+
+def import_catalog(path, data_dir=DATA_DIR, replace=False, assign_slots=False, dry_run=False, on_error=None):
+    """Import a catalog file into recipes.json
+
+    `on_error(record)` is called for every rejected row as soon as it is
+    validated. Returns an ImportResult with the counts.
+    """
+    recipes_file = os.path.join(data_dir, "recipes.json")
+    ingredients_file = os.path.join(data_dir, "ingredients.json")
+    existing = set(load_json(recipes_file, {}))
+    mapper = SlotMapper(load_json(ingredients_file, {}), assign_slots)
+    result = ImportResult()
+
+    os.makedirs(data_dir, exist_ok=True)
+    with closing(open_spool()) as spool:
+        f, records = open_catalog(path)
+        with f:
+            for batch in batched(records, BATCH_SIZE):
+                validate_batch(batch)
+                duplicates = spooled(spool, {record.name for record in batch})
+                rows = {}            # name -> JSON of the valid records of this batch
+                for record in batch:
+                    if record.name in rows or record.name in duplicates:
+                        record.errors.append("Doppelter Name in der Datei")
+                    elif record.name in existing and not replace:
+                        record.errors.append("Dieser Cocktail existiert bereits")
+                    if not record.errors:
+                        mapper.map_record(record)
+
+                    if record.errors:
+                        result.failed += 1
+                        if on_error is not None:
+                            on_error(record)
+                        continue
+
+                    if record.image and not os.path.isabs(record.image):
+                        record.image = os.path.join(ASSETS_DIR, record.image)
+                    rows[record.name] = json.dumps(record.to_dict())
+                    result.imported += 1
+                spool.executemany("INSERT INTO recipes VALUES (?, ?)", rows.items())
+
+        result.slots_assigned = mapper.changed
+        if dry_run or not result.imported:
+            return result
+
+        store = CatalogStore(data_dir)
+        with store.locked(exclusive=True):
+            # Admins may have saved while the file was read; keep their changes
+            write_recipes(recipes_file, load_json(recipes_file, {}), spool)
+            if mapper.changed:
+                ingredients = load_json(ingredients_file, {})
+                ingredients.update(mapper.assigned)
+                with open(ingredients_file + ".tmp", 'w') as out:
+                    json.dump(ingredients, out, indent=4)
+                os.replace(ingredients_file + ".tmp", ingredients_file)
+            store.bump(slots=mapper.assigned, catalog=True)
+    return result
+
+
+def write_recipes(recipes_file, existing, spool):
+    """Write existing and spooled recipes to recipes.json one entry at a time
+
+    Spooled recipes replace existing ones of the same name.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(recipes_file), suffix=".tmp")
+    with os.fdopen(fd, 'w') as out:
+        out.write("{")
+        first = True
+
+        def write_entry(name, data):
+            nonlocal first
+            body = json.dumps(data, indent=4).replace("\n", "\n    ")
+            out.write(("\n" if first else ",\n") + f"    {json.dumps(name)}: {body}")
+            first = False
+
+        for names in batched(existing, BATCH_SIZE):
+            replaced = spooled(spool, names)
+            for name in names:
+                if name not in replaced:
+                    write_entry(name, existing[name])
+        for name, text in spool.execute("SELECT name, data FROM recipes ORDER BY rowid"):
+            write_entry(name, json.loads(text))
+        out.write("\n}" if not first else "}")
+    os.replace(tmp_path, recipes_file)
+
+
+def export_catalog(path, data_dir=DATA_DIR):
+    """Export recipes.json as CSV or JSON lines, returning the number of recipes"""
+    store = load_recipe_store(os.path.join(data_dir, "recipes.json"),
+                              os.path.join(data_dir, "ingredients.json"))
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if os.path.splitext(path)[1].lower() == ".csv":
+            used = sorted({ing_id for recipe in store for ing_id in recipe.ingredient_ids})
+            ingredients = [store.registry.name_of(ing_id) for ing_id in used]
+            writer = csv.writer(f)
+            writer.writerow(list(BASE_COLUMNS) + ingredients)
+            for recipe in store:
+                percentages = recipe.ingredients()
+                row = [recipe.name, recipe.image, recipe.glass_size if recipe.glass_size is not None else ""]
+                row.extend(f"{percentages[ing]:.10g}" if ing in percentages else "" for ing in ingredients)
+                writer.writerow(row)
+        else:
+            for recipe in store:
+                data = {"name": recipe.name}
+                data.update(recipe.to_dict())
+                f.write(json.dumps(data, ensure_ascii=False) + "\n")
+    return len(store)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rezept-Kataloge importieren und exportieren (CSV / JSON lines)")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Verzeichnis mit recipes.json und ingredients.json")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="Katalog importieren")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--replace", action="store_true", help="Vorhandene Rezepte überschreiben")
+    import_parser.add_argument("--assign-slots", action="store_true", help="Neuen Zutaten freie Slots zuweisen")
+    import_parser.add_argument("--dry-run", action="store_true", help="Nur prüfen, nichts speichern")
+
+    export_parser = commands.add_parser("export", help="Katalog exportieren")
+    export_parser.add_argument("path")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        count = export_catalog(args.path, args.data_dir)
+        print(f"{count} Rezepte exportiert nach {args.path}")
+        return 0
+
+    def report(record):
+        label = f"Zeile {record.line}" + (f" ({record.name})" if record.name else "")
+        for error in record.errors:
+            print(f"{label}: {error}", file=sys.stderr)
+
+    result = import_catalog(args.path, args.data_dir, replace=args.replace,
+                            assign_slots=args.assign_slots, dry_run=args.dry_run, on_error=report)
+    action = "geprüft" if args.dry_run else "importiert"
+    print(f"{result.imported} Rezepte {action}, {result.failed} fehlerhafte Zeilen")
+    return 1 if result.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
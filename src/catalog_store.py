@@ -0,0 +1,271 @@
+"""Versioned updates of the shared data files
+
+Several editors may change the catalog at once: the Tk admin, the Streamlit
+admin, the catalog importer. Instead of writing back everything they hold,
+editors send the records they changed, each with the version their edit is
+based on. CatalogStore applies such a batch under a file lock only if every
+record is still at that version (compare-and-set) and bumps the versions of
+the records it wrote. Otherwise nothing is written and a VersionConflict
+reports which records were changed by someone else, with their current
+content.
+
+Records are single recipes (recipes.json), single slot assignments
+(ingredients.json) and the sizes (glass_size.json). Changes to different
+records never conflict. The versions are kept in `data/catalog_versions.json`
+as {"recipe": {name: version}, "slot": {ingredient: version}, "sizes":
+version, "catalog": version}. A record without an entry is at version 0, and
+a deleted record keeps its version, so an editor that still holds it cannot
+resurrect it unnoticed.
+
+Bulk writers such as the catalog importer do not bump every recipe they
+wrote; they raise the catalog version above every recipe version instead.
+A recipe is at least at the catalog version, so every editor that read
+recipes before the import gets a conflict, while the versions file stays
+as small as the number of recipes edited one by one.
+
+The JSON files keep their format, so every other reader keeps working; a
+file is replaced atomically and only when one of its records changed.
+"""
+import contextlib
+import fcntl
+import json
+import os
+import threading
+
+from recipe_model import load_json
+
+VERSIONS_FILE = "catalog_versions.json"
+LOCK_FILE = "catalog.lock"
+RECIPE = "recipe"
+SLOT = "slot"
+SIZES = "sizes"
+CATALOG = "catalog"
+FILES = {RECIPE: "recipes.json", SLOT: "ingredients.json", SIZES: "glass_size.json"}
+
+
+def version_of(versions, kind, key=None):
+    """Return the version of a record in a versions dict"""
+    if kind == SIZES:
+        return versions.get(SIZES, 0)
+    version = versions.get(kind, {}).get(key, 0)
+    if kind == RECIPE:
+        # A bulk import touched every recipe at once
+        return max(version, versions.get(CATALOG, 0))
+    return version
+
+
+def empty_versions():
+    return {RECIPE: {}, SLOT: {}, SIZES: 0, CATALOG: 0}
+
+
+class Change:
+    """A new value for one record, based on version `expected`
+
+    `value` is the recipe dict, the slot (an int or "-") or the sizes dict;
+    None deletes a recipe or ingredient. `key` is unused for the sizes.
+    """
+
+    __slots__ = ("kind", "key", "value", "expected")
+
+    def __init__(self, kind, key, value, expected):
+        self.kind = kind
+        self.key = key
+        self.value = value
+        self.expected = expected
+
+    def __repr__(self):
+        return f"Change({self.kind!r}, {self.key!r}, expected={self.expected})"
+
+
+class Conflict:
+    """A record that changed since the editor read it"""
+
+    __slots__ = ("kind", "key", "expected", "actual", "current")
+
+    def __init__(self, kind, key, expected, actual, current):
+        self.kind = kind
+        self.key = key
+        self.expected = expected
+        self.actual = actual         # version in the store
+        self.current = current       # value in the store, None if deleted
+
+    def message(self):
+        if self.kind == RECIPE:
+            what = f"Rezept {self.key}"
+        elif self.kind == SLOT:
+            what = f"Slot von {self.key}"
+        else:
+            what = "Glas- und Krug-Größe"
+        state = "gelöscht" if self.current is None else "geändert"
+        return f"{what} wurde inzwischen woanders {state} (Version {self.expected} → {self.actual})"
+
+
+class VersionConflict(Exception):
+    """Raised when changes were based on outdated records
+
+    `versions` is None if nothing was written, or the new versions after the
+    changes without conflict were written (`apply(..., partial=True)`).
+    """
+
+    def __init__(self, conflicts, versions=None):
+        self.conflicts = conflicts
+        self.versions = versions
+        super().__init__("\n".join(conflict.message() for conflict in conflicts))
+
+
+class CatalogState:
+    """Contents of the data files together with their versions"""
+
+    __slots__ = ("ingredients", "recipes", "sizes", "versions")
+
+    def __init__(self, ingredients, recipes, sizes, versions):
+        self.ingredients = ingredients
+        self.recipes = recipes
+        self.sizes = sizes
+        self.versions = versions
+
+
+class CatalogStore:
+    """Compare-and-set access to the data files of one data directory"""
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.versions_path = os.path.join(data_dir, VERSIONS_FILE)
+        self.lock_path = os.path.join(data_dir, LOCK_FILE)
+        self._held = threading.local()
+
+    def path(self, kind):
+        return os.path.join(self.data_dir, FILES[kind])
+
+    @contextlib.contextmanager
+    def locked(self, exclusive=False):
+        """Hold the catalog lock; readers share it, writers hold it alone
+
+        Nested use on the same thread reuses the lock already held; a shared
+        lock cannot be upgraded that way.
+        """
+        held = getattr(self._held, "mode", None)
+        if held is not None:
+            if exclusive and held != fcntl.LOCK_EX:
+                raise RuntimeError("catalog lock is held shared")
+            yield
+            return
+        mode = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, mode)
+            self._held.mode = mode
+            try:
+                yield
+            finally:
+                self._held.mode = None
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _load(self, kind):
+        return load_json(self.path(kind), None)
+
+    def _load_versions(self):
+        versions = load_json(self.versions_path, None)
+        if not isinstance(versions, dict):
+            return empty_versions()
+        base = empty_versions()
+        base.update(versions)
+        return base
+
+    def read_versions(self):
+        with self.locked():
+            return self._load_versions()
+
+    def read(self):
+        """Return a consistent CatalogState; missing files are None"""
+        with self.locked():
+            return CatalogState(self._load(SLOT), self._load(RECIPE), self._load(SIZES), self._load_versions())
+
+    def apply(self, changes, partial=False):
+        """Write a batch of changes if all are based on the current versions
+
+        Returns the new versions dict. Raises VersionConflict listing every
+        outdated change; then nothing is written, or with `partial` the
+        changes without conflict are.
+        """
+        changes = list(changes)
+        if not changes:
+            return self.read_versions()
+        kinds = {change.kind for change in changes}
+        with self.locked(exclusive=True):
+            versions = self._load_versions()
+            contents = {kind: self._load(kind) for kind in kinds}
+            conflicts = []
+            for change in changes:
+                actual = version_of(versions, change.kind, change.key)
+                if actual != change.expected:
+                    conflicts.append(Conflict(change.kind, change.key, change.expected, actual,
+                                              self._value(contents[change.kind], change.kind, change.key)))
+            if conflicts:
+                if not partial:
+                    raise VersionConflict(conflicts)
+                outdated = {(conflict.kind, conflict.key) for conflict in conflicts}
+                changes = [change for change in changes if (change.kind, change.key) not in outdated]
+                kinds = {change.kind for change in changes}
+
+            for change in changes:
+                if change.kind == SIZES:
+                    contents[SIZES] = dict(change.value)
+                    versions[SIZES] += 1
+                    continue
+                records = contents[change.kind]
+                if records is None:
+                    records = contents[change.kind] = {}
+                if change.value is None:
+                    records.pop(change.key, None)
+                else:
+                    records[change.key] = change.value
+                versions[change.kind][change.key] = version_of(versions, change.kind, change.key) + 1
+
+            if changes:
+                for kind in kinds:
+                    self._write(self.path(kind), contents[kind])
+                self._write(self.versions_path, versions)
+            if conflicts:
+                raise VersionConflict(conflicts, versions if changes else None)
+            return versions
+
+    def initialize(self, ingredients, recipes, sizes):
+        """Write the files that do not exist yet, e.g. the defaults on the first start"""
+        with self.locked(exclusive=True):
+            for kind, content in ((SLOT, ingredients), (RECIPE, recipes), (SIZES, sizes)):
+                if not os.path.exists(self.path(kind)):
+                    self._write(self.path(kind), content)
+
+    def bump(self, recipes=(), slots=(), sizes=False, catalog=False):
+        """Mark records as changed by a writer that bypassed `apply`
+
+        The caller must hold the exclusive lock while writing and bumping,
+        e.g. the catalog importer. Editors holding these records get a
+        conflict on their next change. `catalog` marks every recipe as
+        changed with a single version.
+        """
+        versions = self._load_versions()
+        for kind, keys in ((RECIPE, recipes), (SLOT, slots)):
+            for key in keys:
+                versions[kind][key] = version_of(versions, kind, key) + 1
+        if sizes:
+            versions[SIZES] += 1
+        if catalog:
+            versions[CATALOG] = max([versions[CATALOG], *versions[RECIPE].values()]) + 1
+        self._write(self.versions_path, versions)
+        return versions
+
+    @staticmethod
+    def _value(content, kind, key):
+        if content is None:
+            return None
+        return content if kind == SIZES else content.get(key)
+
+    @staticmethod
+    def _write(path, content):
+        # Replaced atomically, so readers never see a half-written file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(content, f, indent=4)
+        os.replace(tmp_path, path)
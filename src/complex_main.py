@@ -1,13 +1,36 @@
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk, messagebox
 import os
 import json
 import math
 from PIL import Image, ImageTk
 import io
+from collections import OrderedDict
+
+from recipe_model import load_recipe_store
+from pour_matrix import PourMatrix, DEFAULT_PITCHER_SIZE
+from recipe_search import RecipeSearchIndex, loaded_ingredients
+from recipe_domain import validate_recipe, validate_catalog, format_catalog_errors, normalize_percentages, to_decimal
+from instrumentation import LatencyWatchdog
+from metrics import start_exporters, order_placed, order_poured, image_cache_access
+from pump_controller import open_from_env, load_flow_rates, PumpControllerError
+from flow_dispense import ClosedLoopDispenser, open_flow_meter_from_env
+from maintenance import MaintenanceScheduler, MaintenanceService, TraceRecorder, TRACE_FILE, live_config
+from simulator import SimulationConfig
+from dispense_journal import DispenseJournal, JOURNAL_FILE
+from startup_snapshot import open_snapshot, source_stamps, SnapshotWriter, SNAPSHOT_FILE
+from thumbnail_pack import ThumbnailPack, GRID_SIZE
+from config_watch import ConfigReloader, ConfigDelta
+from catalog_store import CatalogStore, Change, VersionConflict, version_of, RECIPE, SLOT, SIZES, CATALOG
+from substitutions import SubstitutionEngine, load_swap_groups
+from order_progress import OrderProgress, CoalescedUpdates, QUEUED, POURING, DONE
+from memory_profile import MemoryProfile, peak_rss_bytes
+
+# Progress updates of the drinks are drawn at most this often
+PROGRESS_FRAME_MS = 50
 
 class MainWindow:
-    def __init__(self):
+    def __init__(self, data_dir=None):
         self.root = tk.Tk()
         self.root.title("Cocktail Mixer")
         self.root.geometry("1200x800")
@@ -60,9 +83,92 @@ class MainWindow:
         # Default cocktail names for deletion protection
         self.default_cocktail_names = set(self.default_recipes.keys())
         
+        # Directory holding the JSON data files
+        self.data_dir = data_dir or os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+        
+        # Warm boots start from data/startup_snapshot.bin, which is rebuilt in
+        # the background whenever the JSON files change
+        self.snapshot_path = os.path.join(self.data_dir, SNAPSHOT_FILE)
+        self.snapshot_writer = SnapshotWriter(self.snapshot_path, self.data_dir, self.read_data_files)
+        
+        # Edits are saved per record with the version they are based on, so
+        # several admins (Tk, Streamlit, the importer) can work at once
+        self.catalog = CatalogStore(self.data_dir)
+        # Recipes changed in the editor but not written yet; typing only changes
+        # the model, the recipe is saved when its field loses focus or on Save
+        self.unsaved_recipes = set()
+        
         # Load data from file or use defaults
         self.load_data()
         
+        # Changes made to the data files outside the app are applied while it runs
+        self.reloader = ConfigReloader(self.data_dir, lambda delta: self.root.after(0, self.apply_config_delta, delta),
+                                       lock=self.catalog.locked)
+        
+        # Time UI callbacks and watch the event loop; slow callbacks are logged
+        # with stack samples. Must wrap the callbacks before widgets get them.
+        self.watchdog = LatencyWatchdog(self.root, report_file=os.path.join(self.data_dir, "latency_reports.jsonl"))
+        self.watchdog.instrument(self, [
+            "update_cocktail_grid", "show_recipe_details", "pour_batch", "update_glass_size",
+            "update_ingredient_slot", "save_ingredients", "add_new_ingredient",
+            "update_recipe_totals", "update_recipe_ingredient", "save_recipe_edits", "normalize_recipe",
+            "save_recipe", "save_all_recipes", "delete_recipe", "add_new_recipe", "save_data",
+            "apply_config_delta", "show_order_progress", "show_grid_page", "check_memory",
+        ])
+        self.watchdog.start()
+        
+        # Grid thumbnails by (path, mtime), so re-rendering does not decode every image again
+        # Images missing from the startup snapshot come from data/thumbnails.pack
+        # With MIXMASTERX_MEMORY_MB the cache is sized to the budget and the grid is paged
+        self.memory = MemoryProfile.from_env(GRID_SIZE)
+        self.thumbnail_cache = OrderedDict()
+        self.grid_page = 0
+        self.thumbnail_pack = ThumbnailPack(self.data_dir)
+        
+        # Live metrics on localhost:9464/metrics and in data/metrics_tk.jsonl
+        start_exporters(self.data_dir, "tk")
+        
+        # Pump controller from MIXMASTERX_PUMP_PORT; without it drinks are only shown
+        # With flow sensors (MIXMASTERX_FLOW_PORT) pours stop at the measured volume
+        # Pump times, ETAs and estimates all use the calibrated rates from data/flow_rates.json
+        self.flow_rates = load_flow_rates(self.data_dir)
+        self.closed_loop = None
+        try:
+            self.pumps = open_from_env()
+            flow_meter = open_flow_meter_from_env(self.pumps)
+            if flow_meter is not None:
+                self.closed_loop = ClosedLoopDispenser(self.pumps, flow_meter, self.flow_rates)
+        except (OSError, PumpControllerError) as e:
+            self.pumps = None
+            messagebox.showerror("Fehler", f"Pumpen-Controller nicht erreichbar: {e}")
+        
+        # Drinks are queued through the maintenance loop, which primes likely lines and
+        # flushes (with the water slot from MIXMASTERX_FLUSH_SLOT) while nobody orders
+        # Pours in flight go to data/dispense_journal.log, so a drink interrupted by a
+        # power loss can be finished or aborted on the next start
+        # Progress and ETA of every drink come from the pump queue; whatever the rate
+        # of updates, the details view is redrawn once per frame at most
+        self.maintenance = None
+        self.journal = None
+        self.order_progress = None
+        self.progress_view = None
+        if self.pumps is not None:
+            flush_slot = os.environ.get("MIXMASTERX_FLUSH_SLOT")
+            scheduler = MaintenanceScheduler(config=SimulationConfig(flow_rates=self.flow_rates),
+                                             flush_slot=int(flush_slot) if flush_slot else None)
+            pour = self.closed_loop.dispense if self.closed_loop is not None else None
+            meter = self.closed_loop.meter if self.closed_loop is not None else None
+            self.journal = DispenseJournal(os.path.join(self.data_dir, JOURNAL_FILE), flow_rates=self.flow_rates,
+                                           meter=meter,
+                                           on_error=lambda e: self.root.after(0, self.journal_failed, e))
+            self.order_progress = OrderProgress(live_config(scheduler.config), self.flow_rates, meter=meter)
+            self.order_progress.subscribe(CoalescedUpdates(self.root, self.show_order_progress, PROGRESS_FRAME_MS).push)
+            self.maintenance = MaintenanceService(self.pumps, scheduler, flow_rates=self.flow_rates, pour=pour,
+                                                  journal=self.journal, progress=self.order_progress).start()
+            self.recover_pours()
+        # Every order goes to data/order_trace.jsonl for replaying with maintenance.py
+        self.order_trace = TraceRecorder(os.path.join(self.data_dir, TRACE_FILE))
+        
         # Create notebook for tabs
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -81,63 +187,233 @@ class MainWindow:
         
         # Bind window close event
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
+        
+        self.reloader.start()
+        if self.memory.check_ms is not None:
+            self.root.after(self.memory.check_ms, self.check_memory)
     
     def load_data(self):
-        """Load data from JSON files or use defaults"""
-        data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
+        """Load data from the startup snapshot, or from the JSON files and use defaults"""
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+        
+        # Thumbnails of an outdated snapshot are still good, they are keyed by the image mtime
+        self.snapshot = open_snapshot(self.snapshot_path)
+        # Contents and versions are read together, so the versions match what we hold
+        with self.catalog.locked():
+            self.versions = self.catalog.read_versions()
+            if self.snapshot is not None and self.snapshot.is_current(source_stamps(self.data_dir)):
+                self.ingredients = dict(self.snapshot.ingredients)
+                self.recipes = self.snapshot.recipe_store()
+                self._pour_matrix = self.snapshot.pour_matrix(self.recipes)
+                self.glass_size = self.snapshot.glass_size
+                self.pitcher_size = self.snapshot.pitcher_size
+            else:
+                self.ingredients, self.recipes, self.glass_size, self.pitcher_size = self.read_data_files()
+                self._pour_matrix = None
+                self.snapshot_writer.request()
+        # On the first start the defaults are written, so other editors see them
+        self.catalog.initialize(self.ingredients, self.recipes.to_dicts(), self.sizes_dict())
+        self.search_index = RecipeSearchIndex(self.recipes)
+        self._substitutions = None
+    
+    def read_data_files(self):
+        """Return (ingredients, recipes, glass size, pitcher size) from the JSON files
+        
+        Also called from the snapshot thread, so it must not touch the UI.
+        """
+        data_dir = self.data_dir
         
         # Load ingredients
         ingredients_file = os.path.join(data_dir, "ingredients.json")
         if os.path.exists(ingredients_file):
             try:
                 with open(ingredients_file, 'r') as f:
-                    self.ingredients = json.load(f)
+                    ingredients = json.load(f)
             except:
-                self.ingredients = self.default_ingredients.copy()
+                ingredients = self.default_ingredients.copy()
         else:
-            self.ingredients = self.default_ingredients.copy()
+            ingredients = self.default_ingredients.copy()
         
-        # Load recipes
+        # Load recipes into the shared recipe model
         recipes_file = os.path.join(data_dir, "recipes.json")
-        if os.path.exists(recipes_file):
-            try:
-                with open(recipes_file, 'r') as f:
-                    self.recipes = json.load(f)
-            except:
-                self.recipes = self.default_recipes.copy()
-        else:
-            self.recipes = self.default_recipes.copy()
+        recipes = load_recipe_store(recipes_file, default_recipes=self.default_recipes)
+        for ingredient in ingredients:
+            recipes.registry.intern(ingredient)
         
         # Load glass size
         glass_size_file = os.path.join(data_dir, "glass_size.json")
+        glass_size = 400
+        pitcher_size = DEFAULT_PITCHER_SIZE
         if os.path.exists(glass_size_file):
             try:
                 with open(glass_size_file, 'r') as f:
-                    self.glass_size = json.load(f)["glass_size"]
+                    sizes = json.load(f)
+                glass_size = sizes["glass_size"]
+                pitcher_size = sizes.get("pitcher_size", DEFAULT_PITCHER_SIZE)
             except:
-                self.glass_size = 400
+                glass_size = 400
+        return ingredients, recipes, glass_size, pitcher_size
+    
+    def get_pour_matrix(self):
+        """Return the pour matrix for the current recipes and slots, rebuilding it if stale"""
+        if self._pour_matrix is None:
+            self._pour_matrix = PourMatrix(self.recipes, self.ingredients)
+        return self._pour_matrix
+    
+    def get_substitutions(self):
+        """Return the substitution engine for the current pour matrix"""
+        pour_matrix = self.get_pour_matrix()
+        if self._substitutions is None or self._substitutions.matrix is not pour_matrix:
+            self._substitutions = SubstitutionEngine(pour_matrix, load_swap_groups(self.data_dir))
+        return self._substitutions
+    
+    def sizes_dict(self):
+        return {"glass_size": self.glass_size, "pitcher_size": self.pitcher_size}
+    
+    def save_data(self, recipes=(), slots=(), sizes=False):
+        """Save the given recipes, ingredient slots and the sizes if they changed nowhere else
+        
+        Recipes and ingredients no longer in the model are deleted. Records
+        someone else changed in the meantime are not written; they are shown
+        and replaced by the current version. Returns True if all were saved.
+        """
+        changes = []
+        for cocktail_name in recipes:
+            recipe = self.recipes.get(cocktail_name)
+            changes.append(Change(RECIPE, cocktail_name, recipe.to_dict() if recipe is not None else None,
+                                  version_of(self.versions, RECIPE, cocktail_name)))
+        for ingredient in slots:
+            changes.append(Change(SLOT, ingredient, self.ingredients.get(ingredient),
+                                  version_of(self.versions, SLOT, ingredient)))
+        if sizes:
+            changes.append(Change(SIZES, None, self.sizes_dict(), version_of(self.versions, SIZES)))
+        if not changes:
+            return True
+        self.unsaved_recipes.difference_update(recipes)
+        
+        # Recipes or slots may have changed
+        self._pour_matrix = None
+        conflict = None
+        # Our own writes must not come back from the reloader
+        with self.reloader.own_write():
+            try:
+                written = self.catalog.apply(changes, partial=True)
+            except VersionConflict as e:
+                conflict, written = e, e.versions
+        
+        outdated = {(c.kind, c.key) for c in conflict.conflicts} if conflict is not None else set()
+        if written is not None:
+            for change in changes:
+                if (change.kind, change.key) not in outdated:
+                    self.set_version(change.kind, change.key, version_of(written, change.kind, change.key))
+            self.snapshot_writer.request()
+        if conflict is None:
+            return True
+        
+        messagebox.showwarning("Konflikt", f"{conflict}\n\nDie aktuelle Fassung wurde übernommen.")
+        self.apply_conflicts(conflict.conflicts)
+        return False
+    
+    def set_version(self, kind, key, version):
+        if kind == SIZES:
+            self.versions[SIZES] = version
         else:
-            self.glass_size = 400
+            self.versions.setdefault(kind, {})[key] = version
     
-    def save_data(self):
-        """Save data to JSON files"""
-        data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-        if not os.path.exists(data_dir):
-            os.makedirs(data_dir)
-        
-        # Save ingredients
-        with open(os.path.join(data_dir, "ingredients.json"), 'w') as f:
-            json.dump(self.ingredients, f, indent=4)
-        
-        # Save recipes
-        with open(os.path.join(data_dir, "recipes.json"), 'w') as f:
-            json.dump(self.recipes, f, indent=4)
+    def apply_conflicts(self, conflicts):
+        """Replace outdated records in the model by the version in the store"""
+        delta = ConfigDelta()
+        ingredients = None
+        for conflict in conflicts:
+            if conflict.kind == RECIPE:
+                if conflict.current is None:
+                    delta.removed.append(conflict.key)
+                else:
+                    delta.recipes[conflict.key] = conflict.current
+            elif conflict.kind == SLOT:
+                ingredients = dict(self.ingredients) if ingredients is None else ingredients
+                if conflict.current is None:
+                    ingredients.pop(conflict.key, None)
+                else:
+                    ingredients[conflict.key] = conflict.current
+            elif conflict.current is not None:
+                delta.sizes = conflict.current
+            self.set_version(conflict.kind, conflict.key, conflict.actual)
+        delta.ingredients = ingredients
+        self.apply_config_delta(delta)
+    
+    def apply_config_delta(self, delta):
+        """Apply data file changes made outside the app to the running model and UI
+        
+        Only what changed is touched: recipes are updated in place, the search
+        index per recipe, and admin editors get their new values unless their
+        layout changed. Thumbnails and other caches are kept.
+        """
+        if delta.versions is not None:
+            # Versions only grow; ours may be newer than a delta collected before our own write
+            for kind in (RECIPE, SLOT):
+                for key, version in delta.versions.get(kind, {}).items():
+                    if version > version_of(self.versions, kind, key):
+                        self.set_version(kind, key, version)
+            self.versions[SIZES] = max(self.versions.get(SIZES, 0), delta.versions.get(SIZES, 0))
+            self.versions[CATALOG] = max(self.versions.get(CATALOG, 0), delta.versions.get(CATALOG, 0))
+            if not (delta.recipes or delta.removed or delta.ingredients is not None or delta.sizes is not None):
+                return
+        
+        if delta.ingredients is not None:
+            self.ingredients = delta.ingredients
+            for ingredient in self.ingredients:
+                self.recipes.registry.intern(ingredient)
+        
+        for cocktail_name, data in delta.recipes.items():
+            recipe = self.recipes.get(cocktail_name)
+            if recipe is None:
+                recipe = self.recipes.add(cocktail_name, data.get("image"), data.get("ingredients", {}),
+                                          data.get("glass_size"))
+                self.search_index.add(recipe)
+            else:
+                recipe.image = data.get("image")
+                recipe.glass_size = data.get("glass_size")
+                recipe.set_ingredients(data.get("ingredients", {}))
+                self.search_index.update(recipe)
+        # The other version wins over edits that were not saved yet; the editors show it below
+        self.unsaved_recipes.difference_update(delta.recipes, delta.removed)
+        for cocktail_name in delta.removed:
+            if cocktail_name in self.recipes:
+                del self.recipes[cocktail_name]
+                self.search_index.remove(cocktail_name)
+        
+        if delta.sizes is not None:
+            self.glass_size = delta.sizes.get("glass_size", self.glass_size)
+            self.pitcher_size = delta.sizes.get("pitcher_size", self.pitcher_size)
+            self.glass_display_label.config(text=f"Glasgröße: {self.glass_size}ml")
+            if self.admin_sections[0][2]:
+                self.glass_var.set(self.glass_size)
+                self.glass_label.config(text=f"{self.glass_size}ml")
+                self.pitcher_var.set(self.pitcher_size)
+                self.pitcher_label.config(text=f"{self.pitcher_size}ml")
+        
+        self._pour_matrix = None
+        self.snapshot_writer.request()
+        
+        # Admin editors
+        if delta.ingredients is not None:
+            # The slot choices of every row depend on the other rows
+            self.rebuild_admin_section(1)
+        if delta.recipes or delta.removed:
+            in_place = not delta.removed and all(
+                cocktail_name in self.recipe_vars and set(self.recipe_vars[cocktail_name]) == set(data.get("ingredients", {}))
+                for cocktail_name, data in delta.recipes.items())
+            if in_place:
+                for cocktail_name in delta.recipes:
+                    for ing, percentage in self.recipes[cocktail_name].items():
+                        self.recipe_vars[cocktail_name][ing].set(percentage)
+                self.update_recipe_totals()
+            else:
+                self.rebuild_admin_section(2)
         
-        # Save glass size
-        with open(os.path.join(data_dir, "glass_size.json"), 'w') as f:
-            json.dump({"glass_size": self.glass_size}, f, indent=4)
+        self.update_cocktail_grid()
     
     def setup_main_tab(self):
         """Set up the main tab for cocktail selection"""
@@ -152,8 +428,28 @@ class MainWindow:
         glass_frame = ttk.Frame(self.main_frame)
         glass_frame.pack(fill=tk.X, padx=10, pady=5)
         
-        glass_label = ttk.Label(glass_frame, text=f"Glasgröße: {self.glass_size}ml", font=("Arial", 12))
-        glass_label.pack(side=tk.LEFT)
+        self.glass_display_label = ttk.Label(glass_frame, text=f"Glasgröße: {self.glass_size}ml", font=("Arial", 12))
+        self.glass_display_label.pack(side=tk.LEFT)
+        
+        # Search and filters
+        search_frame = ttk.Frame(self.main_frame)
+        search_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        ttk.Label(search_frame, text="Suche:").pack(side=tk.LEFT, padx=5)
+        self.search_var = tk.StringVar()
+        ttk.Entry(search_frame, textvariable=self.search_var).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(search_frame, text="Ohne:").pack(side=tk.LEFT, padx=5)
+        self.exclude_var = tk.StringVar()
+        exclude_combo = ttk.Combobox(search_frame, textvariable=self.exclude_var, state="readonly", width=20)
+        exclude_combo.configure(postcommand=lambda: exclude_combo.configure(values=[""] + list(self.ingredients)))
+        exclude_combo.pack(side=tk.LEFT, padx=5)
+        
+        self.only_available_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(search_frame, text="Nur verfügbare Drinks", variable=self.only_available_var).pack(side=tk.LEFT, padx=5)
+        
+        for var in (self.search_var, self.exclude_var, self.only_available_var):
+            var.trace_add("write", lambda *args: self.show_grid_page(0))
         
         # Cocktail grid
         self.cocktail_frame = ttk.Frame(self.main_frame)
@@ -176,8 +472,24 @@ class MainWindow:
         for widget in self.recipe_details_frame.winfo_children():
             widget.destroy()
         
+        # Find the cocktails matching the search and filters
+        exclude = [self.exclude_var.get()] if self.exclude_var.get() else []
+        loaded = loaded_ingredients(self.ingredients) if self.only_available_var.get() else None
+        names = self.search_index.search(self.search_var.get(), exclude=exclude, loaded=loaded)
+        # In the low-memory profile only one page of thumbnails is alive
+        page_size = self.memory.page_size
+        num_pages = 1
+        if page_size is not None:
+            num_pages = max(1, math.ceil(len(names) / page_size))
+            self.grid_page = min(self.grid_page, num_pages - 1)
+            names = names[self.grid_page * page_size:(self.grid_page + 1) * page_size]
+        pour_matrix = self.get_pour_matrix()
+        available = pour_matrix.available()
+        # Something to offer instead of each drink that can't be made
+        alternatives = self.get_substitutions().best_alternatives(names)
+        
         # Calculate grid dimensions
-        total_cocktails = len(self.recipes)
+        total_cocktails = len(names)
         cocktails_per_row = 3 if total_cocktails % 3 == 0 else 2
         num_rows = math.ceil(total_cocktails / cocktails_per_row)
         
@@ -186,8 +498,8 @@ class MainWindow:
             for col in range(cocktails_per_row):
                 cocktail_idx = row * cocktails_per_row + col
                 if cocktail_idx < total_cocktails:
-                    cocktail_name = list(self.recipes.keys())[cocktail_idx]
-                    recipe_data = self.recipes[cocktail_name]
+                    cocktail_name = names[cocktail_idx]
+                    recipe = self.recipes[cocktail_name]
                     
                     # Create frame for cocktail
                     cocktail_frame = ttk.Frame(self.cocktail_frame, relief=tk.RAISED, borderwidth=1)
@@ -195,9 +507,7 @@ class MainWindow:
                     
                     # Load and display image
                     try:
-                        img = Image.open(recipe_data["image"])
-                        img = img.resize((200, 266), Image.Resampling.LANCZOS)
-                        photo = ImageTk.PhotoImage(img)
+                        photo = self.get_thumbnail(recipe.image)
                         
                         img_label = ttk.Label(cocktail_frame, image=photo)
                         img_label.image = photo  # Keep a reference
@@ -210,20 +520,86 @@ class MainWindow:
                     btn = ttk.Button(cocktail_frame, text=cocktail_name, 
                                     command=lambda name=cocktail_name: self.show_recipe_details(name))
                     btn.pack(padx=5, pady=5, fill=tk.X)
+                    
+                    # Drinks with an ingredient that is not loaded can't be made
+                    if not available[pour_matrix.row_of[cocktail_name]]:
+                        btn.state(["disabled"])
+                        alternative = alternatives.get(cocktail_name)
+                        if alternative is not None:
+                            ttk.Button(cocktail_frame, text=f"Stattdessen: {alternative.label()}",
+                                       command=lambda a=alternative: self.show_recipe_details(a.name, a.swaps)
+                                       ).pack(padx=5, pady=(0, 5), fill=tk.X)
         
         # Configure grid weights
         for i in range(num_rows):
             self.cocktail_frame.grid_rowconfigure(i, weight=1)
         for i in range(cocktails_per_row):
             self.cocktail_frame.grid_columnconfigure(i, weight=1)
+        if num_pages > 1:
+            self.add_grid_pager(num_pages, num_rows, cocktails_per_row)
+        if self.memory.low:
+            self.release_mapped()
+    
+    def add_grid_pager(self, num_pages, row, columns):
+        """Add previous/next buttons below the grid rows"""
+        pager = ttk.Frame(self.cocktail_frame)
+        pager.grid(row=row, column=0, columnspan=columns, pady=5)
+        back = ttk.Button(pager, text="◀ Zurück", command=lambda: self.show_grid_page(self.grid_page - 1))
+        back.pack(side=tk.LEFT, padx=5)
+        ttk.Label(pager, text=f"Seite {self.grid_page + 1} von {num_pages}").pack(side=tk.LEFT, padx=5)
+        forward = ttk.Button(pager, text="Weiter ▶", command=lambda: self.show_grid_page(self.grid_page + 1))
+        forward.pack(side=tk.LEFT, padx=5)
+        if self.grid_page == 0:
+            back.state(["disabled"])
+        if self.grid_page == num_pages - 1:
+            forward.state(["disabled"])
+    
+    def show_grid_page(self, page):
+        self.grid_page = max(0, page)
+        self.update_cocktail_grid()
     
-    def show_recipe_details(self, cocktail_name):
-        """Show recipe details for the selected cocktail"""
+    def get_thumbnail(self, image_path, max_entries=None):
+        """Return the grid thumbnail of an image, decoding it only on a cache miss"""
+        if max_entries is None:
+            max_entries = self.memory.thumbnail_entries
+        mtime = os.stat(image_path).st_mtime_ns
+        key = (image_path, mtime)
+        photo = self.thumbnail_cache.get(key)
+        image_cache_access(photo is not None)
+        if photo is not None:
+            self.thumbnail_cache.move_to_end(key)
+            return photo
+        
+        img = self.snapshot.thumbnail(image_path, mtime) if self.snapshot is not None else None
+        if img is not None:
+            photo = ImageTk.PhotoImage(img)
+        else:
+            photo = tk.PhotoImage(data=bytes(self.thumbnail_pack.tile(image_path, GRID_SIZE)), format="ppm")
+        self.thumbnail_cache[key] = photo
+        if len(self.thumbnail_cache) > max_entries:
+            self.thumbnail_cache.popitem(last=False)
+        return photo
+    
+    def show_recipe_details(self, cocktail_name, swaps=None):
+        """Show recipe details for the selected cocktail
+        
+        `swaps` ({ingredient: replacement}) pours a variant with substituted ingredients.
+        """
+        order = order_placed(cocktail_name)
+        self.order_trace.record(cocktail_name)
+        
         # Clear existing widgets
         for widget in self.recipe_details_frame.winfo_children():
             widget.destroy()
         
-        recipe_data = self.recipes[cocktail_name]
+        pours = self.get_pour_matrix().recipe_pours(cocktail_name, self.glass_size)
+        if swaps:
+            pours = [(swaps.get(ing, ing), percentage, ml_amount) for ing, percentage, ml_amount in pours]
+        order_id = None
+        if self.pumps is not None:
+            order_id = self.order_progress.next_id()
+            self.dispense(order, cocktail_name, {self.ingredients[ing]: ml_amount for ing, percentage, ml_amount in pours},
+                          order_id)
         
         # Title
         title_label = ttk.Label(self.recipe_details_frame, text=f"Rezept: {cocktail_name}", font=("Arial", 16, "bold"))
@@ -241,9 +617,7 @@ class MainWindow:
         ttk.Label(ingredients_frame, text="Prozent", font=("Arial", 12, "bold")).grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
         ttk.Label(ingredients_frame, text="Menge (ml)", font=("Arial", 12, "bold")).grid(row=0, column=2, padx=5, pady=5, sticky=tk.W)
         
-        for i, (ing, percentage) in enumerate(recipe_data["ingredients"].items()):
-            ml_amount = (percentage / 100) * self.glass_size
-            
+        for i, (ing, percentage, ml_amount) in enumerate(pours):
             ttk.Label(ingredients_frame, text=ing).grid(row=i+1, column=0, padx=5, pady=2, sticky=tk.W)
             ttk.Label(ingredients_frame, text=f"{percentage:.1f}%").grid(row=i+1, column=1, padx=5, pady=2, sticky=tk.W)
             ttk.Label(ingredients_frame, text=f"{ml_amount:.1f}ml").grid(row=i+1, column=2, padx=5, pady=2, sticky=tk.W)
@@ -251,29 +625,237 @@ class MainWindow:
         # Success message
         success_label = ttk.Label(self.recipe_details_frame, text=f"Du hast {cocktail_name} ausgewählt! Prost! 🍹", font=("Arial", 12))
         success_label.pack(pady=10)
+        
+        # Live progress of this drink while it waits and pours
+        if order_id is not None:
+            progress_bar = ttk.Progressbar(self.recipe_details_frame, length=300, maximum=100)
+            progress_bar.pack(pady=5)
+            success_label.config(text="Bestellung angenommen …")
+            self.progress_view = (order_id, cocktail_name, success_label, progress_bar)
+        
+        # Rounds and pitchers
+        batch_frame = ttk.Frame(self.recipe_details_frame)
+        batch_frame.pack(pady=5)
+        
+        ttk.Label(batch_frame, text="Portionen:").pack(side=tk.LEFT, padx=5)
+        servings_var = tk.IntVar(value=4)
+        ttk.Spinbox(batch_frame, from_=2, to=50, textvariable=servings_var, width=5).pack(side=tk.LEFT, padx=5)
+        ttk.Button(batch_frame, text="Runde zapfen",
+                   command=lambda: self.pour_batch(cocktail_name, servings_var.get())).pack(side=tk.LEFT, padx=5)
+        ttk.Button(batch_frame, text=f"Krug füllen ({self.pitcher_size}ml)",
+                   command=lambda: self.pour_batch(cocktail_name, self.pitcher_size / self.glass_size)).pack(side=tk.LEFT, padx=5)
     
-    def setup_admin_tab(self):
-        """Set up the admin tab for managing ingredients and recipes"""
-        # Create notebook for admin sections
-        admin_notebook = ttk.Notebook(self.admin_frame)
-        admin_notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    def pour_batch(self, cocktail_name, servings):
+        """Pour several servings as one continuous pour per slot and pitcher fill"""
+        pour_matrix = self.get_pour_matrix()
+        try:
+            fills = pour_matrix.batch_pours(cocktail_name, servings, self.glass_size, self.pitcher_size)
+            single = pour_matrix.batch_pours(cocktail_name, 1, self.glass_size, slot_max=None)[0]
+        except ValueError as e:
+            messagebox.showerror("Fehler", str(e))
+            return
         
-        # Glass size tab
-        glass_frame = ttk.Frame(admin_notebook)
-        admin_notebook.add(glass_frame, text="Glasgröße")
+        # Pumping time only: at the machine nobody waits for a handover or rinse
+        config = live_config(SimulationConfig(flow_rates=self.flow_rates))
+        batch_minutes = sum(config.drink_seconds(fill) for fill in fills) / 60
+        single_minutes = servings * config.drink_seconds(single) / 60
+        swaps = f", {len(fills) - 1} Krugwechsel" if len(fills) > 1 else ""
+        if self.pumps is not None:
+            self.pour_fills(cocktail_name, fills)
+        messagebox.showinfo("Runde", f"{servings:g} x {cocktail_name}: {len(fills)} Krug-Füllung(en) "
+                            f"à {sum(fills[0].values()):.0f}ml\n"
+                            f"Zapfzeit ca. {batch_minutes:.1f} min{swaps} (einzeln {single_minutes:.1f} min)")
+    
+    def pour_fills(self, cocktail_name, fills):
+        """Pour the first pitcher fill; the next one only once the operator swapped the pitcher"""
+        pour = self.dispense(order_placed(cocktail_name), cocktail_name, fills[0])
+        if pour is None or len(fills) == 1:
+            return
         
-        # Ingredients tab
-        ingredients_frame = ttk.Frame(admin_notebook)
-        admin_notebook.add(ingredients_frame, text="Zutaten")
+        def ask():
+            if messagebox.askokcancel("Krug voll", f"Krug getauscht? Noch {len(fills) - 1} Füllung(en) "
+                                      f"{cocktail_name}."):
+                self.pour_fills(cocktail_name, fills[1:])
         
-        # Recipes tab
-        recipes_frame = ttk.Frame(admin_notebook)
-        admin_notebook.add(recipes_frame, text="Rezepte")
+        def poured(future):
+            # Runs on the pump thread
+            if future.exception() is None:
+                self.root.after(0, ask)
+            else:
+                self.root.after(0, lambda: messagebox.showerror(
+                    "Fehler", f"Krug-Füllung konnte nicht gezapft werden; {len(fills) - 1} Füllung(en) ausgelassen"))
         
-        # Setup each tab
-        self.setup_glass_size_tab(glass_frame)
-        self.setup_ingredients_tab(ingredients_frame)
-        self.setup_recipes_tab(recipes_frame)
+        pour.add_done_callback(poured)
+    
+    def journal_failed(self, error):
+        """Tell the staff that interrupted drinks can no longer be recovered"""
+        messagebox.showwarning("Journal", f"Das Ausschank-Journal kann nicht mehr geschrieben werden: {error}\n\n"
+                                          "Drinks werden weiter gemixt, nach einem Stromausfall aber nicht fortgesetzt.")
+
+    def recover_pours(self):
+        """Offer to finish the drinks that were being poured when the last run ended"""
+        if not self.journal.incomplete:
+            return
+        # The controller may still be running pumps of the old session
+        self.pumps.stop()
+        for entry in list(self.journal.incomplete):
+            poured = ", ".join(f"Slot {slot}: {entry.dispensed.get(slot, 0.0):.0f}/{ml:.0f}ml"
+                               for slot, ml in entry.targets.items())
+            if messagebox.askyesno("Unterbrochener Drink",
+                                   f"{entry.cocktail or 'Ein Drink'} wurde nicht fertig gezapft ({poured}).\n"
+                                   f"Rest jetzt zapfen?"):
+                rest = self.journal.resume(entry)
+                if rest:
+                    self.maintenance.submit(entry.cocktail or "Rest", rest)
+            else:
+                self.journal.abort(entry)
+    
+    def show_order_progress(self, statuses):
+        """Draw the newest progress of the drink shown in the details view"""
+        if self.progress_view is None:
+            return
+        order_id, cocktail_name, label, progress_bar = self.progress_view
+        if not label.winfo_exists():
+            # The details view was cleared
+            self.progress_view = None
+            return
+        status = next((status for status in statuses if status.id == order_id), None)
+        if status is None:
+            return
+        progress_bar["value"] = status.fraction * 100
+        if status.state == QUEUED:
+            ahead = f"{status.position} Drink(s) vor dir, " if status.position else ""
+            label.config(text=f"{cocktail_name}: {ahead}fertig in ca. {math.ceil(status.eta)} s")
+        elif status.state == POURING:
+            label.config(text=f"{cocktail_name} wird gezapft: {status.fraction:.0%}, noch ca. {math.ceil(status.eta)} s")
+        elif status.state == DONE:
+            label.config(text=f"Dein {cocktail_name} ist fertig! Prost! 🍹")
+            self.progress_view = None
+        else:
+            label.config(text=f"{cocktail_name} konnte nicht gezapft werden")
+            self.progress_view = None
+    
+    def dispense(self, order, cocktail_name, slot_ml, order_id=None):
+        """Queue a pour of {slot: ml}; all pumps of a pour start with one command
+
+        Returns the Future of the pour, or None if it could not be queued.
+        """
+        try:
+            pour = self.maintenance.submit(cocktail_name, slot_ml, order_id)
+            if self.closed_loop is not None:
+                # Measured volumes instead of pump times, so no duty cycle here
+                pour.add_done_callback(lambda f: order_poured(order) if f.exception() is None else None)
+            else:
+                pour.add_done_callback(lambda f: order_poured(order, f.result()) if f.exception() is None else None)
+        except (PumpControllerError, ValueError) as e:
+            messagebox.showerror("Fehler", f"Pumpen konnten nicht gestartet werden: {e}")
+            return None
+        return pour
+    
+    def setup_admin_tab(self):
+        """Set up the admin tab for managing ingredients and recipes
+        
+        The sections are only built when they are first shown, so the customer
+        tab appears without waiting for one spinbox per recipe ingredient.
+        """
+        # Create notebook for admin sections
+        self.admin_notebook = ttk.Notebook(self.admin_frame)
+        self.admin_notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # [frame, builder, built] per section
+        self.admin_sections = []
+        for text, builder in (("Glasgröße", self.setup_glass_size_tab),
+                              ("Zutaten", self.setup_ingredients_tab),
+                              ("Rezepte", self.setup_recipes_tab)):
+            frame = ttk.Frame(self.admin_notebook)
+            self.admin_notebook.add(frame, text=text)
+            self.admin_sections.append([frame, builder, False])
+        
+        self.ingredient_vars = {}
+        self.recipe_vars = {}
+        self.recipe_total_vars = {}
+        self.new_recipe_form = None
+        self.new_ingredient_form = None
+        self.admin_teardown = None
+        
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+        self.admin_notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+    
+    def admin_visible(self):
+        return str(self.notebook.select()) == str(self.admin_frame)
+    
+    def on_tab_changed(self, event=None):
+        """Build the admin section being shown, schedule the teardown when leaving Admin"""
+        if self.admin_visible():
+            if self.admin_teardown is not None:
+                self.root.after_cancel(self.admin_teardown)
+                self.admin_teardown = None
+            self.build_admin_section()
+            if self.memory.low and not self.admin_has_unsaved_changes():
+                # Only the section being shown keeps its widgets
+                selected = self.admin_notebook.index(self.admin_notebook.select())
+                for index in range(len(self.admin_sections)):
+                    if index != selected:
+                        self.rebuild_admin_section(index)
+        elif self.admin_teardown is None and any(built for _, _, built in self.admin_sections):
+            self.admin_teardown = self.root.after(self.memory.admin_idle_ms, self.teardown_admin_tab)
+    
+    def build_admin_section(self, index=None):
+        """Build an admin section (default: the selected one) unless it exists already"""
+        if index is None:
+            index = self.admin_notebook.index(self.admin_notebook.select())
+        section = self.admin_sections[index]
+        if not section[2]:
+            section[1](section[0])
+            section[2] = True
+    
+    def rebuild_admin_section(self, index):
+        """Rebuild a section after its data changed; hidden sections are rebuilt when shown"""
+        frame, _, built = self.admin_sections[index]
+        if not built:
+            return
+        for widget in frame.winfo_children():
+            widget.destroy()
+        self.admin_sections[index][2] = False
+        if index == 1:
+            self.ingredient_vars = {}
+            self.new_ingredient_form = None
+        elif index == 2:
+            self.recipe_vars = {}
+            self.recipe_total_vars = {}
+            self.new_recipe_form = None
+        if self.admin_visible() and self.admin_notebook.index(self.admin_notebook.select()) == index:
+            self.build_admin_section(index)
+    
+    def admin_has_unsaved_changes(self):
+        """Return True if an admin form holds input that is not in the data files"""
+        if self.unsaved_recipes:
+            return True
+        for cocktail_name, recipe_vars in self.recipe_vars.items():
+            if cocktail_name in self.recipes and \
+                    self.read_recipe_vars(recipe_vars) != dict(self.recipes[cocktail_name].items()):
+                return True
+        if self.new_recipe_form is not None:
+            name_var, image_path_var, ingredient_vars = self.new_recipe_form
+            if name_var.get() or image_path_var.get() or any(self.read_recipe_vars(ingredient_vars).values()):
+                return True
+        if self.new_ingredient_form is not None:
+            name_var, slot_var = self.new_ingredient_form
+            if name_var.get() or slot_var.get():
+                return True
+        return False
+    
+    def teardown_admin_tab(self):
+        """Destroy the admin sections while the customer tab is shown"""
+        self.admin_teardown = None
+        if self.admin_visible():
+            return
+        if self.admin_has_unsaved_changes():
+            # Keep half-typed input; try again later
+            self.admin_teardown = self.root.after(self.memory.admin_idle_ms, self.teardown_admin_tab)
+            return
+        for index in range(len(self.admin_sections)):
+            self.rebuild_admin_section(index)
     
     def setup_glass_size_tab(self, parent):
         """Set up the glass size tab"""
@@ -295,15 +877,33 @@ class MainWindow:
         glass_label = ttk.Label(glass_frame, text=f"{self.glass_size}ml")
         glass_label.pack(side=tk.LEFT, padx=5)
         
+        # Pitcher size slider for rounds
+        pitcher_frame = ttk.Frame(parent)
+        pitcher_frame.pack(fill=tk.X, padx=20, pady=10)
+        
+        ttk.Label(pitcher_frame, text="Krug-Größe (ml):").pack(side=tk.LEFT, padx=5)
+        
+        pitcher_var = tk.IntVar(value=self.pitcher_size)
+        pitcher_slider = ttk.Scale(pitcher_frame, from_=500, to=5000, variable=pitcher_var,
+                                   orient=tk.HORIZONTAL, length=300, command=self.update_glass_size)
+        pitcher_slider.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        
+        pitcher_label = ttk.Label(pitcher_frame, text=f"{self.pitcher_size}ml")
+        pitcher_label.pack(side=tk.LEFT, padx=5)
+        
         # Store references
         self.glass_var = glass_var
         self.glass_label = glass_label
+        self.pitcher_var = pitcher_var
+        self.pitcher_label = pitcher_label
     
     def update_glass_size(self, *args):
-        """Update glass size when slider changes"""
+        """Update glass and pitcher size when a slider changes"""
         self.glass_size = self.glass_var.get()
         self.glass_label.config(text=f"{self.glass_size}ml")
-        self.save_data()
+        self.pitcher_size = self.pitcher_var.get()
+        self.pitcher_label.config(text=f"{self.pitcher_size}ml")
+        self.save_data(sizes=True)
     
     def setup_ingredients_tab(self, parent):
         """Set up the ingredients tab"""
@@ -392,11 +992,10 @@ class MainWindow:
             self.ingredients[ingredient] = int(slot)
         else:
             self.ingredients[ingredient] = "-"
-        self.save_data()
+        self.save_data(slots=[ingredient])
     
     def save_ingredients(self):
-        """Save ingredient changes"""
-        self.save_data()
+        """Confirm ingredient changes; every slot is saved as soon as it is selected"""
         messagebox.showinfo("Erfolg", "Zutaten wurden gespeichert!")
     
     def setup_new_ingredient_form(self, parent):
@@ -432,6 +1031,7 @@ class MainWindow:
         add_btn = ttk.Button(parent, text="Zutat hinzufügen", 
                             command=lambda: self.add_new_ingredient(name_var.get(), slot_var.get()))
         add_btn.pack(pady=10)
+        self.new_ingredient_form = (name_var, slot_var)
     
     def add_new_ingredient(self, name, slot):
         """Add a new ingredient"""
@@ -448,10 +1048,11 @@ class MainWindow:
             return
         
         self.ingredients[name] = int(slot)
-        self.save_data()
+        self.save_data(slots=[name])
         
-        # Refresh the ingredients tab
-        self.setup_ingredients_tab(self.admin_frame.winfo_children()[0].select(1))
+        # Refresh the ingredients tab and the new recipe form, which lists every ingredient
+        self.rebuild_admin_section(1)
+        self.rebuild_admin_section(2)
         messagebox.showinfo("Erfolg", f"{name} wurde hinzugefügt!")
     
     def setup_recipes_tab(self, parent):
@@ -495,14 +1096,13 @@ class MainWindow:
         canvas.pack(side="left", fill="both", expand=True)
         scrollbar.pack(side="right", fill="y")
         
-        # Function to validate percentages
-        def validate_percentages(ingredients):
-            total = sum(ingredients.values())
-            return abs(total - 100) < 0.1  # Allow small rounding errors
-        
         # Create widgets for each recipe
         self.recipe_vars = {}
-        for cocktail_name, recipe_data in self.recipes.items():
+        self.recipe_total_vars = {}
+        pour_matrix = self.get_pour_matrix()
+        for recipe in self.recipes:
+            cocktail_name = recipe.name
+            
             # Create frame for recipe
             recipe_frame = ttk.LabelFrame(scrollable_frame, text=f"Rezept: {cocktail_name}")
             recipe_frame.pack(fill=tk.X, padx=5, pady=5)
@@ -521,7 +1121,7 @@ class MainWindow:
             
             # Create widgets for each ingredient
             recipe_vars = {}
-            for ing, percentage in recipe_data["ingredients"].items():
+            for ing, percentage in recipe.items():
                 ing_frame = ttk.Frame(ingredients_frame)
                 ing_frame.pack(fill=tk.X, padx=5, pady=2)
                 
@@ -536,6 +1136,7 @@ class MainWindow:
                 # Add update function
                 spinbox.bind("<KeyRelease>", lambda e, name=cocktail_name, ing=ing: 
                             self.update_recipe_ingredient(name, ing))
+                spinbox.bind("<FocusOut>", lambda e, name=cocktail_name: self.save_recipe_edits(name))
             
             # Store recipe variables
             self.recipe_vars[cocktail_name] = recipe_vars
@@ -544,9 +1145,14 @@ class MainWindow:
             total_frame = ttk.Frame(recipe_frame)
             total_frame.pack(fill=tk.X, padx=5, pady=5)
             
-            total_var = tk.StringVar(value=f"Gesamtsumme: {sum(recipe_data['ingredients'].values()):.1f}%")
+            total_var = tk.StringVar(value=f"Gesamtsumme: {recipe.total_percentage():.1f}%")
             total_label = ttk.Label(total_frame, textvariable=total_var)
             total_label.pack(side=tk.LEFT, padx=5)
+            self.recipe_total_vars[cocktail_name] = total_var
+            
+            normalize_btn = ttk.Button(total_frame, text="Auf 100% skalieren",
+                                      command=lambda name=cocktail_name: self.normalize_recipe(name))
+            normalize_btn.pack(side=tk.LEFT, padx=5)
             
             # ML amounts
             ml_frame = ttk.Frame(recipe_frame)
@@ -554,9 +1160,7 @@ class MainWindow:
             
             ttk.Label(ml_frame, text="Mengen in ml (basierend auf Glasgröße):").pack(anchor=tk.W, padx=5, pady=5)
             
-            for ing, percentage in recipe_data["ingredients"].items():
-                ml_amount = (percentage / 100) * self.glass_size
-                
+            for ing, percentage, ml_amount in pour_matrix.recipe_pours(cocktail_name, self.glass_size):
                 ml_ing_frame = ttk.Frame(ml_frame)
                 ml_ing_frame.pack(fill=tk.X, padx=5, pady=2)
                 
@@ -572,50 +1176,118 @@ class MainWindow:
         save_all_btn = ttk.Button(scrollable_frame, text="Alle Rezepte speichern", command=self.save_all_recipes)
         save_all_btn.pack(pady=10)
     
+    def read_recipe_vars(self, ingredient_vars):
+        """Return the editor values of one recipe, keeping unparsable input as text"""
+        values = {}
+        for ing, var in ingredient_vars.items():
+            try:
+                values[ing] = var.get()
+            except tk.TclError:
+                values[ing] = self.root.getvar(str(var))
+        return values
+    
+    def update_recipe_totals(self):
+        """Validate all recipe editors in one batch and update their totals"""
+        values = {name: self.read_recipe_vars(recipe_vars) for name, recipe_vars in self.recipe_vars.items()}
+        errors = validate_catalog(values)
+        for cocktail_name, total_var in self.recipe_total_vars.items():
+            if cocktail_name in errors:
+                total_var.set(errors[cocktail_name][0])
+            else:
+                total_var.set("Gesamtsumme: 100.0% ✓")
+    
     def update_recipe_ingredient(self, cocktail_name, ingredient):
         """Update recipe ingredient when changed"""
         if cocktail_name in self.recipe_vars and ingredient in self.recipe_vars[cocktail_name]:
-            percentage = self.recipe_vars[cocktail_name][ingredient].get()
-            self.recipes[cocktail_name]["ingredients"][ingredient] = percentage
-            self.save_data()
-    
-    def save_recipe(self, cocktail_name):
-        """Save a specific recipe"""
-        if cocktail_name in self.recipe_vars:
-            # Validate percentages
-            ingredients = {ing: var.get() for ing, var in self.recipe_vars[cocktail_name].items()}
-            total = sum(ingredients.values())
-            
-            if abs(total - 100) < 0.1:  # Allow small rounding errors
-                self.recipes[cocktail_name]["ingredients"] = ingredients
-                self.save_data()
-                messagebox.showinfo("Erfolg", f"Rezept für {cocktail_name} wurde gespeichert!")
-            else:
-                messagebox.showerror("Fehler", f"Die Summe der Prozente muss 100% ergeben! Aktuelle Summe: {total:.1f}%")
+            try:
+                percentage = self.recipe_vars[cocktail_name][ingredient].get()
+            except tk.TclError:
+                # Incomplete input while typing
+                percentage = None
+            if percentage is not None:
+                self.recipes[cocktail_name].set_percentage(ingredient, percentage)
+                self.search_index.update(self.recipes[cocktail_name])
+                self.unsaved_recipes.add(cocktail_name)
+            self.update_recipe_totals()
+    
+    def save_recipe_edits(self, cocktail_name):
+        """Write a recipe changed by typing once its field loses focus"""
+        if cocktail_name in self.unsaved_recipes and cocktail_name in self.recipes:
+            self.save_data(recipes=[cocktail_name])
+    
+    def normalize_recipe(self, cocktail_name):
+        """Scale a recipe's percentages so they add up to 100%"""
+        ingredients = self.read_recipe_vars(self.recipe_vars[cocktail_name])
+        try:
+            normalized = normalize_percentages({ing: pct for ing, pct in ingredients.items() if pct != ""})
+        except ValueError as e:
+            messagebox.showerror("Fehler", str(e))
+            return
+        
+        for ing, var in self.recipe_vars[cocktail_name].items():
+            var.set(normalized.get(ing, 0.0))
+        self.update_recipe_totals()
+    
+    def save_recipe(self, cocktail_name, notify=True):
+        """Save a specific recipe, returning True on success"""
+        if cocktail_name not in self.recipe_vars:
+            return False
+        
+        ingredients = self.read_recipe_vars(self.recipe_vars[cocktail_name])
+        errors = validate_recipe(ingredients)
+        if errors:
+            if notify:
+                messagebox.showerror("Fehler", "\n".join(errors))
+            return False
+        
+        self.recipes[cocktail_name].set_ingredients({ing: float(to_decimal(pct)) for ing, pct in ingredients.items()})
+        self.search_index.update(self.recipes[cocktail_name])
+        if not self.save_data(recipes=[cocktail_name]):
+            return False
+        if notify:
+            messagebox.showinfo("Erfolg", f"Rezept für {cocktail_name} wurde gespeichert!")
+        return True
     
     def save_all_recipes(self):
-        """Save all recipes"""
-        for cocktail_name in self.recipe_vars:
-            self.save_recipe(cocktail_name)
-        messagebox.showinfo("Erfolg", "Alle Rezepte wurden gespeichert!")
+        """Save all valid recipes and report every error in one message"""
+        values = {name: self.read_recipe_vars(recipe_vars) for name, recipe_vars in self.recipe_vars.items()}
+        errors = validate_catalog(values)
+        valid = [cocktail_name for cocktail_name in values if cocktail_name not in errors]
+        for cocktail_name in valid:
+            self.recipes[cocktail_name].set_ingredients({ing: float(to_decimal(pct)) for ing, pct in values[cocktail_name].items()})
+            self.search_index.update(self.recipes[cocktail_name])
+        saved = self.save_data(recipes=valid)
+        self.update_recipe_totals()
+        
+        if not saved:
+            # The conflicts were reported already
+            return
+        if errors:
+            messagebox.showerror("Fehler", f"{len(values) - len(errors)} von {len(values)} Rezepten gespeichert.\n\n"
+                                 + format_catalog_errors(errors))
+        else:
+            messagebox.showinfo("Erfolg", "Alle Rezepte wurden gespeichert!")
     
     def delete_recipe(self, cocktail_name):
         """Delete a recipe"""
         if messagebox.askyesno("Bestätigung", f"Möchten Sie das Rezept für {cocktail_name} wirklich löschen?"):
+            # Remove the cocktail from recipes; if someone changed it meanwhile, it comes back
+            image_path = self.recipes[cocktail_name].image
+            del self.recipes[cocktail_name]
+            self.search_index.remove(cocktail_name)
+            if not self.save_data(recipes=[cocktail_name]):
+                return
+            
             # Remove the cocktail's image file if it exists
-            image_path = self.recipes[cocktail_name]["image"]
             try:
                 if os.path.exists(image_path):
                     os.remove(image_path)
             except Exception as e:
                 messagebox.showerror("Fehler", f"Fehler beim Löschen des Bildes für {cocktail_name}: {e}")
             
-            # Remove the cocktail from recipes
-            del self.recipes[cocktail_name]
-            self.save_data()
-            
-            # Refresh the recipes tab
-            self.setup_recipes_tab(self.admin_frame.winfo_children()[0].select(2))
+            # Refresh the recipes tab and main tab
+            self.rebuild_admin_section(2)
+            self.update_cocktail_grid()
             messagebox.showinfo("Erfolg", f"Cocktail {cocktail_name} wurde gelöscht!")
     
     def setup_new_recipe_tab(self, parent):
@@ -649,6 +1321,8 @@ class MainWindow:
         image_path_label.pack(side=tk.LEFT, padx=5)
         
         def browse_image():
+            # Only the admin opens files, so the dialog module is loaded on first use
+            from tkinter import filedialog
             file_path = filedialog.askopenfilename(
                 title="Bild auswählen",
                 filetypes=[("Image files", "*.jpg *.jpeg *.png")]
@@ -687,12 +1361,25 @@ class MainWindow:
         
         # Update total when any ingredient changes
         def update_total(*args):
-            total = sum(var.get() for var in new_recipe_vars.values())
-            total_var.set(f"Gesamtsumme: {total:.1f}%")
+            ingredients = {ing: pct for ing, pct in self.read_recipe_vars(new_recipe_vars).items() if pct}
+            errors = validate_recipe(ingredients) if ingredients else []
+            total_var.set(errors[0] if errors else f"Gesamtsumme: {100.0 if ingredients else 0.0:.1f}%")
         
         for var in new_recipe_vars.values():
             var.trace_add("write", update_total)
         
+        def normalize_new_recipe():
+            ingredients = self.read_recipe_vars(new_recipe_vars)
+            try:
+                normalized = normalize_percentages({ing: pct for ing, pct in ingredients.items() if pct != ""})
+            except ValueError as e:
+                messagebox.showerror("Fehler", str(e))
+                return
+            for ing, var in new_recipe_vars.items():
+                var.set(normalized.get(ing, 0.0))
+        
+        ttk.Button(total_frame, text="Auf 100% skalieren", command=normalize_new_recipe).pack(side=tk.LEFT, padx=5)
+        
         # ML amounts
         ml_frame = ttk.LabelFrame(form_frame, text="Mengen in ml (basierend auf Glasgröße):")
         ml_frame.pack(fill=tk.X, padx=5, pady=10)
@@ -701,29 +1388,20 @@ class MainWindow:
         add_btn = ttk.Button(form_frame, text="Cocktail hinzufügen", 
                             command=lambda: self.add_new_recipe(name_var.get(), image_path_var.get(), new_recipe_vars))
         add_btn.pack(pady=10)
+        self.new_recipe_form = (name_var, image_path_var, new_recipe_vars)
     
     def add_new_recipe(self, name, image_path, ingredient_vars):
         """Add a new recipe"""
-        if not name:
-            messagebox.showerror("Fehler", "Bitte geben Sie einen Namen ein!")
-            return
-        
-        if not image_path:
-            messagebox.showerror("Fehler", "Bitte wählen Sie ein Bild aus!")
-            return
-        
         # Get ingredients with percentage > 0
-        ingredients = {ing: var.get() for ing, var in ingredient_vars.items() if var.get() > 0}
+        ingredients = {ing: pct for ing, pct in self.read_recipe_vars(ingredient_vars).items() if pct}
         
-        if not ingredients:
-            messagebox.showerror("Fehler", "Bitte fügen Sie mindestens eine Zutat hinzu!")
-            return
-        
-        # Validate percentages
-        total = sum(ingredients.values())
-        if abs(total - 100) >= 0.1:  # Allow small rounding errors
-            messagebox.showerror("Fehler", f"Die Summe der Prozente muss 100% ergeben! Aktuelle Summe: {total:.1f}%")
+        errors = validate_recipe(ingredients, name)
+        if not image_path:
+            errors.append("Bitte wählen Sie ein Bild aus!")
+        if errors:
+            messagebox.showerror("Fehler", "\n".join(errors))
             return
+        ingredients = {ing: float(to_decimal(pct)) for ing, pct in ingredients.items()}
         
         # Copy and resize image
         try:
@@ -734,22 +1412,26 @@ class MainWindow:
             
             # Open and resize image
             img = Image.open(image_path)
+            img.draft("RGB", (700, 933))
             img = img.resize((700, 933), Image.Resampling.LANCZOS)
             
-            # Save image
-            img.save(new_image_path, format='JPEG', quality=95)
+            # Save image; under a temporary name until the recipe is saved, so a
+            # recipe of the same name saved elsewhere keeps its image
+            tmp_image_path = new_image_path + ".tmp"
+            img.save(tmp_image_path, format='JPEG', quality=95)
             
             # Add recipe
-            self.recipes[name] = {
-                "image": new_image_path,
-                "glass_size": self.glass_size,
-                "ingredients": ingredients
-            }
+            recipe = self.recipes.add(name, new_image_path, ingredients, self.glass_size)
+            self.search_index.add(recipe)
             
-            self.save_data()
+            if not self.save_data(recipes=[name]):
+                # The conflict was reported and the current version taken over
+                os.remove(tmp_image_path)
+                return
+            os.replace(tmp_image_path, new_image_path)
             
             # Refresh the recipes tab and main tab
-            self.setup_recipes_tab(self.admin_frame.winfo_children()[0].select(2))
+            self.rebuild_admin_section(2)
             self.update_cocktail_grid()
             
             messagebox.showinfo("Erfolg", f"{name} wurde erfolgreich hinzugefügt!")
@@ -758,9 +1440,53 @@ class MainWindow:
     
     def on_closing(self):
         """Handle window closing"""
-        self.save_data()
+        # Typed edits whose field still has the focus
+        if self.unsaved_recipes:
+            self.save_data(recipes=[name for name in self.unsaved_recipes if name in self.recipes])
+        self.reloader.stop()
+        self.snapshot_writer.close()
+        self.watchdog.stop()
+        self.save_latency_summary()
+        if self.maintenance is not None:
+            self.maintenance.close()
+            self.journal.close()
+            self.order_progress.close()
+        if self.closed_loop is not None:
+            self.closed_loop.meter.stop()
+        if self.pumps is not None:
+            self.pumps.close()
         self.root.destroy()
     
+    def check_memory(self):
+        """Drop the thumbnail cache when the process goes above its memory budget"""
+        if self.memory.trim_due():
+            # Thumbnails on screen stay alive through their labels
+            self.thumbnail_cache.clear()
+            self._substitutions = None
+            self.release_mapped()
+        self.root.after(self.memory.check_ms, self.check_memory)
+    
+    def release_mapped(self):
+        """Give back the pages of the snapshot and thumbnail pack that were read so far
+        
+        Tk copies every thumbnail, so once a grid page is drawn the mapped
+        tiles only add to the resident set.
+        """
+        self.thumbnail_pack.release()
+        if self.snapshot is not None:
+            self.snapshot.release()
+    
+    def save_latency_summary(self):
+        """Write the watchdog statistics and the peak memory of this session next to the data files"""
+        summary = self.watchdog.summary()
+        summary["peak_rss_mb"] = round(peak_rss_bytes() / (1024 * 1024), 1)
+        summary["memory_budget_mb"] = self.memory.budget_mb
+        try:
+            with open(os.path.join(self.data_dir, "latency_summary.json"), 'w') as f:
+                json.dump(summary, f, indent=4)
+        except OSError:
+            pass
+    
     def run(self):
         """Run the application"""
         self.root.mainloop()
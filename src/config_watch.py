@@ -0,0 +1,244 @@
+"""Hot reload of the JSON data files
+
+Scripts, the catalog importer or another machine may change the files in
+data/ while the Tk app is running. ConfigReloader watches the directory
+with inotify, parses only the file that changed on its own thread and diffs
+it against the previous version of that file. The resulting ConfigDelta
+(recipes added, changed or removed, new slot assignments or sizes) is
+handed to a callback, which applies it to the running model.
+
+Files are also checked every `poll_interval` seconds, which covers
+platforms without inotify and network mounts that do not report changes.
+Writes of the app itself are wrapped in `own_write()` and never come back
+as a delta. With the catalog lock of a CatalogStore, all files are read
+under that lock, so a delta's contents and record versions always match,
+and outside changes that land just before an own write are still reported.
+"""
+import contextlib
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import struct
+import threading
+
+WATCHED_FILES = ("ingredients.json", "recipes.json", "glass_size.json", "catalog_versions.json")
+
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class Inotify:
+    """Minimal inotify binding for one directory"""
+
+    def __init__(self, directory, mask=IN_CLOSE_WRITE | IN_MOVED_TO):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, "inotify_add_watch")
+
+    def read(self):
+        """Return the names of the files with pending events"""
+        names = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset < len(data):
+                _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                names.add(os.fsdecode(data[offset:offset + length].rstrip(b"\0")))
+                offset += length
+
+    def close(self):
+        os.close(self.fd)
+
+
+def file_stamp(path):
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
+
+class ConfigDelta:
+    """Changes of the data files relative to their previous version
+
+    `recipes` holds added and changed recipes in the recipes.json shape,
+    `removed` the names of deleted ones. `ingredients`, `sizes` and
+    `versions` are the complete new contents of ingredients.json,
+    glass_size.json and catalog_versions.json, or None if those files did
+    not change.
+    """
+
+    __slots__ = ("recipes", "removed", "ingredients", "sizes", "versions")
+
+    def __init__(self, recipes=None, removed=(), ingredients=None, sizes=None, versions=None):
+        self.recipes = recipes or {}
+        self.removed = list(removed)
+        self.ingredients = ingredients
+        self.sizes = sizes
+        self.versions = versions
+
+    def __bool__(self):
+        return bool(self.recipes or self.removed or self.ingredients is not None or self.sizes is not None
+                    or self.versions is not None)
+
+    def __repr__(self):
+        return (f"ConfigDelta(recipes={list(self.recipes)!r}, removed={self.removed!r}, "
+                f"ingredients={self.ingredients is not None}, sizes={self.sizes!r})")
+
+
+def diff_file(name, old, new):
+    """Return the ConfigDelta between two parsed versions of a data file"""
+    if old == new:
+        return ConfigDelta()
+    if name == "recipes.json":
+        old = old or {}
+        return ConfigDelta(recipes={recipe: data for recipe, data in new.items() if old.get(recipe) != data},
+                           removed=[recipe for recipe in old if recipe not in new])
+    if name == "ingredients.json":
+        return ConfigDelta(ingredients=new)
+    if name == "catalog_versions.json":
+        return ConfigDelta(versions=new)
+    return ConfigDelta(sizes=new)
+
+
+class ConfigReloader:
+    """Watches the data files and reports outside changes as ConfigDeltas
+
+    `on_delta` is called on the watcher thread; a Tk caller has to hand the
+    delta over to the UI thread. `lock(exclusive=False)` returns a context
+    manager to read the files under, e.g. CatalogStore.locked.
+    """
+
+    def __init__(self, data_dir, on_delta, poll_interval=5.0, debounce=0.2, lock=None):
+        self.data_dir = data_dir
+        self.on_delta = on_delta
+        self.lock = lock or (lambda exclusive=False: contextlib.nullcontext())
+        self._all_files = lock is not None
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.reloads = 0
+        self._contents = {}      # name -> last parsed content
+        self._stamps = {}        # name -> (mtime_ns, size) of that content
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = os.pipe()
+        self._thread = threading.Thread(target=self._run, name="config-watch", daemon=True)
+
+    def start(self):
+        with self.lock():
+            for name in WATCHED_FILES:
+                self._read(name)
+        self._thread.start()
+        return self
+
+    @contextlib.contextmanager
+    def own_write(self):
+        """Wrap writes of the app; the files written inside are taken as they are
+
+        Outside changes not seen yet are collected first, under the exclusive
+        lock, and reported after the write instead of being taken along.
+        """
+        with self._lock:
+            with self.lock(exclusive=True):
+                outside = self._collect(WATCHED_FILES) if self._all_files else ConfigDelta()
+                yield
+                for name in WATCHED_FILES:
+                    self._read(name)
+        self._report(outside)
+
+    def _read(self, name):
+        # Caller holds the lock (or the thread has not started yet)
+        path = os.path.join(self.data_dir, name)
+        stamp = file_stamp(path)
+        if stamp is None or stamp == self._stamps.get(name):
+            return None
+        try:
+            with open(path, 'r') as f:
+                content = json.load(f)
+        except (OSError, ValueError):
+            # Most likely still being written; the close or the next poll brings it back
+            return None
+        if not isinstance(content, dict):
+            return None
+        self._stamps[name] = stamp
+        previous, self._contents[name] = self._contents.get(name), content
+        return previous, content
+
+    def _collect(self, names):
+        # Caller holds the locks
+        delta = ConfigDelta()
+        for name in names:
+            versions = self._read(name)
+            if versions is None:
+                continue
+            change = diff_file(name, *versions)
+            delta.recipes.update(change.recipes)
+            delta.removed.extend(change.removed)
+            if change.ingredients is not None:
+                delta.ingredients = change.ingredients
+            if change.sizes is not None:
+                delta.sizes = change.sizes
+            if change.versions is not None:
+                delta.versions = change.versions
+        return delta
+
+    def _report(self, delta):
+        if delta:
+            self.reloads += 1
+            self.on_delta(delta)
+
+    def check(self, names=WATCHED_FILES):
+        """Read the files that changed and report their delta; returns the ConfigDelta"""
+        # Under a catalog lock every file is looked at, so versions and contents match
+        if self._all_files:
+            names = WATCHED_FILES
+        with self._lock, self.lock():
+            delta = self._collect(names)
+        self._report(delta)
+        return delta
+
+    def _run(self):
+        try:
+            inotify = Inotify(self.data_dir)
+        except (OSError, AttributeError):
+            inotify = None
+        try:
+            while not self._stop.is_set():
+                if inotify is None:
+                    self._stop.wait(self.poll_interval)
+                    self.check()
+                    continue
+                ready, _, _ = select.select([inotify.fd, self._wakeup[0]], [], [], self.poll_interval)
+                if self._stop.is_set():
+                    break
+                if not ready:
+                    self.check()
+                    continue
+                # Let a burst of writes settle, then read each file once
+                self._stop.wait(self.debounce)
+                names = inotify.read() & set(WATCHED_FILES)
+                if names:
+                    self.check([name for name in WATCHED_FILES if name in names])
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def stop(self):
+        self._stop.set()
+        os.write(self._wakeup[1], b"\0")
+        if self._thread.is_alive():
+            self._thread.join()
+        for fd in self._wakeup:
+            os.close(fd)
@@ -0,0 +1,275 @@
+"""Write-ahead journal of the drinks that are being poured
+
+If the Pi loses power in the middle of a pour, the journal says which drink
+was being poured and how much of each slot was already in the glass. On the
+next start the app can pour the rest or abort the drink.
+
+Every pour writes a `begin` record with the target ml per slot, then
+`progress` checkpoints every `interval` seconds while it runs, and an `end`
+record. Records are JSON lines prefixed with their CRC-32, so a line that
+was torn by the power loss is recognized and dropped.
+
+Writes are group-committed. Callers only queue a record, which takes
+microseconds. A writer thread writes everything queued with a single
+`write` and makes it durable with a single `fdatasync`. A pour therefore
+never waits for the disk, and a busy machine still needs only one sync per
+batch. The cost is that the last `interval` of progress can be lost, so the
+recovered volumes are lower bounds.
+
+If a write or sync fails (disk full, SD card gone read-only), the journal
+stops: the pending Future and every later one fail with the OSError,
+nothing more is queued, and `on_error` is called once from the writer
+thread. Pours go on without a journal.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+
+from metrics import JOURNAL_ERRORS
+from pump_controller import DEFAULT_FLOW_RATE
+
+JOURNAL_FILE = "dispense_journal.log"
+
+
+class JournalEntry:
+    """A pour that has been started and not ended yet"""
+
+    __slots__ = ("id", "cocktail", "targets", "started", "dispensed", "progress", "durable")
+
+    def __init__(self, id, cocktail, targets, started, dispensed=None, progress=None):
+        self.id = id
+        self.cocktail = cocktail
+        self.targets = targets       # {slot: ml}
+        self.started = started       # unix time
+        self.dispensed = dispensed or dict.fromkeys(targets, 0.0)
+        self.progress = progress     # returns {slot: ml so far} while pouring
+        self.durable = None          # Future, resolved once the begin record is on disk
+
+    @property
+    def fraction(self):
+        total = sum(self.targets.values())
+        return sum(self.dispensed.values()) / total if total else 1.0
+
+    def remaining(self):
+        """Return {slot: ml} still missing from the glass"""
+        return {slot: round(target - self.dispensed.get(slot, 0.0), 2) for slot, target in self.targets.items()
+                if target - self.dispensed.get(slot, 0.0) > 0.05}
+
+
+def encode_record(record):
+    data = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return b"%08x %s\n" % (zlib.crc32(data), data)
+
+
+def decode_record(line):
+    """Return the record of a journal line, or None if the line is torn or corrupt"""
+    crc, _, data = line.rstrip(b"\n").partition(b" ")
+    try:
+        if int(crc, 16) != zlib.crc32(data):
+            return None
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+def read_journal(path):
+    """Return (incomplete JournalEntries, byte length of the intact prefix)"""
+    entries = {}
+    valid = 0
+    try:
+        with open(path, "rb") as f:
+            for line in f:
+                record = decode_record(line) if line.endswith(b"\n") else None
+                if record is None:
+                    break            # everything after a torn write is garbage
+                valid += len(line)
+                op = record.get("op")
+                if op == "begin":
+                    targets = {int(slot): ml for slot, ml in record["slots"].items()}
+                    entries[record["id"]] = JournalEntry(record["id"], record.get("cocktail"), targets, record["t"])
+                elif op == "progress" and record["id"] in entries:
+                    entries[record["id"]].dispensed.update({int(slot): ml for slot, ml in record["ml"].items()})
+                elif op == "end":
+                    entries.pop(record["id"], None)
+    except FileNotFoundError:
+        pass
+    return list(entries.values()), valid
+
+
+class DispenseJournal:
+    """Group-committed journal file for in-flight pours
+
+    `flow_rates` ({slot: ml/s}) estimate the progress of timed pours. With a
+    FlowMeter as `meter`, its measured volumes are recorded instead. The
+    file is truncated once no pour is open and it grew beyond `max_bytes`.
+    `error` holds the OSError that stopped the writer, if any.
+    """
+
+    def __init__(self, path, interval=0.5, commit_delay=0.005, flow_rates=None, meter=None, max_bytes=1 << 20,
+                 on_error=None):
+        self.path = path
+        self.interval = interval
+        self.commit_delay = commit_delay
+        self.flow_rates = flow_rates or {}
+        self.meter = meter
+        self.max_bytes = max_bytes
+        self.on_error = on_error
+        self.error = None
+        self.records = 0
+        self.commits = 0
+
+        # Drop a torn tail before appending after it
+        self.incomplete, valid = read_journal(path)
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT, 0o644)
+        os.ftruncate(self._fd, valid)
+        os.lseek(self._fd, valid, os.SEEK_SET)
+        self._size = valid
+
+        self._ids = itertools.count(1)
+        self._prefix = f"{int(time.time() * 1000):x}"
+        self._open = {}              # id -> JournalEntry
+        self._queue = []
+        self._durable = Future()     # resolved by the commit that writes the queued records
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="dispense-journal", daemon=True)
+        self._thread.start()
+
+    # Recording ---------------------------------------------------------------
+
+    def begin(self, cocktail, slot_ml):
+        """Record the start of a pour; returns its JournalEntry"""
+        targets = {int(slot): round(float(ml), 2) for slot, ml in slot_ml.items() if ml > 0}
+        entry = JournalEntry(f"{self._prefix}-{next(self._ids)}", cocktail, targets, time.time(),
+                             progress=self._progress(targets))
+        with self._cond:
+            self._open[entry.id] = entry
+            entry.durable = self._append({"op": "begin", "id": entry.id, "cocktail": cocktail,
+                                          "slots": targets, "t": round(entry.started, 3)})
+        return entry
+
+    def end(self, entry, status="done", dispensed=None):
+        """Record the end of a pour; `status` is "done", "aborted" or "resumed" """
+        record = {"op": "end", "id": entry.id, "status": status}
+        if dispensed is not None:
+            record["ml"] = {slot: round(float(ml), 2) for slot, ml in dispensed.items()}
+        with self._cond:
+            self._open.pop(entry.id, None)
+            return self._append(record)
+
+    # Recovery ----------------------------------------------------------------
+
+    def abort(self, entry):
+        """Close an incomplete pour from the last run without pouring the rest"""
+        self.incomplete.remove(entry)
+        return self.end(entry, "aborted", entry.dispensed)
+
+    def resume(self, entry):
+        """Close an incomplete pour from the last run; returns {slot: ml} still to pour
+
+        The rest is journaled as a new pour when it is poured.
+        """
+        self.incomplete.remove(entry)
+        self.end(entry, "resumed", entry.dispensed)
+        return entry.remaining()
+
+    # Writer ------------------------------------------------------------------
+
+    def _append(self, record):
+        # Caller holds the lock
+        if self.error is not None:
+            failed = Future()
+            failed.set_exception(self.error)
+            return failed
+        self._queue.append(encode_record(record))
+        self._cond.notify()
+        return self._durable
+
+    def _progress(self, targets):
+        if self.meter is not None:
+            # Measured volumes; the meter counts from zero for every pour
+            volumes = self.meter.volumes
+            return lambda: {slot: float(volumes[slot]) for slot in targets}
+        rates = {slot: self.flow_rates.get(slot, DEFAULT_FLOW_RATE) for slot in targets}
+        start = time.monotonic()
+        return lambda: {slot: min(target, (time.monotonic() - start) * rates[slot])
+                        for slot, target in targets.items()}
+
+    def _checkpoint(self):
+        # Caller holds the lock
+        for entry in self._open.values():
+            entry.dispensed = {slot: round(ml, 2) for slot, ml in entry.progress().items()}
+            self._append({"op": "progress", "id": entry.id, "ml": entry.dispensed})
+
+    def _run(self):
+        next_checkpoint = time.monotonic() + self.interval
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed,
+                                    max(0.0, next_checkpoint - time.monotonic()) if self._open else None)
+            if self.commit_delay and not self._closed:
+                # Let the pour that queued the first record start its pumps, and
+                # collect what else comes in meanwhile into the same commit
+                time.sleep(self.commit_delay)
+            with self._cond:
+                if time.monotonic() >= next_checkpoint:
+                    self._checkpoint()
+                    next_checkpoint = time.monotonic() + self.interval
+                batch, self._queue = self._queue, []
+                closed = self._closed
+                idle = not self._open
+                if not batch and not closed:
+                    continue
+                durable, self._durable = self._durable, Future()
+            if batch:
+                try:
+                    self._commit(batch, idle)
+                except OSError as e:
+                    self._fail(e, durable)
+                    return
+            durable.set_result(None)
+            if closed:
+                return
+
+    def _commit(self, batch, idle):
+        data = b"".join(batch)
+        written = os.write(self._fd, data)
+        if written != len(data):
+            raise OSError(f"Journal: nur {written} von {len(data)} Bytes geschrieben")
+        os.fdatasync(self._fd)
+        self._size += len(data)
+        self.records += len(batch)
+        self.commits += 1
+        if idle and not self.incomplete and self._size > self.max_bytes:
+            with self._cond:
+                if not self._open and not self._queue:
+                    os.ftruncate(self._fd, 0)
+                    os.lseek(self._fd, 0, os.SEEK_SET)
+                    os.fdatasync(self._fd)
+                    self._size = 0
+
+    def _fail(self, error, durable):
+        # The writer stops; records queued after the failed batch share its fate
+        with self._cond:
+            self.error = error
+            self._queue = []
+            pending, self._durable = self._durable, Future()
+        JOURNAL_ERRORS.inc()
+        durable.set_exception(error)
+        pending.set_exception(error)
+        if self.on_error is not None:
+            self.on_error(error)
+
+    def close(self):
+        """Write what is queued and close the file; open pours stay incomplete"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        os.close(self._fd)
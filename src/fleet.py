@@ -0,0 +1,497 @@
+"""Fleet mode: route orders across several MixMasterX units
+
+The coordinator keeps a planned queue per unit. Every new order goes to the
+unit that would finish it soonest (its backlog plus the drink's own service
+time), among the units that have all ingredients in a slot and enough of
+them left after the orders already queued there. Units pull their next
+order when they are free, so queued orders are not committed yet:
+`rebalance` moves them to another unit whenever that finishes them
+noticeably earlier, e.g. after a unit got stuck or a new one joined.
+
+Units run in the same process (`SimulatedUnit`) or connect from other
+processes over `multiprocessing.connection` (`serve` / `run_unit`):
+
+    python src/fleet.py --units 3 --orders 100 --rate 60 --processes
+"""
+import argparse
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing import Process
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from recipe_model import IngredientRegistry, RecipeStore, load_json, load_recipe_store
+from pour_matrix import NUM_SLOTS, PourMatrix
+from simulator import SimulationConfig
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+# Bottle size assumed for slots without a reported inventory
+DEFAULT_SLOT_VOLUME = 700.0
+
+
+class FleetError(Exception):
+    pass
+
+
+class Order:
+    __slots__ = ("id", "cocktail", "unit", "need", "created", "started", "done")
+
+    def __init__(self, id, cocktail, created):
+        self.id = id
+        self.cocktail = cocktail
+        self.unit = None
+        self.need = None             # ml per slot reserved on the planned unit
+        self.created = created
+        self.started = None
+        self.done = None
+
+
+class UnitState:
+    """The coordinator's view of one machine"""
+
+    def __init__(self, name, store, ingredients, inventory=None, config=None, glass_size=400):
+        self.name = name
+        self.config = config or SimulationConfig()
+        self.glass_size = glass_size
+        self.queue = deque()         # planned orders, not handed to the unit yet
+        self.current = None          # the order the unit is pouring
+        self.reserved = np.zeros(NUM_SLOTS)
+        self.inventory = np.full(NUM_SLOTS, DEFAULT_SLOT_VOLUME)
+        self.configure(store, ingredients, inventory)
+
+    def configure(self, store, ingredients, inventory=None):
+        """Take a new recipe set, slot layout or inventory {slot: ml}"""
+        self.store = store
+        self.ingredients = dict(ingredients)
+        self.matrix = PourMatrix(store, ingredients)
+        self.available = self.matrix.available()
+        self.slot_ml = self.matrix.slot_amounts(self.glass_size)
+        pour = (self.slot_ml / self.config.slot_flow_rates()).max(axis=1)
+        self.service = (self.config.handover_seconds + pour + self.config.cleaning_seconds).tolist()
+        for slot, ml in (inventory or {}).items():
+            self.inventory[int(slot) - 1] = ml
+
+    def need(self, cocktail):
+        return self.slot_ml[self.matrix.row_of[cocktail]]
+
+    def can_make(self, cocktail):
+        row = self.matrix.row_of.get(cocktail)
+        if row is None or not self.available[row]:
+            return False
+        return bool(np.all(self.inventory - self.reserved >= self.slot_ml[row] - 1e-9))
+
+    def service_seconds(self, cocktail):
+        return self.service[self.matrix.row_of[cocktail]]
+
+    def backlog(self, now):
+        """Seconds until everything planned for this unit is poured"""
+        seconds = sum(self.service_seconds(order.cocktail) for order in self.queue)
+        if self.current is not None:
+            seconds += max(0.0, self.current.started + self.service_seconds(self.current.cocktail) - now)
+        return seconds
+
+
+class FleetCoordinator:
+    """Routes orders to units and keeps their planned queues balanced
+
+    `rebalance_margin` is how many seconds earlier another unit has to
+    finish a queued order before it is moved. All methods are thread-safe.
+    """
+
+    def __init__(self, rebalance_margin=30.0, clock=time.monotonic):
+        self.units = {}
+        self.orders = {}
+        self.unroutable = []         # re-routed orders no unit could take, retried when units change
+        self.rebalance_margin = rebalance_margin
+        self.clock = clock
+        self._ids = itertools.count(1)
+        self._lock = threading.Condition()
+
+    # Units -------------------------------------------------------------------
+
+    def add_unit(self, name, store, ingredients, inventory=None, config=None, glass_size=400):
+        with self._lock:
+            if name in self.units:
+                raise FleetError(f"Gerät {name} ist bereits angemeldet")
+            self.units[name] = UnitState(name, store, ingredients, inventory, config, glass_size)
+            self._retry_unroutable()
+            self._rebalance()
+
+    def update_unit(self, name, store=None, ingredients=None, inventory=None):
+        """Apply a status report: new recipes, slot layout or inventory {slot: ml}"""
+        with self._lock:
+            unit = self._unit(name)
+            planned = list(unit.queue)
+            for order in planned:
+                self._unplan(order)
+            unit.configure(store or unit.store, ingredients or unit.ingredients, inventory)
+            # Plan everything again; orders this unit can no longer make move elsewhere
+            self._reroute(planned)
+            self._retry_unroutable()
+            self._rebalance()
+
+    def remove_unit(self, name):
+        """Take a unit out of service and re-route its orders, including the one it was pouring"""
+        with self._lock:
+            unit = self.units.pop(name)
+            orphans = list(unit.queue)
+            if unit.current is not None:
+                unit.current.started = None
+                orphans.insert(0, unit.current)
+            for order in orphans:
+                order.unit = None
+            self._reroute(orphans)
+            self._lock.notify_all()
+
+    def _unit(self, name):
+        try:
+            return self.units[name]
+        except KeyError:
+            raise FleetError(f"Unbekanntes Gerät: {name}") from None
+
+    # Orders ------------------------------------------------------------------
+
+    def submit(self, cocktail):
+        """Plan a new order on the unit that finishes it soonest and return it"""
+        with self._lock:
+            order = Order(next(self._ids), cocktail, self.clock())
+            self._route(order)
+            self.orders[order.id] = order
+            self._lock.notify_all()
+            return order
+
+    def _route(self, order):
+        now = self.clock()
+        best = None
+        for unit in self.units.values():
+            if unit.can_make(order.cocktail):
+                eta = unit.backlog(now) + unit.service_seconds(order.cocktail)
+                if best is None or eta < best[0]:
+                    best = (eta, unit)
+        if best is None:
+            raise FleetError(f"Kein Gerät kann {order.cocktail} herstellen")
+        self._plan(order, best[1])
+
+    def _reroute(self, orders):
+        for order in orders:
+            try:
+                self._route(order)
+            except FleetError:
+                self.unroutable.append(order)
+
+    def _retry_unroutable(self):
+        orders, self.unroutable = self.unroutable, []
+        self._reroute(orders)
+
+    def _plan(self, order, unit):
+        order.unit = unit.name
+        order.need = unit.need(order.cocktail)
+        unit.queue.append(order)
+        unit.reserved += order.need
+
+    def _unplan(self, order):
+        unit = self.units[order.unit]
+        unit.queue.remove(order)
+        unit.reserved -= order.need
+        order.unit = None
+
+    def next_order(self, name, timeout=None):
+        """Hand the next planned order to a free unit, waiting up to `timeout`"""
+        with self._lock:
+            unit = self._unit(name)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not unit.queue:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._lock.wait(remaining)
+                unit = self._unit(name)
+            order = unit.queue.popleft()
+            order.started = self.clock()
+            unit.current = order
+            return order
+
+    def order_done(self, name, order_id):
+        with self._lock:
+            unit = self._unit(name)
+            order = self.orders.get(order_id)
+            if order is None:
+                raise FleetError(f"Unbekannte Bestellung: {order_id}")
+            order.done = self.clock()
+            unit.reserved -= order.need
+            unit.inventory -= order.need
+            if unit.current is order:
+                unit.current = None
+            self._rebalance()
+
+    def rebalance(self):
+        """Move queued orders to units that finish them earlier; returns the number moved"""
+        with self._lock:
+            return self._rebalance()
+
+    def _rebalance(self):
+        moved = 0
+        now = self.clock()
+        changed = True
+        while changed:
+            changed = False
+            # Look at the last order of the unit with the longest backlog first
+            for unit in sorted(self.units.values(), key=lambda u: -u.backlog(now)):
+                if not unit.queue:
+                    continue
+                order = unit.queue[-1]
+                finish_here = unit.backlog(now)
+                for other in self.units.values():
+                    if other is unit or not other.can_make(order.cocktail):
+                        continue
+                    finish_there = other.backlog(now) + other.service_seconds(order.cocktail)
+                    if finish_there + self.rebalance_margin < finish_here:
+                        self._unplan(order)
+                        self._plan(order, other)
+                        moved += 1
+                        changed = True
+                        break
+                if changed:
+                    break
+        if moved:
+            self._lock.notify_all()
+        return moved
+
+    def status(self):
+        now = self.clock()
+        with self._lock:
+            return {name: {"queue": len(unit.queue), "busy": unit.current is not None,
+                           "backlog_s": round(unit.backlog(now), 1),
+                           "inventory_ml": unit.inventory.round(1).tolist()}
+                    for name, unit in self.units.items()}
+
+
+# Units ---------------------------------------------------------------------------
+
+class _LocalLink:
+    def __init__(self, coordinator):
+        self.coordinator = coordinator
+
+    def next_order(self, name, timeout):
+        order = self.coordinator.next_order(name, timeout)
+        return None if order is None else (order.id, order.cocktail)
+
+    def done(self, name, order_id):
+        self.coordinator.order_done(name, order_id)
+
+
+class SimulatedUnit:
+    """A unit that "pours" by sleeping for the service time
+
+    `time_scale` shrinks the sleep, so a night runs in seconds. The same loop
+    drives units in other processes through `run_unit`.
+    """
+
+    def __init__(self, link, name, service_seconds, time_scale=0.001):
+        self.link = link
+        self.name = name
+        self.service_seconds = service_seconds
+        self.time_scale = time_scale
+        self.poured = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, name=f"unit-{name}", daemon=True)
+
+    @classmethod
+    def local(cls, coordinator, name, time_scale=0.001):
+        unit = coordinator.units[name]
+        return cls(_LocalLink(coordinator), name, unit.service_seconds, time_scale)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+
+    def run(self):
+        while not self._stop.is_set():
+            job = self.link.next_order(self.name, 0.1)
+            if job is None:
+                continue
+            order_id, cocktail = job
+            time.sleep(self.service_seconds(cocktail) * self.time_scale)
+            self.link.done(self.name, order_id)
+            self.poured += 1
+
+
+def serve(coordinator, address=("127.0.0.1", 0), authkey=b"mixmasterx"):
+    """Accept units from other processes; returns the Listener (its address is the port to use)
+
+    A request the coordinator refuses (a name that is already taken, an
+    unknown unit or order) is answered with ("error", message), which the
+    unit raises as FleetError; the connection stays open.
+    """
+    listener = Listener(address, authkey=authkey)
+
+    def handle(conn):
+        name = None
+        try:
+            while True:
+                message = conn.recv()
+                kind = message[0]
+                try:
+                    if kind == "hello":
+                        _, unit_name, recipes, ingredients, inventory, glass_size = message
+                        store = RecipeStore.from_dicts(recipes, IngredientRegistry(ingredients))
+                        coordinator.add_unit(unit_name, store, ingredients, inventory, glass_size=glass_size)
+                        # Only a unit this connection registered is removed when it drops
+                        name = unit_name
+                        conn.send(("ok",))
+                    elif kind == "next":
+                        order = coordinator.next_order(name, message[1])
+                        conn.send(None if order is None else (order.id, order.cocktail))
+                    elif kind == "done":
+                        coordinator.order_done(name, message[1])
+                        conn.send(("ok",))
+                    else:
+                        raise FleetError(f"Unbekannte Nachricht: {kind}")
+                except FleetError as e:
+                    conn.send(("error", str(e)))
+        except (EOFError, OSError):
+            if name is not None and name in coordinator.units:
+                coordinator.remove_unit(name)
+        finally:
+            conn.close()
+
+    def accept():
+        while True:
+            try:
+                conn = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept, name="fleet-listener", daemon=True).start()
+    return listener
+
+
+def _reply(conn):
+    # Order ids are ints, so an (id, cocktail) job never looks like an error
+    reply = conn.recv()
+    if isinstance(reply, tuple) and reply[0] == "error":
+        raise FleetError(reply[1])
+    return reply
+
+
+class _RemoteLink:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def next_order(self, name, timeout):
+        self.conn.send(("next", timeout))
+        return _reply(self.conn)
+
+    def done(self, name, order_id):
+        self.conn.send(("done", order_id))
+        _reply(self.conn)
+
+
+def run_unit(address, name, recipes, ingredients, inventory=None, glass_size=400, time_scale=0.001,
+             authkey=b"mixmasterx", duration=None):
+    """Connect a simulated unit to a coordinator in another process
+
+    `recipes` are the plain recipes.json dicts of this unit.
+    """
+    conn = Client(address, authkey=authkey)
+    conn.send(("hello", name, recipes, ingredients, inventory, glass_size))
+    try:
+        _reply(conn)
+    except FleetError:
+        conn.close()
+        raise
+    local = UnitState(name, RecipeStore.from_dicts(recipes, IngredientRegistry(ingredients)), ingredients,
+                      glass_size=glass_size)
+    unit = SimulatedUnit(_RemoteLink(conn), name, local.service_seconds, time_scale)
+    if duration is None:
+        unit.run()
+    else:
+        unit.start()
+        time.sleep(duration)
+        unit._stop.set()
+        unit._thread.join()
+    conn.close()
+
+
+# Demo ------------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mehrere Geräte lokal simulieren und Bestellungen verteilen")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Verzeichnis mit recipes.json und ingredients.json")
+    parser.add_argument("--units", type=int, default=3, help="Anzahl Geräte")
+    parser.add_argument("--orders", type=int, default=100, help="Anzahl Bestellungen")
+    parser.add_argument("--rate", type=float, default=60.0, help="Bestellungen pro Stunde")
+    parser.add_argument("--time-scale", type=float, default=0.002, help="Simulierte Sekunden -> echte Sekunden")
+    parser.add_argument("--slot-volume", type=float, default=DEFAULT_SLOT_VOLUME, help="Füllmenge pro Slot in ml")
+    parser.add_argument("--processes", action="store_true", help="Jedes Gerät in einem eigenen Prozess")
+    args = parser.parse_args(argv)
+
+    recipes = load_json(os.path.join(args.data_dir, "recipes.json"), {})
+    ingredients = load_json(os.path.join(args.data_dir, "ingredients.json"), {})
+    if not recipes:
+        print("Keine Rezepte gefunden", file=sys.stderr)
+        return 1
+    names = list(recipes)
+    inventory = {slot: args.slot_volume for slot in range(1, NUM_SLOTS + 1)}
+    # Scale the clock too, so ETAs are in simulated seconds
+    start = time.monotonic()
+    coordinator = FleetCoordinator(clock=lambda: (time.monotonic() - start) / args.time_scale)
+
+    workers = []
+    if args.processes:
+        listener = serve(coordinator)
+        for i in range(args.units):
+            process = Process(target=run_unit, args=(listener.address, f"unit-{i + 1}", recipes, ingredients),
+                              kwargs={"inventory": inventory, "time_scale": args.time_scale}, daemon=True)
+            process.start()
+            workers.append(process)
+        while len(coordinator.units) < args.units:
+            time.sleep(0.01)
+    else:
+        store = load_recipe_store(os.path.join(args.data_dir, "recipes.json"),
+                                  os.path.join(args.data_dir, "ingredients.json"))
+        for i in range(args.units):
+            coordinator.add_unit(f"unit-{i + 1}", store, ingredients, inventory)
+            workers.append(SimulatedUnit.local(coordinator, f"unit-{i + 1}", args.time_scale).start())
+
+    rng = np.random.default_rng(1)
+    gaps = rng.exponential(3600 / args.rate, args.orders) * args.time_scale
+    orders = []
+    rejected = 0
+    for gap, choice in zip(gaps, rng.integers(len(names), size=args.orders)):
+        time.sleep(gap)
+        try:
+            orders.append(coordinator.submit(names[choice]))
+        except FleetError:
+            rejected += 1
+    while any(order.done is None for order in orders):
+        time.sleep(0.05)
+
+    waits = np.array([order.started - order.created for order in orders])
+    per_unit = {}
+    for order in orders:
+        per_unit[order.unit] = per_unit.get(order.unit, 0) + 1
+    print(f"{len(orders)} Bestellungen auf {args.units} Geräten, {rejected} abgelehnt (Zutaten leer)")
+    for name, count in sorted(per_unit.items()):
+        print(f"  {name}: {count} Drinks")
+    print(f"Wartezeit p50 {np.percentile(waits, 50):.1f}s, p95 {np.percentile(waits, 95):.1f}s (simuliert)")
+    for worker in workers:
+        if isinstance(worker, SimulatedUnit):
+            worker.stop()
+        else:
+            worker.terminate()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
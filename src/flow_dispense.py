@@ -0,0 +1,308 @@
+"""Closed-loop dispensing with flow sensors
+
+Timed pours drift with bottle level and temperature. In closed-loop mode
+every pump runs until its flow sensor has counted the target volume.
+
+The pulse counter (microcontroller or GPIO helper) streams fixed-size
+records on its own device:
+
+    slot (u8) | flags (u8) | pulses since last record (u16) | time in us (u32)
+
+`FlowMeter` reads these records straight into a preallocated NumPy ring
+buffer with `readinto`, which blocks without holding the GIL, and
+integrates each batch of records with one vectorized call. Nothing is
+allocated per pulse and the UI thread is never blocked by sample handling.
+
+`ClosedLoopDispenser` starts all pumps of a drink in one frame (with a
+safety duration) and stops each slot as soon as its measured volume plus
+what will still flow during the stop latency reaches the target.
+
+`SimulatedFlowSensor` emits pulse streams for the pumps of a
+FakeController, so the whole loop runs without hardware.
+"""
+import os
+import random
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from pour_matrix import NUM_SLOTS
+from pump_controller import DEFAULT_FLOW_RATE
+
+RECORD = np.dtype([("slot", "u1"), ("flags", "u1"), ("pulses", "<u2"), ("time_us", "<u4")])
+RECORD_STRUCT = struct.Struct("<BBHI")
+# Small hall-effect sensor with 5880 pulses per litre
+DEFAULT_ML_PER_PULSE = 1000 / 5880
+
+
+class FlowMeter:
+    """Integrates flow-sensor records from a file descriptor per slot
+
+    `ml_per_pulse` is {slot: ml} from the sensor calibration, `capacity` the
+    number of records kept in the ring buffer for diagnostics.
+    """
+
+    def __init__(self, fd, ml_per_pulse=None, capacity=1 << 16):
+        self.file = os.fdopen(fd, 'rb', buffering=0)
+        self.sensor = None           # SimulatedFlowSensor feeding this meter, if any
+        self.ring = np.zeros(capacity, dtype=RECORD)
+        self._ring_bytes = memoryview(self.ring.view(np.uint8))
+        self._write = 0              # byte position of the next read
+        self._processed = 0          # byte position of the first unprocessed record
+        self.records = 0             # records processed in total
+
+        factors = np.full(NUM_SLOTS + 1, DEFAULT_ML_PER_PULSE)
+        for slot, ml in (ml_per_pulse or {}).items():
+            factors[slot] = ml
+        self.ml_per_pulse = factors
+        self.pulses = np.zeros(NUM_SLOTS + 1, dtype=np.int64)
+        self.volumes = np.zeros(NUM_SLOTS + 1)
+        self.rates = np.zeros(NUM_SLOTS + 1)     # ml/s, smoothed
+        self._last_batch = time.monotonic()
+
+        self.on_batch = None         # called with the set of updated slots from the reader thread
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="flow-meter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._closed.set()
+        if self.sensor is not None:
+            # Closing the write end ends the blocking read with EOF
+            self.sensor.close()
+
+    def reset(self, slots):
+        """Zero the counters of slots that are about to pour"""
+        for slot in slots:
+            self.pulses[slot] = 0
+            self.volumes[slot] = 0.0
+            self.rates[slot] = 0.0
+
+    def recent(self, count):
+        """Return a copy of the last `count` records, oldest first"""
+        end = self._processed // RECORD.itemsize
+        count = min(count, self.records, len(self.ring))
+        indices = (np.arange(end - count, end)) % len(self.ring)
+        return self.ring[indices]
+
+    def _run(self):
+        size = len(self._ring_bytes)
+        while not self._closed.is_set():
+            try:
+                read = self.file.readinto(self._ring_bytes[self._write:])
+            except OSError:
+                return
+            if not read:
+                return
+            self._write += read
+            complete = self._write - self._write % RECORD.itemsize
+            if complete > self._processed:
+                self._integrate(self._processed // RECORD.itemsize, complete // RECORD.itemsize)
+                self._processed = complete
+            # The ring size is a multiple of the record size, so records never wrap
+            if self._write == size:
+                self._write = self._processed = 0
+
+    def _integrate(self, start, end):
+        batch = self.ring[start:end]
+        counts = np.bincount(batch["slot"], weights=batch["pulses"], minlength=NUM_SLOTS + 1)[:NUM_SLOTS + 1]
+        self.pulses += counts.astype(np.int64)
+        added = counts * self.ml_per_pulse
+        self.volumes += added
+
+        now = time.monotonic()
+        elapsed = now - self._last_batch
+        self._last_batch = now
+        if elapsed > 0:
+            # Exponential smoothing over batches; slots without pulses decay to 0
+            alpha = min(1.0, elapsed / 0.05)
+            self.rates += alpha * (added / elapsed - self.rates)
+        self.records += end - start
+
+        if self.on_batch is not None:
+            self.on_batch(set(np.flatnonzero(counts).tolist()))
+
+
+class ClosedLoopDispenser:
+    """Pours by measured volume instead of by time
+
+    `stop_latency` is the time between sending STOP and the pump actually
+    standing still; that much flow is subtracted from the target. Every pump
+    is started with `safety_factor` times its nominal duration, so an empty
+    bottle or a broken sensor still ends the pour.
+    """
+
+    def __init__(self, pumps, meter, flow_rates=None, stop_latency=0.02, safety_factor=2.0):
+        self.pumps = pumps
+        self.meter = meter
+        self.flow_rates = flow_rates or {}
+        self.stop_latency = stop_latency
+        self.safety_factor = safety_factor
+        self._lock = threading.Lock()
+        self._targets = {}           # slot -> (target ml, pour state)
+        self._stopping = set()       # slots whose STOP was sent and has not been answered
+        meter.on_batch = self._on_batch
+        previous = pumps.on_slot_done
+
+        def slot_done(slot):
+            self._finish(slot)
+            if previous is not None:
+                previous(slot)
+        pumps.on_slot_done = slot_done
+
+    def dispense(self, slot_ml):
+        """Pour {slot: ml}; returns a Future of {slot: measured ml}"""
+        targets = {slot: ml for slot, ml in slot_ml.items() if ml > 0}
+        done = Future()
+        if not targets:
+            done.set_result({})
+            return done
+        state = {"future": done, "remaining": set(targets), "measured": {}}
+        with self._lock:
+            busy = [slot for slot in targets if slot in self._targets]
+            if busy:
+                raise ValueError(f"Slot {busy[0]} läuft bereits")
+            self.meter.reset(targets)
+            for slot, ml in targets.items():
+                self._targets[slot] = (ml, state)
+
+        durations = {slot: self.safety_factor * ml / self.flow_rates.get(slot, DEFAULT_FLOW_RATE) + 0.5
+                     for slot, ml in targets.items()}
+
+        def started(f):
+            if f.exception() is not None:
+                with self._lock:
+                    for slot in targets:
+                        self._targets.pop(slot, None)
+                        self._stopping.discard(slot)
+                if not done.done():
+                    done.set_exception(f.exception())
+        self.pumps.start(durations).add_done_callback(started)
+        return done
+
+    def _on_batch(self, slots):
+        stop = []
+        volumes, rates = self.meter.volumes, self.meter.rates
+        with self._lock:
+            for slot in slots:
+                entry = self._targets.get(slot)
+                if (entry is not None and slot not in self._stopping
+                        and volumes[slot] + rates[slot] * self.stop_latency >= entry[0]):
+                    stop.append(slot)
+            # One STOP per slot; the batches until it is answered would only repeat it
+            self._stopping.update(stop)
+        if stop:
+            self.pumps.stop(stop).add_done_callback(lambda f: self._stopped(f, stop))
+
+    def _stopped(self, f, slots):
+        if f.exception() is not None:
+            # Not stopped; the next batch sends STOP again
+            with self._lock:
+                self._stopping.difference_update(slots)
+            return
+        for slot in slots:
+            self._finish(slot)
+
+    def _finish(self, slot):
+        """Record the measured volume once a slot stopped (by STOP or safety timeout)"""
+        with self._lock:
+            entry = self._targets.pop(slot, None)
+            self._stopping.discard(slot)
+        if entry is None:
+            return
+        # Let the flow that was still running when the pump stopped reach the sensor
+        timer = threading.Timer(2 * self.stop_latency, self._settled, (slot, entry[1]))
+        timer.daemon = True
+        timer.start()
+
+    def _settled(self, slot, state):
+        state["measured"][slot] = round(float(self.meter.volumes[slot]), 2)
+        state["remaining"].discard(slot)
+        if not state["remaining"] and not state["future"].done():
+            state["future"].set_result(state["measured"])
+
+
+class SimulatedFlowSensor:
+    """Emits pulse records for the running pumps of a FakeController
+
+    `flow_rates` is {slot: ml/s}; the actual flow wanders by `jitter` around
+    it, like a draining bottle, and keeps going for `stop_latency` seconds
+    after a pump was stopped. Records go to a pipe whose read end is `fd`.
+    """
+
+    def __init__(self, fake, flow_rates=None, ml_per_pulse=DEFAULT_ML_PER_PULSE, tick=0.001, jitter=0.1,
+                 stop_latency=0.02, seed=1):
+        self.fake = fake
+        self.flow_rates = flow_rates or {}
+        self.ml_per_pulse = ml_per_pulse
+        self.tick = tick
+        self.jitter = jitter
+        self.stop_latency = stop_latency
+        self.fd, self._write_fd = os.pipe()
+        self._rng = random.Random(seed)
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="flow-sensor", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        self._thread.join(timeout=1.0)
+        os.close(self._write_fd)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        fraction = [0.0] * (NUM_SLOTS + 1)
+        flowing_until = [0.0] * (NUM_SLOTS + 1)
+        last = time.monotonic()
+        buffer = bytearray(RECORD_STRUCT.size * (NUM_SLOTS + 1))
+        while not self._closed.wait(self.tick):
+            now = time.monotonic()
+            elapsed, last = now - last, now
+            for slot in list(self.fake.running):
+                flowing_until[slot] = now + self.stop_latency
+            size = 0
+            for slot in range(1, NUM_SLOTS + 1):
+                if flowing_until[slot] < now:
+                    continue
+                rate = self.flow_rates.get(slot, DEFAULT_FLOW_RATE) * (1 + self._rng.uniform(-self.jitter, self.jitter))
+                fraction[slot] += rate * elapsed / self.ml_per_pulse
+                pulses = int(fraction[slot])
+                if pulses:
+                    fraction[slot] -= pulses
+                    RECORD_STRUCT.pack_into(buffer, size, slot, 0, min(pulses, 0xFFFF), int(now * 1e6) & 0xFFFFFFFF)
+                    size += RECORD_STRUCT.size
+            if size:
+                os.write(self._write_fd, buffer[:size])
+
+
+def open_flow_meter_from_env(pumps):
+    """Open the pulse stream named by MIXMASTERX_FLOW_PORT, or return None
+
+    With a fake pump controller, `MIXMASTERX_FLOW_PORT=fake` simulates the
+    sensors.
+    """
+    port = os.environ.get("MIXMASTERX_FLOW_PORT")
+    if not port or pumps is None:
+        return None
+    if port == "fake":
+        sensor = SimulatedFlowSensor(pumps.fake).start()
+        meter = FlowMeter(sensor.fd)
+        meter.sensor = sensor
+        return meter.start()
+    return FlowMeter(os.open(port, os.O_RDONLY | os.O_NOCTTY)).start()
@@ -0,0 +1,238 @@
+"""Responsive, cacheable cocktail images for remote Streamlit clients
+
+`st.image` sends the full 700x933 JPEG of every card, without cache headers,
+to every browser that opens the menu. Here each image is encoded once as
+WebP and JPEG at a few widths and stored in `data/image_variants/` under a
+name derived from a hash of the image content. A small HTTP server hands the
+files out with `Cache-Control: immutable`, and the cards reference them
+through `<picture>`/`srcset`, so a tablet downloads the smallest variant
+that fills its card and never asks for it again. A changed image gets a new
+hash and therefore new URLs.
+
+Run `python src/image_variants.py` to encode all images in assets/ ahead
+of time; otherwise an image is encoded the first time a card shows it.
+"""
+import argparse
+import glob
+import hashlib
+import html
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+VARIANTS_DIR = "image_variants"
+DEFAULT_PORT = 9466
+# Widths in pixels; a card is about 400 CSS pixels wide on a 1280px screen
+WIDTHS = (240, 360, 480, 700)
+# (extension, MIME type, Pillow save options); browsers take the first type they support
+FORMATS = (
+    ("webp", "image/webp", {"format": "WEBP", "quality": 80, "method": 4}),
+    ("jpg", "image/jpeg", {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True}),
+)
+# Bump when the encoding changes, so browsers do not keep the old files
+ENCODING_VERSION = b"1"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+VARIANT_NAME = re.compile(r"^[0-9a-f]{16}-\d+\.(webp|jpg)$")
+MIME_TYPES = {ext: mime for ext, mime, _ in FORMATS}
+
+
+class ImageVariants:
+    """The encoded variants of one image
+
+    `files` maps each extension to [(width, file name), ...] by ascending
+    width; `size` is the size of the source image.
+    """
+
+    __slots__ = ("digest", "size", "files")
+
+    def __init__(self, digest, size, files):
+        self.digest = digest
+        self.size = size
+        self.files = files
+
+
+class VariantStore:
+    """Encodes images into content-addressed variant files on first use"""
+
+    def __init__(self, data_dir=DATA_DIR):
+        self.directory = os.path.join(data_dir, VARIANTS_DIR)
+        os.makedirs(self.directory, exist_ok=True)
+        self._known = {}          # (path, mtime_ns, size) -> ImageVariants
+        self._lock = threading.Lock()
+
+    def variants(self, image_path):
+        """Return the ImageVariants of an image, encoding the missing files"""
+        st = os.stat(image_path)
+        key = (os.path.abspath(image_path), st.st_mtime_ns, st.st_size)
+        variants = self._known.get(key)
+        if variants is not None:
+            return variants
+        # Streamlit runs every session on its own thread
+        with self._lock:
+            variants = self._known.get(key)
+            if variants is None:
+                variants = self._encode(image_path)
+                self._known[key] = variants
+        return variants
+
+    def _encode(self, image_path):
+        with open(image_path, 'rb') as f:
+            data = f.read()
+        digest = hashlib.sha256(ENCODING_VERSION + data).hexdigest()[:16]
+        files = {}
+        # Opening reads only the header; pixels are decoded once a file is missing
+        with Image.open(image_path) as img:
+            size = img.size
+            # Never upscale: widths beyond the original collapse into the original width
+            widths = sorted({min(width, size[0]) for width in WIDTHS})
+            for ext, _, options in FORMATS:
+                files[ext] = []
+                for width in widths:
+                    name = f"{digest}-{width}.{ext}"
+                    path = os.path.join(self.directory, name)
+                    if not os.path.exists(path):
+                        if img.mode not in ("RGB", "L"):
+                            img = img.convert("RGB")
+                        scaled = img.resize((width, round(size[1] * width / size[0])), Image.Resampling.LANCZOS)
+                        scaled.save(path + ".tmp", **options)
+                        os.replace(path + ".tmp", path)
+                    files[ext].append((width, name))
+        return ImageVariants(digest, size, files)
+
+    def path_of(self, name):
+        """Return the file of a variant name from a URL, or None if the name is not one"""
+        if not VARIANT_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.exists(path) else None
+
+
+def picture_html(variants, base_url, alt="", sizes="(max-width: 640px) 100vw, 33vw"):
+    """Return a <picture> element that lets the browser pick a variant
+
+    `sizes` tells the browser how wide the card is drawn; the cocktail grid
+    has two or three columns, or one on a phone.
+    """
+    def srcset(ext):
+        return ", ".join(f"{base_url}/img/{name} {width}w" for width, name in variants.files[ext])
+
+    jpeg = variants.files["jpg"]
+    fallback = next((name for width, name in jpeg if width >= 480), jpeg[-1][1])
+    width, height = variants.size
+    sources = "".join(f'<source type="{mime}" srcset="{srcset(ext)}" sizes="{sizes}">'
+                      for ext, mime, _ in FORMATS if ext != "jpg")
+    return (f'<picture>{sources}'
+            f'<img src="{base_url}/img/{fallback}" srcset="{srcset("jpg")}" sizes="{sizes}" '
+            f'width="{width}" height="{height}" alt="{html.escape(alt)}" loading="lazy" decoding="async" '
+            f'style="width: 100%; height: auto;"></picture>')
+
+
+class ImageServer:
+    """Serves /img/<variant> with long-lived cache headers from a daemon thread"""
+
+    def __init__(self, store, host="0.0.0.0", port=DEFAULT_PORT):
+        self.store = store
+        self.bytes_sent = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.respond(body=True)
+
+            def do_HEAD(self):
+                self.respond(body=False)
+
+            def respond(self, body):
+                prefix, _, name = self.path.split("?")[0].rpartition("/")
+                path = store.path_of(name) if prefix == "/img" else None
+                if path is None:
+                    self.send_error(404)
+                    return
+                etag = f'"{name}"'
+                if self.headers.get("If-None-Match") == etag:
+                    # The name is the content hash, so a cached copy is always current
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Cache-Control", CACHE_CONTROL)
+                    self.end_headers()
+                    return
+                with open(path, 'rb') as f:
+                    data = f.read()
+                self.send_response(200)
+                self.send_header("Content-Type", MIME_TYPES[name.rpartition(".")[2]])
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Cache-Control", CACHE_CONTROL)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                if body:
+                    self.wfile.write(data)
+                    server.bytes_sent += len(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="image-http", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def start_image_server(data_dir=DATA_DIR, port=DEFAULT_PORT):
+    """Start the image server once per process and return it
+
+    The port can be overridden with MIXMASTERX_IMAGE_PORT; 0 disables the
+    server and None is returned, as when the port is taken. Then the pages
+    fall back to st.image.
+    """
+    with _servers_lock:
+        if data_dir in _servers:
+            return _servers[data_dir]
+        port = int(os.environ.get("MIXMASTERX_IMAGE_PORT", port))
+        server = None
+        if port:
+            try:
+                server = ImageServer(VariantStore(data_dir), port=port).start()
+            except OSError:
+                server = None
+        _servers[data_dir] = server
+        return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bildvarianten für die Streamlit-Seiten vorab erzeugen")
+    parser.add_argument("images", nargs="*", help="Bilder (Standard: alle Bilder in assets/)")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args(argv)
+
+    images = args.images or sorted(glob.glob(os.path.join(ASSETS_DIR, "*.jpg")) +
+                                   glob.glob(os.path.join(ASSETS_DIR, "*.jpeg")) +
+                                   glob.glob(os.path.join(ASSETS_DIR, "*.png")))
+    store = VariantStore(args.data_dir)
+    for image in images:
+        variants = store.variants(image)
+        sizes = ", ".join(f"{width}px {os.path.getsize(os.path.join(store.directory, name)) / 1024:.0f} KiB"
+                          for width, name in variants.files["webp"])
+        print(f"{os.path.basename(image)}: {sizes} (WebP)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""Event-loop latency watchdog and callback timing for the Tk frontends
+
+A heartbeat scheduled with `after` measures how late the Tk mainloop runs
+its timers, which is what the user feels as a sluggish touchscreen. UI
+callbacks wrapped with `instrument` are timed, and a sampler thread grabs the
+main thread's stack while a callback blocks for longer than the threshold,
+so slow-callback reports show where the time went.
+
+The hot path is a few perf_counter calls and attribute writes per
+callback; the sampler thread only wakes a few times per threshold, so the
+watchdog is cheap enough to stay on in production.
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+# Upper bounds (ms) of the lateness histogram buckets
+LATENESS_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class CallbackStats:
+    """Call count and timing of one instrumented callback"""
+
+    __slots__ = ("calls", "total", "max", "slow")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+
+    def to_dict(self):
+        return {
+            "calls": self.calls,
+            "total_ms": round(self.total * 1000, 3),
+            "mean_ms": round(self.total * 1000 / self.calls, 3) if self.calls else 0.0,
+            "max_ms": round(self.max * 1000, 3),
+            "slow": self.slow,
+        }
+
+
+class LatencyWatchdog:
+    """Measures event-loop lateness and times UI callbacks
+
+    `interval_ms` is the heartbeat period, `threshold_ms` the duration after
+    which a callback or a late heartbeat counts as slow. Slow-callback reports
+    are kept in memory (the last `max_reports`) and appended as JSON lines to
+    `report_file` if given.
+    """
+
+    def __init__(self, root, interval_ms=100, threshold_ms=50, report_file=None, max_reports=100):
+        self.root = root
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.report_file = report_file
+        self.reports = deque(maxlen=max_reports)
+        self.callbacks = {}
+
+        self.ticks = 0
+        self.late_ticks = 0
+        self.max_lateness = 0.0
+        self.histogram = [0] * (len(LATENESS_BUCKETS) + 1)
+
+        self._after_id = None
+        self._expected = None
+        self._main_thread = threading.main_thread().ident
+        # The outermost span the main thread is in: [start, ticks at start, stack samples]
+        self._span = None
+        self._stop = threading.Event()
+        self._sampler = None
+
+    # Heartbeat -----------------------------------------------------------------
+
+    def start(self):
+        """Start the heartbeat and the stack sampler"""
+        if self._after_id is not None:
+            return
+        self._stop.clear()
+        self._sampler = threading.Thread(target=self._sample_loop, name="latency-sampler", daemon=True)
+        self._sampler.start()
+        self._schedule()
+
+    def stop(self):
+        """Stop the heartbeat and the stack sampler"""
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+        self._stop.set()
+
+    def _schedule(self):
+        self._expected = time.perf_counter() + self.interval
+        self._after_id = self.root.after(int(self.interval * 1000), self._tick)
+
+    def _tick(self):
+        lateness = max(0.0, time.perf_counter() - self._expected)
+        self.ticks += 1
+        self.max_lateness = max(self.max_lateness, lateness)
+        ms = lateness * 1000
+        for i, bound in enumerate(LATENESS_BUCKETS):
+            if ms <= bound:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+        if lateness > self.threshold:
+            self.late_ticks += 1
+        self._schedule()
+
+    # Callback spans ------------------------------------------------------------
+
+    def wrap(self, func, name=None):
+        """Return `func` wrapped in a timing span"""
+        name = name or getattr(func, "__qualname__", repr(func))
+        stats = self.callbacks.setdefault(name, CallbackStats())
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            # Nested spans are timed, but only the outermost one is sampled
+            span = None
+            if self._span is None:
+                span = self._span = [time.perf_counter(), self.ticks, []]
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                stats.calls += 1
+                stats.total += elapsed
+                if elapsed > stats.max:
+                    stats.max = elapsed
+                if span is not None:
+                    self._span = None
+                    # Heartbeats during the span mean a nested event loop
+                    # (e.g. a messagebox) kept the UI alive, so it did not block
+                    if elapsed > self.threshold and span[1] == self.ticks:
+                        stats.slow += 1
+                        self._report(name, elapsed, span[2])
+        return timed
+
+    def instrument(self, obj, names):
+        """Replace the bound methods `names` of `obj` with timed wrappers
+
+        Must run before the methods are handed to Tk as commands, since
+        widgets keep a reference to the method they were given.
+        """
+        for name in names:
+            method = getattr(obj, name)
+            setattr(obj, name, self.wrap(method, f"{type(obj).__name__}.{name}"))
+
+    def _sample_loop(self):
+        """Grab the main thread's stack while a span runs past the threshold"""
+        period = self.threshold / 2
+        while not self._stop.wait(period):
+            span = self._span
+            if span is None or span[1] != self.ticks or time.perf_counter() - span[0] < self.threshold:
+                continue
+            frame = sys._current_frames().get(self._main_thread)
+            if frame is not None and len(span[2]) < 20:
+                span[2].append("".join(traceback.format_stack(frame)))
+
+    def _report(self, name, elapsed, samples):
+        report = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "callback": name,
+            "duration_ms": round(elapsed * 1000, 1),
+            # Identical samples are folded so a long stall stays readable
+            "stacks": [{"count": samples.count(stack), "stack": stack} for stack in dict.fromkeys(samples)],
+        }
+        self.reports.append(report)
+        if self.report_file:
+            try:
+                os.makedirs(os.path.dirname(self.report_file) or ".", exist_ok=True)
+                with open(self.report_file, 'a') as f:
+                    f.write(json.dumps(report) + "\n")
+            except OSError:
+                pass
+
+    # Reporting -----------------------------------------------------------------
+
+    def summary(self):
+        """Return lateness and callback statistics as a dict"""
+        histogram = {f"<={bound}ms": count for bound, count in zip(LATENESS_BUCKETS, self.histogram)}
+        histogram[f">{LATENESS_BUCKETS[-1]}ms"] = self.histogram[-1]
+        return {
+            "ticks": self.ticks,
+            "late_ticks": self.late_ticks,
+            "max_lateness_ms": round(self.max_lateness * 1000, 1),
+            "lateness_histogram": histogram,
+            "callbacks": {name: stats.to_dict() for name, stats in self.callbacks.items()},
+            "slow_reports": len(self.reports),
+        }
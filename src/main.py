@@ -1,10 +1,12 @@
 import tkinter as tk
 from tkinter import ttk
-from PIL import Image, ImageTk
 import os
 import threading
 import time
 
+from instrumentation import LatencyWatchdog
+from thumbnail_pack import ThumbnailPack, DISPLAY_SIZE
+
 class CocktailDisplayApp:
     def __init__(self, root):
         self.root = root
@@ -25,6 +27,15 @@ class CocktailDisplayApp:
         # Dictionary to store name labels
         self.name_labels = {}
         
+        # Time the callbacks and watch the event loop for stalls
+        data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+        self.watchdog = LatencyWatchdog(self.root, report_file=os.path.join(data_dir, "latency_reports.jsonl"))
+        self.watchdog.instrument(self, ["load_images", "on_image_click"])
+        self.watchdog.start()
+        
+        # Scaled images come from data/thumbnails.pack; only new or changed images are decoded
+        self.thumbnail_pack = ThumbnailPack(data_dir)
+        
         # Load and display the images
         self.load_images()
 
@@ -42,11 +53,8 @@ class CocktailDisplayApp:
         for i, image_file in enumerate(image_files):
             image_path = os.path.join(assets_dir, image_file)
             
-            # Load and resize the image
-            img = Image.open(image_path)
-            # Resize to fit in the display (approximately 250x250 each)
-            img = img.resize((250, 250), Image.LANCZOS)
-            photo = ImageTk.PhotoImage(img)
+            # Packed tile, resized to fit in the display (250x250 each)
+            photo = tk.PhotoImage(data=bytes(self.thumbnail_pack.tile(image_path, DISPLAY_SIZE)), format="ppm")
             
             # Create a label for the image
             img_label = ttk.Label(self.images_frame, image=photo)
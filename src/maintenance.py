@@ -0,0 +1,627 @@
+"""Predictive line priming and idle-time maintenance
+
+A pump line that sat unused for `prime_after` seconds has to be primed
+(a few seconds of pumping into the drip tray) before it pours exactly again,
+and the nozzle needs a water flush every `flush_interval` seconds. Done on
+demand, both land on the critical path of whatever drink comes next.
+
+`MaintenanceScheduler` moves that work into idle gaps instead:
+
+- It keeps the lines that the next drinks are likely to use primed. The
+  estimate combines a decaying popularity count per drink with the recent
+  arrival rate: a slot is primed when it is likely to be used before it
+  goes cold again.
+- A due flush waits until the queue is empty and the next order is
+  unlikely to arrive within the flush. It only goes on the critical path
+  once it is overdue by `flush_grace`.
+- Priming is preemptible: an arriving order stops it right away.
+
+`serve_orders` is the serving loop shared by every backend. It handles
+orders first come, first served, and gives maintenance the idle time in
+between. `VirtualMachine` runs it on a simulated clock over a recorded or
+synthetic order trace. `PumpMachine` runs it on a PumpController, either the
+real one or the FakeController, time-compressed. Comparing the two on the
+same trace validates the timing model against the pump backend:
+
+    python src/maintenance.py --trace data/order_trace.jsonl
+    python src/maintenance.py --rate 180 --hours 2 --backend --time-scale 200
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from recipe_model import load_json, load_recipe_store
+from pump_controller import DEFAULT_FLOW_RATE, FakeController, PumpController, PumpControllerError
+from simulator import MenuProfile, SimulationConfig, arrival_times
+from metrics import QUEUE_DEPTH
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+TRACE_FILE = "order_trace.jsonl"
+
+
+class MaintenanceTask:
+    __slots__ = ("kind", "durations", "preemptible", "critical")
+
+    def __init__(self, kind, durations, preemptible, critical=False):
+        self.kind = kind             # "prime" or "flush"
+        self.durations = durations   # {slot: seconds}
+        self.preemptible = preemptible
+        self.critical = critical     # runs while a customer waits
+
+
+class MaintenanceScheduler:
+    """Decides when lines are primed and flushed
+
+    `drink_slots` is {cocktail: [slot, ...]}. It is extended by the orders
+    themselves, so an empty mapping works for live use. The prime and
+    timing parameters come from the SimulationConfig. Without `flush_slot`,
+    which is the pump with rinse water, no flushes are scheduled. With
+    `predictive=False` the scheduler behaves like a plain timer: it primes
+    on demand and flushes as soon as a flush is due.
+    """
+
+    def __init__(self, drink_slots=None, config=None, flush_slot=None, flush_interval=1800.0,
+                 flush_seconds=20.0, flush_grace=0.5, prime_threshold=0.5, half_life=20, predictive=True):
+        self.drink_slots = {name: list(slots) for name, slots in (drink_slots or {}).items()}
+        self.config = config or SimulationConfig()
+        self.flush_slot = flush_slot
+        self.flush_interval = flush_interval
+        self.flush_seconds = flush_seconds
+        self.flush_grace = flush_grace
+        self.prime_threshold = prime_threshold
+        self.predictive = predictive
+        self.warm_until = {}         # slot -> time the line goes cold
+        self.last_flush = 0.0
+        self.popularity = {}         # cocktail -> decaying order count
+        self._decay = 0.5 ** (1 / half_life)
+        self._alpha = 1 - self._decay
+        self._last_arrival = None
+        self.mean_gap = None         # smoothed seconds between orders
+
+    # Observations ------------------------------------------------------------
+
+    def order_arrived(self, now, cocktail, slots=None):
+        if slots is not None:
+            self.drink_slots[cocktail] = list(slots)
+        for name in self.popularity:
+            self.popularity[name] *= self._decay
+        self.popularity[cocktail] = self.popularity.get(cocktail, 0.0) + 1.0
+        if self._last_arrival is not None:
+            gap = now - self._last_arrival
+            self.mean_gap = gap if self.mean_gap is None else self.mean_gap + self._alpha * (gap - self.mean_gap)
+        self._last_arrival = now
+
+    def poured(self, now, slots):
+        for slot in slots:
+            self.warm_until[slot] = now + self.config.prime_after
+
+    def task_done(self, task, now, completed):
+        if not completed:
+            return
+        if task.kind == "prime":
+            self.poured(now, task.durations)
+        elif task.kind == "flush":
+            self.last_flush = now
+
+    # Decisions ---------------------------------------------------------------
+
+    def is_warm(self, slot, now):
+        return self.warm_until.get(slot, -math.inf) > now
+
+    def before_pour(self, now, slots):
+        """Return the tasks that have to run before this drink, in order"""
+        tasks = []
+        due = self.last_flush + self.flush_interval * (1 + self.flush_grace if self.predictive else 1)
+        if self.flush_slot is not None and now >= due:
+            tasks.append(self._flush(critical=True))
+        cold = [slot for slot in slots if not self.is_warm(slot, now)]
+        if cold:
+            tasks.append(MaintenanceTask("prime", dict.fromkeys(cold, self.config.prime_seconds), False, True))
+        return tasks
+
+    def idle_task(self, now):
+        """Return the task to run now that no order is waiting, or None"""
+        if self.flush_slot is not None and now >= self.last_flush + self.flush_interval:
+            if not self.predictive or now >= self.last_flush + self.flush_interval * (1 + self.flush_grace):
+                return self._flush()
+            if self._quiet_probability(now, self.flush_seconds) >= 0.5:
+                return self._flush()
+        if not self.predictive:
+            return None
+        likely = self.slot_probabilities(now)
+        cold = [slot for slot, p in likely.items()
+                if p >= self.prime_threshold and not self.is_warm(slot, now)]
+        if cold:
+            return MaintenanceTask("prime", dict.fromkeys(sorted(cold), self.config.prime_seconds), True)
+        return None
+
+    def next_check(self, now):
+        """Return when `idle_task` could change its answer without a new order"""
+        times = [until for until in self.warm_until.values() if until > now]
+        if self.flush_slot is not None:
+            due = self.last_flush + self.flush_interval
+            # A due flush waits for a quiet moment, which gets likelier the longer nobody orders
+            times.append(due if due > now else now + self.flush_seconds)
+        return min(times) if times else None
+
+    def slot_probabilities(self, now):
+        """Return {slot: probability that it is used before a fresh prime goes cold}"""
+        total = sum(self.popularity.values())
+        gap = self._expected_gap(now)
+        if not total or not gap:
+            return {}
+        next_drink = {}
+        for name, weight in self.popularity.items():
+            for slot in self.drink_slots.get(name, ()):
+                next_drink[slot] = next_drink.get(slot, 0.0) + weight / total
+        drinks = self.config.prime_after / gap
+        return {slot: 1 - (1 - min(p, 1.0)) ** drinks for slot, p in next_drink.items()}
+
+    def _expected_gap(self, now):
+        # A long pause means the rush is over, whatever the average says
+        if self.mean_gap is None:
+            return None
+        return max(self.mean_gap, now - self._last_arrival)
+
+    def _quiet_probability(self, now, seconds):
+        gap = self._expected_gap(now)
+        return math.exp(-seconds / gap) if gap else 1.0
+
+    def _flush(self, critical=False):
+        return MaintenanceTask("flush", {self.flush_slot: self.flush_seconds}, False, critical)
+
+
+class ServiceStats:
+    """What a serving run cost the customers and the bottles"""
+
+    def __init__(self, flow_rates=None):
+        self.flow_rates = flow_rates or {}
+        self.arrivals = []
+        self.starts = []
+        self.done = []
+        self.critical_seconds = {"prime": 0.0, "flush": 0.0}
+        self.critical_orders = 0     # orders that waited for maintenance
+        self.tasks = {"prime": 0, "flush": 0}
+        self.preempted = 0
+        self.prime_ml = 0.0
+
+    def task(self, task, completed, elapsed):
+        if completed:
+            self.tasks[task.kind] += 1
+        else:
+            self.preempted += 1
+        if task.critical:
+            self.critical_seconds[task.kind] += elapsed
+        if task.kind == "prime":
+            self.prime_ml += sum(min(elapsed, seconds) * self.flow_rates.get(slot, DEFAULT_FLOW_RATE)
+                                 for slot, seconds in task.durations.items())
+
+    def order(self, arrival, start, done, delayed):
+        self.arrivals.append(arrival)
+        self.starts.append(start)
+        self.done.append(done)
+        self.critical_orders += bool(delayed)
+
+    def summary(self):
+        waits = np.subtract(self.starts, self.arrivals)
+        turnarounds = np.subtract(self.done, self.arrivals)
+        orders = len(self.arrivals)
+        return {
+            "orders": orders,
+            "wait_p50_s": round(float(np.percentile(waits, 50)), 1) if orders else 0.0,
+            "wait_p95_s": round(float(np.percentile(waits, 95)), 1) if orders else 0.0,
+            "turnaround_p95_s": round(float(np.percentile(turnarounds, 95)), 1) if orders else 0.0,
+            "delayed_orders": self.critical_orders,
+            "critical_prime_s": round(self.critical_seconds["prime"], 1),
+            "critical_flush_s": round(self.critical_seconds["flush"], 1),
+            "primes": self.tasks["prime"],
+            "flushes": self.tasks["flush"],
+            "preempted": self.preempted,
+            "prime_ml": round(self.prime_ml, 1),
+            "makespan_s": round(self.done[-1], 1) if orders else 0.0,
+        }
+
+
+def serve_orders(machine, scheduler, stats, config):
+    """Serve orders from `machine` until it has no more, FIFO with maintenance in the gaps
+
+    An order is (arrival, cocktail, {slot: ml}). Service is handover,
+    maintenance that could not wait, the pour (all slots at once) and the
+    nozzle rinse. Handover and rinse are only waited for; at the machine
+    itself both are zero (see `live_config`).
+    """
+    while True:
+        order = machine.take_order()
+        if order is None:
+            if machine.finished():
+                return stats
+            now = machine.now()
+            task = scheduler.idle_task(now)
+            if task is None:
+                machine.idle_until(scheduler.next_check(now))
+            else:
+                completed, elapsed = machine.run(task.durations, task.preemptible)
+                scheduler.task_done(task, machine.now(), completed)
+                stats.task(task, completed, elapsed)
+            continue
+
+        arrival, cocktail, slot_ml = order
+        slots = sorted(slot for slot, ml in slot_ml.items() if ml > 0)
+        scheduler.order_arrived(arrival, cocktail, slots)
+        start = machine.now()
+        machine.wait(config.handover_seconds)
+        tasks = scheduler.before_pour(machine.now(), slots)
+        for task in tasks:
+            completed, elapsed = machine.run(task.durations, False)
+            scheduler.task_done(task, machine.now(), completed)
+            stats.task(task, completed, elapsed)
+        machine.pour(order)
+        scheduler.poured(machine.now(), slots)
+        machine.wait(config.cleaning_seconds)
+        stats.order(arrival, start, machine.now(), tasks)
+        machine.order_done(order)
+
+
+class VirtualMachine:
+    """Serves a trace on a simulated clock; pumps take exactly their nominal time"""
+
+    def __init__(self, trace, flow_rates=None):
+        self.trace = trace           # [(arrival, cocktail, {slot: ml}), ...] sorted by arrival
+        self.flow_rates = flow_rates or {}
+        self.clock = 0.0
+        self._next = 0
+
+    def now(self):
+        return self.clock
+
+    def finished(self):
+        return self._next == len(self.trace)
+
+    def take_order(self):
+        if self._next < len(self.trace) and self.trace[self._next][0] <= self.clock:
+            self._next += 1
+            return self.trace[self._next - 1]
+        return None
+
+    def _next_arrival(self):
+        return self.trace[self._next][0] if self._next < len(self.trace) else math.inf
+
+    def idle_until(self, until):
+        self.clock = max(self.clock, min(until if until is not None else math.inf, self._next_arrival()))
+
+    def wait(self, seconds):
+        self.clock += seconds
+
+    def run(self, durations, preemptible):
+        seconds = max(durations.values())
+        arrival = self._next_arrival()
+        if preemptible and arrival < self.clock + seconds:
+            elapsed, self.clock = arrival - self.clock, arrival
+            return False, elapsed
+        self.clock += seconds
+        return True, seconds
+
+    def pour(self, order):
+        self.clock += max(ml / self.flow_rates.get(slot, DEFAULT_FLOW_RATE) for slot, ml in order[2].items())
+
+    def order_done(self, order):
+        pass
+
+
+class PumpMachine:
+    """Serves orders on a PumpController in (optionally compressed) real time
+
+    Orders come in through `submit`, from the UI or from `feed`. Machine
+    time is in real seconds times `time_scale`. The pumps run for their
+    durations divided by the scale. `pour` overrides how drinks are poured,
+    e.g. with ClosedLoopDispenser.dispense. It needs a time scale of 1. With
+    a DispenseJournal every drink is journaled while it is poured, with an
+    OrderProgress every order reports its progress and ETA. The number of
+    orders waiting to be poured is exported as the queue depth metric.
+    """
+
+    def __init__(self, pumps, flow_rates=None, time_scale=1.0, pour=None, journal=None, progress=None):
+        self.pumps = pumps
+        self.journal = journal
+        self.progress = progress
+        self.flow_rates = flow_rates or {}
+        self.time_scale = time_scale
+        self._pour = pour or (lambda slot_ml: pumps.dispense(slot_ml, {
+            slot: self.flow_rates.get(slot, DEFAULT_FLOW_RATE) * time_scale for slot in slot_ml}))
+        self._orders = deque()
+        self._results = {}           # id(order) -> Future of the pour result
+        self._order_ids = {}         # id(order) -> order ID for the progress reports
+        self._cond = threading.Condition()
+        self._closed = False
+        self._start = time.monotonic()
+
+    def now(self):
+        return (time.monotonic() - self._start) * self.time_scale
+
+    def submit(self, cocktail, slot_ml, order_id=None):
+        """Queue an order; returns a Future of the pour result
+
+        `order_id` names the order in the progress reports; one is assigned
+        if it is not given.
+        """
+        order = (self.now(), cocktail, dict(slot_ml))
+        future = Future()
+        if self.progress is not None:
+            if order_id is None:
+                order_id = self.progress.next_id()
+            self.progress.queued(order_id, cocktail, slot_ml)
+        with self._cond:
+            self._results[id(order)] = future
+            self._order_ids[id(order)] = order_id
+            self._orders.append(order)
+            QUEUE_DEPTH.set(len(self._orders))
+            self._cond.notify_all()
+        return future
+
+    def feed(self, trace):
+        """Submit a trace at its (scaled) arrival times from a background thread"""
+        def run():
+            for arrival, cocktail, slot_ml in trace:
+                delay = (arrival - self.now()) / self.time_scale
+                if delay > 0:
+                    time.sleep(delay)
+                self.submit(cocktail, slot_ml)
+            self.close()
+        thread = threading.Thread(target=run, name="trace-feeder", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        """Serve what is queued, then let `serve_orders` return"""
+        with self._cond:
+            self._closed = True
+        self._notify()
+
+    def _notify(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def finished(self):
+        with self._cond:
+            return self._closed and not self._orders
+
+    def take_order(self):
+        with self._cond:
+            if not self._orders:
+                return None
+            order = self._orders.popleft()
+            QUEUE_DEPTH.set(len(self._orders))
+            return order
+
+    def idle_until(self, until):
+        timeout = None if until is None else max(0.0, (until - self.now()) / self.time_scale)
+        with self._cond:
+            self._cond.wait_for(lambda: self._orders or self._closed, timeout)
+
+    def wait(self, seconds):
+        time.sleep(seconds / self.time_scale)
+
+    def run(self, durations, preemptible):
+        start = self.now()
+        try:
+            done = self.pumps.dispense(durations, dict.fromkeys(durations, self.time_scale))
+            if preemptible:
+                done.add_done_callback(lambda f: self._notify())
+                with self._cond:
+                    self._cond.wait_for(lambda: self._orders or done.done())
+                if not done.done():
+                    self.pumps.stop(list(durations)).result()
+                    done.result()
+                    return False, self.now() - start
+            done.result()
+        except PumpControllerError:
+            # A failed prime or flush is retried later; drinks must not wait for it
+            return False, self.now() - start
+        return True, self.now() - start
+
+    def pour(self, order):
+        future = self._results.get(id(order))
+        order_id = self._order_ids.get(id(order))
+        progress = self.progress if order_id is not None else None
+        entry = self.journal.begin(order[1], order[2]) if self.journal is not None else None
+        try:
+            pouring = self._pour(order[2])
+            if progress is not None:
+                progress.pouring(order_id)
+            result = pouring.result()
+        except Exception as e:
+            if entry is not None:
+                self.journal.end(entry, "aborted")
+            if progress is not None:
+                progress.poured(order_id, ok=False)
+            if future is not None:
+                future.set_exception(e)
+            return
+        if entry is not None:
+            self.journal.end(entry)
+        if progress is not None:
+            progress.poured(order_id)
+        if future is not None:
+            future.set_result(result)
+
+    def order_done(self, order):
+        self._results.pop(id(order), None)
+        order_id = self._order_ids.pop(id(order), None)
+        if self.progress is not None and order_id is not None:
+            self.progress.finished(order_id)
+
+
+def live_config(config):
+    """Return `config` for serving at the machine itself
+
+    The handover and cleaning times model the guest taking the glass and a
+    rinse in the simulation. At the machine nobody has to wait for them:
+    the next drink is poured as soon as the last one is done, and a rinse is
+    a flush task of the scheduler that runs on the pumps.
+    """
+    return config.replace(handover_seconds=0.0, cleaning_seconds=0.0)
+
+
+class MaintenanceService:
+    """Runs `serve_orders` on a PumpMachine in a background thread, for the UI
+
+    Without `config`, the scheduler's config is served with `live_config`.
+    """
+
+    def __init__(self, pumps, scheduler, config=None, flow_rates=None, pour=None, journal=None, progress=None):
+        self.scheduler = scheduler
+        self.config = config or live_config(scheduler.config)
+        self.machine = PumpMachine(pumps, flow_rates, pour=pour, journal=journal, progress=progress)
+        if progress is not None:
+            progress.bind(scheduler, self.machine.now)
+        self.stats = ServiceStats(flow_rates)
+        self._thread = threading.Thread(target=serve_orders, name="maintenance",
+                                        args=(self.machine, scheduler, self.stats, self.config), daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, cocktail, slot_ml, order_id=None):
+        """Queue a drink; returns a Future of the pour result"""
+        return self.machine.submit(cocktail, slot_ml, order_id)
+
+    def close(self, timeout=1.0):
+        self.machine.close()
+        self._thread.join(timeout)
+
+
+# Order traces ------------------------------------------------------------------
+
+class TraceRecorder:
+    """Appends every order as a JSON line {"t": unix time, "cocktail": name}"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def record(self, cocktail, t=None):
+        line = json.dumps({"t": round(time.time() if t is None else t, 3), "cocktail": cocktail}, ensure_ascii=False)
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + "\n")
+        except OSError:
+            pass
+
+
+def load_trace(path, profile, glass_size):
+    """Read a recorded trace as [(seconds since the first order, cocktail, {slot: ml}), ...]
+
+    Orders for drinks the profile cannot make are skipped.
+    """
+    pours = drink_pours(profile, glass_size)
+    events = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            if entry.get("cocktail") in pours:
+                events.append((float(entry["t"]), entry["cocktail"]))
+    events.sort()
+    first = events[0][0] if events else 0.0
+    return [(t - first, name, pours[name]) for t, name in events]
+
+
+def synthetic_trace(profile, config, seed=1):
+    """Draw a trace from the simulator's arrival model and the profile's popularity"""
+    rng = np.random.default_rng(seed)
+    arrivals = arrival_times(config, rng)
+    choices = rng.choice(len(profile.names), size=len(arrivals), p=profile.weights)
+    pours = drink_pours(profile, config.glass_size)
+    return [(t, profile.names[c], pours[profile.names[c]]) for t, c in zip(arrivals.tolist(), choices.tolist())]
+
+
+def drink_pours(profile, glass_size):
+    """Return {cocktail: {slot: ml}} for every drink of a MenuProfile"""
+    slot_ml = profile.slot_ml * (glass_size / 100)
+    return {name: {int(slot) + 1: float(row[slot]) for slot in np.flatnonzero(row)}
+            for name, row in zip(profile.names, slot_ml)}
+
+
+def compare(trace, profile, config, backend=False, time_scale=200.0, **scheduler_options):
+    """Serve `trace` with a timer-style and the predictive scheduler
+
+    Returns {policy: summary}. With `backend`, both policies also run on a
+    FakeController, and the summaries of those runs are added as well.
+    """
+    drink_slots = {name: list(pours) for name, pours in drink_pours(profile, config.glass_size).items()}
+    flow_rates = config.flow_rates
+    results = {}
+    for policy, predictive in (("timer", False), ("predictive", True)):
+        scheduler = MaintenanceScheduler(drink_slots, config, predictive=predictive, **scheduler_options)
+        stats = serve_orders(VirtualMachine(trace, flow_rates), scheduler, ServiceStats(flow_rates), config)
+        results[policy] = stats.summary()
+        if backend:
+            scheduler = MaintenanceScheduler(drink_slots, config, predictive=predictive, **scheduler_options)
+            with FakeController() as fake, PumpController(fake.port) as pumps:
+                machine = PumpMachine(pumps, flow_rates, time_scale)
+                machine.feed(trace)
+                stats = serve_orders(machine, scheduler, ServiceStats(flow_rates), config)
+            results[policy + " (pumps)"] = stats.summary()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ansaugen und Spülen planen und an einem Bestellverlauf prüfen")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Verzeichnis mit recipes.json und ingredients.json")
+    parser.add_argument("--trace", help=f"Aufgezeichneter Bestellverlauf (z.B. data/{TRACE_FILE})")
+    parser.add_argument("--rate", type=float, default=120.0, help="Bestellungen pro Stunde ohne --trace")
+    parser.add_argument("--hours", type=float, default=2.0, help="Dauer in Stunden ohne --trace")
+    parser.add_argument("--prime", type=float, default=4.0, help="Sekunden Ansaugen nach Standzeit")
+    parser.add_argument("--prime-after", type=float, default=600.0, help="Standzeit in Sekunden bis zum Ansaugen")
+    parser.add_argument("--prime-threshold", type=float, default=0.5,
+                        help="Mindestwahrscheinlichkeit für vorsorgliches Ansaugen")
+    parser.add_argument("--flush-slot", type=int, default=10, help="Slot mit Spülwasser")
+    parser.add_argument("--flush-interval", type=float, default=1800.0, help="Sekunden zwischen Spülungen")
+    parser.add_argument("--flush-seconds", type=float, default=20.0, help="Dauer einer Spülung")
+    parser.add_argument("--backend", action="store_true", help="Zusätzlich auf dem simulierten Pumpen-Controller prüfen")
+    parser.add_argument("--time-scale", type=float, default=200.0, help="Zeitraffer für --backend")
+    args = parser.parse_args(argv)
+
+    store = load_recipe_store(os.path.join(args.data_dir, "recipes.json"),
+                              os.path.join(args.data_dir, "ingredients.json"))
+    ingredients = load_json(os.path.join(args.data_dir, "ingredients.json"), {})
+    glass_size = load_json(os.path.join(args.data_dir, "glass_size.json"), {"glass_size": 400}).get("glass_size", 400)
+    try:
+        profile = MenuProfile.from_store(store, ingredients)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+    config = SimulationConfig(hours=args.hours, arrival_rates=[(0, args.rate)], glass_size=glass_size,
+                              prime_seconds=args.prime, prime_after=args.prime_after)
+    trace = load_trace(args.trace, profile, glass_size) if args.trace else synthetic_trace(profile, config)
+    if not trace:
+        print("Keine Bestellungen im Verlauf", file=sys.stderr)
+        return 1
+
+    results = compare(trace, profile, config, args.backend, args.time_scale, flush_slot=args.flush_slot,
+                      flush_interval=args.flush_interval, flush_seconds=args.flush_seconds,
+                      prime_threshold=args.prime_threshold)
+    print(f"{len(trace)} Bestellungen über {trace[-1][0] / 3600:.1f} Stunden")
+    for policy, summary in results.items():
+        print(f"{policy}\n"
+              f"  Wartezeit p50 {summary['wait_p50_s']:6.1f}s, p95 {summary['wait_p95_s']:6.1f}s, "
+              f"{summary['delayed_orders']} Drinks durch Wartung verzögert\n"
+              f"  Im kritischen Pfad: Ansaugen {summary['critical_prime_s']:.0f}s, Spülen {summary['critical_flush_s']:.0f}s\n"
+              f"  {summary['primes']} Ansaugvorgänge ({summary['prime_ml']:.0f} ml), {summary['flushes']} Spülungen, "
+              f"{summary['preempted']} abgebrochen")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""Low-memory profile for Pi Zero-class kiosks
+
+With hundreds of recipes, most of the Tk app's memory goes to thumbnails
+(Tk keeps four bytes per pixel for every photo image) and to the widget
+trees of the admin sections. Setting MIXMASTERX_MEMORY_MB to a budget, e.g.
+100, turns on the low-memory profile:
+
+- the thumbnail cache holds only as many images as fit in a share of the
+  budget, and the cocktail grid shows them a page at a time, so only the
+  thumbnails of one page are alive;
+- admin sections are destroyed shortly after they are hidden;
+- the pages of the startup snapshot and thumbnail pack that a grid page
+  read are given back once it is drawn, as Tk holds its own copies;
+- the resident set is checked every few seconds; when it goes above the
+  budget the thumbnail cache is dropped. Freed memory is not always given
+  back to the system, so it is dropped again only after the resident set
+  was below the budget in between or grew by another tenth of it.
+
+Images are always decoded at the size they are shown at (JPEG draft mode),
+with or without the profile. The peak RSS is exported as a metric and
+written to data/latency_summary.json.
+"""
+import os
+import resource
+import sys
+
+MEMORY_ENV = "MIXMASTERX_MEMORY_MB"
+# Tk keeps an RGBA copy of every photo image
+PHOTO_BYTES_PER_PIXEL = 4
+# Share of the budget the thumbnail cache may use
+THUMBNAIL_SHARE = 0.2
+# Without a budget
+DEFAULT_THUMBNAIL_ENTRIES = 256
+ADMIN_IDLE_MS = 5 * 60 * 1000
+# With a budget
+GRID_PAGE_SIZE = 24
+LOW_MEMORY_ADMIN_IDLE_MS = 10 * 1000
+CHECK_INTERVAL_MS = 5 * 1000
+# Growth above the budget, as a share of it, after which caches are trimmed again
+TRIM_STEP = 0.1
+
+
+def peak_rss_bytes():
+    """Return the highest resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss_bytes():
+    """Return the current resident set size, or the peak where /proc is missing"""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+
+
+class MemoryProfile:
+    """Cache sizes and timeouts of the Tk app for a memory budget
+
+    `budget_mb` None is the normal profile: a large thumbnail cache, the
+    whole grid at once and admin sections kept for five minutes.
+    """
+
+    __slots__ = ("budget_mb", "thumbnail_entries", "page_size", "admin_idle_ms", "check_ms", "trimmed_rss")
+
+    def __init__(self, budget_mb=None, thumbnail_size=(200, 266)):
+        self.budget_mb = budget_mb
+        self.trimmed_rss = None      # resident set at the last trim while above the budget
+        if budget_mb is None:
+            self.thumbnail_entries = DEFAULT_THUMBNAIL_ENTRIES
+            self.page_size = None
+            self.admin_idle_ms = ADMIN_IDLE_MS
+            self.check_ms = None
+            return
+        photo_bytes = thumbnail_size[0] * thumbnail_size[1] * PHOTO_BYTES_PER_PIXEL
+        self.thumbnail_entries = max(1, int(budget_mb * 1024 * 1024 * THUMBNAIL_SHARE) // photo_bytes)
+        # A page never needs more thumbnails than the cache holds
+        self.page_size = min(GRID_PAGE_SIZE, self.thumbnail_entries)
+        self.admin_idle_ms = LOW_MEMORY_ADMIN_IDLE_MS
+        self.check_ms = CHECK_INTERVAL_MS
+
+    @classmethod
+    def from_env(cls, thumbnail_size=(200, 266)):
+        budget = os.environ.get(MEMORY_ENV)
+        return cls(float(budget) if budget else None, thumbnail_size)
+
+    @property
+    def low(self):
+        return self.budget_mb is not None
+
+    def trim_due(self):
+        """Return True if caches should be dropped now to get back under the budget"""
+        if not self.low:
+            return False
+        rss = current_rss_bytes()
+        budget = self.budget_mb * 1024 * 1024
+        if rss <= budget:
+            self.trimmed_rss = None
+            return False
+        if self.trimmed_rss is not None and rss < self.trimmed_rss + budget * TRIM_STEP:
+            return False
+        self.trimmed_rss = rss
+        return True
+
+    def __repr__(self):
+        return (f"MemoryProfile(budget_mb={self.budget_mb}, thumbnails={self.thumbnail_entries}, "
+                f"page_size={self.page_size})")
@@ -0,0 +1,416 @@
+"""Counters, gauges and histograms with a Prometheus endpoint and a rolling file
+
+Recording never takes a lock: every thread writes into its own shard (a
+plain dict only that thread touches) and the shards are merged when the
+metrics are read. A scrape copies each shard in one step, which CPython does
+atomically, so readers never block the dispensing path. When a thread
+records for the first time, the shards of threads that have ended are
+folded into one, so servers with a thread per session (Streamlit) keep one
+shard per live thread.
+
+    from metrics import ORDERS, start_exporters
+    start_exporters(data_dir, name="tk", port=9464)
+    ORDERS.inc(cocktail="Gin Tonic")
+
+`curl localhost:9464/metrics` returns the Prometheus text format, and
+`metrics_<name>.jsonl` in the data dir gets a snapshot every 15 seconds.
+"""
+import bisect
+import json
+import math
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from memory_profile import current_rss_bytes, peak_rss_bytes
+
+
+def _label_key(label_names, labels):
+    if len(labels) != len(label_names) or any(name not in labels for name in label_names):
+        raise ValueError(f"Erwartete Labels {label_names}, erhalten {tuple(labels)}")
+    return tuple(str(labels[name]) for name in label_names)
+
+
+def _format_labels(label_names, key, extra=()):
+    pairs = list(zip(label_names, key)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Sharded:
+    """Base for metrics that keep one value dict per recording thread"""
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._local = threading.local()
+        self._shards = []            # [(weakref to the thread, shard), ...]
+        self._ended = {}             # merged shards of threads that have ended
+        # Only taken for a thread's first value and by readers, never while recording
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                shards = []
+                for thread, other in self._shards:
+                    thread = thread()
+                    if thread is None or not thread.is_alive():
+                        self._merge(self._ended, other)
+                    else:
+                        shards.append((weakref.ref(thread), other))
+                shards.append((weakref.ref(threading.current_thread()), shard))
+                self._shards = shards
+            return shard
+
+    def _merge(self, totals, shard):
+        raise NotImplementedError
+
+    def values(self):
+        """Return {label key: value} merged over all threads"""
+        totals = {}
+        with self._lock:
+            self._merge(totals, self._ended)
+            for _, shard in self._shards:
+                self._merge(totals, shard.copy())
+        return totals
+
+    def _key(self, labels):
+        return _label_key(self.label_names, labels) if labels or self.label_names else ()
+
+
+class Counter(_Sharded):
+    """A value that only goes up"""
+
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _merge(self, totals, shard):
+        for key, value in shard.items():
+            totals[key] = totals.get(key, 0) + value
+
+    def value(self, **labels):
+        return self.values().get(self._key(labels), 0)
+
+    def samples(self):
+        for key, value in sorted(self.values().items()):
+            yield self.name, _format_labels(self.label_names, key), value
+
+
+class Histogram(_Sharded):
+    """Counts observations into cumulative buckets, plus their sum and count"""
+
+    type = "histogram"
+
+    def __init__(self, name, help, label_names=(), buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)):
+        super().__init__(name, help, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        counts = shard.get(key)
+        if counts is None:
+            # One slot per bucket, one for +Inf, then sum and count
+            counts = shard[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def _merge(self, totals, shard):
+        # Values are [bucket counts..., sum, count]
+        for key, counts in shard.items():
+            counts = list(counts)
+            if key in totals:
+                totals[key] = [a + b for a, b in zip(totals[key], counts)]
+            else:
+                totals[key] = counts
+
+    def samples(self):
+        bounds = self.buckets + (math.inf,)
+        for key, counts in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                yield (self.name + "_bucket",
+                       _format_labels(self.label_names, key, [("le", _format_value(bound))]), cumulative)
+            yield self.name + "_sum", _format_labels(self.label_names, key), counts[-2]
+            yield self.name + "_count", _format_labels(self.label_names, key), counts[-1]
+
+
+class Gauge:
+    """A value that is set directly or computed by a function at read time"""
+
+    type = "gauge"
+
+    def __init__(self, name, help, label_names=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._function = None
+
+    def set(self, value, **labels):
+        # A single dict assignment is atomic, the last writer wins
+        self._values[_label_key(self.label_names, labels) if self.label_names else ()] = value
+
+    def set_function(self, function):
+        """Compute the value on every read; `function` returns a number or {label key: number}"""
+        self._function = function
+
+    def values(self):
+        if self._function is None:
+            return self._values.copy()
+        result = self._function()
+        return result if isinstance(result, dict) else {(): result}
+
+    def samples(self):
+        for key, value in sorted(self.values().items()):
+            yield self.name, _format_labels(self.label_names, key), value
+
+
+class MetricsRegistry:
+    """Holds all metrics of a process and renders them"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, *args, **kwargs):
+        # Registration is rare, so it may take a lock; recording never does
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"Metrik {name} ist bereits als {metric.type} registriert")
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._get_or_create(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._get_or_create(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=None):
+        if buckets is None:
+            return self._get_or_create(Histogram, name, help, labels)
+        return self._get_or_create(Histogram, name, help, labels, buckets)
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Return {sample name with labels: value} for the time-series file"""
+        return {f"{name}{labels}": value
+                for metric in list(self._metrics.values())
+                for name, labels, value in metric.samples()}
+
+
+REGISTRY = MetricsRegistry()
+
+# Application metrics -----------------------------------------------------------
+
+ORDERS = REGISTRY.counter("mixmaster_orders_total", "Bestellte Drinks", ("cocktail",))
+DRINKS_POURED = REGISTRY.counter("mixmaster_drinks_poured_total", "Fertig ausgeschenkte Drinks")
+ORDER_LATENCY = REGISTRY.histogram("mixmaster_order_to_pour_seconds",
+                                   "Zeit von der Bestellung bis der Drink fertig ist",
+                                   buckets=(5, 10, 15, 20, 30, 45, 60, 90, 120, 300))
+QUEUE_DEPTH = REGISTRY.gauge("mixmaster_order_queue_depth", "Wartende Bestellungen")
+PUMP_SECONDS = REGISTRY.counter("mixmaster_pump_seconds_total", "Laufzeit der Pumpen", ("slot",))
+PUMP_DUTY_CYCLE = REGISTRY.gauge("mixmaster_pump_duty_cycle",
+                                 "Anteil der Zeit, in der die Pumpe lief (seit Start)", ("slot",))
+DRINKS_PER_HOUR = REGISTRY.gauge("mixmaster_drinks_per_hour", "Ausgeschenkte Drinks der letzten Stunde")
+IMAGE_CACHE = REGISTRY.counter("mixmaster_image_cache_requests_total", "Zugriffe auf den Bild-Cache", ("result",))
+IMAGE_CACHE_HIT_RATIO = REGISTRY.gauge("mixmaster_image_cache_hit_ratio", "Trefferquote des Bild-Cache")
+RESIDENT_MEMORY = REGISTRY.gauge("mixmaster_resident_memory_bytes", "Belegter Arbeitsspeicher")
+PEAK_RESIDENT_MEMORY = REGISTRY.gauge("mixmaster_peak_resident_memory_bytes",
+                                      "Höchster belegter Arbeitsspeicher seit Start")
+JOURNAL_ERRORS = REGISTRY.counter("mixmaster_journal_errors_total",
+                                  "Fehlgeschlagene Schreibvorgänge im Ausschank-Journal")
+
+_started = time.monotonic()
+# Completion times of recent drinks; deque.append is atomic
+_recent_pours = deque(maxlen=10_000)
+
+
+def order_placed(cocktail):
+    """Record a new order and return the token to pass to `order_poured`"""
+    ORDERS.inc(cocktail=cocktail)
+    return time.monotonic()
+
+
+def order_poured(token, pump_seconds=None):
+    """Record a finished drink; `pump_seconds` is {slot: seconds the pump ran}"""
+    now = time.monotonic()
+    ORDER_LATENCY.observe(now - token)
+    DRINKS_POURED.inc()
+    _recent_pours.append(now)
+    for slot, seconds in (pump_seconds or {}).items():
+        PUMP_SECONDS.inc(seconds, slot=slot)
+
+
+def image_cache_access(hit):
+    IMAGE_CACHE.inc(result="hit" if hit else "miss")
+
+
+def _drinks_per_hour():
+    cutoff = time.monotonic() - 3600
+    return sum(1 for t in list(_recent_pours) if t >= cutoff)
+
+
+def _duty_cycle():
+    uptime = max(time.monotonic() - _started, 1e-9)
+    return {key: seconds / uptime for key, seconds in PUMP_SECONDS.values().items()}
+
+
+def _hit_ratio():
+    counts = IMAGE_CACHE.values()
+    hits, misses = counts.get(("hit",), 0), counts.get(("miss",), 0)
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+QUEUE_DEPTH.set(0)
+DRINKS_PER_HOUR.set_function(_drinks_per_hour)
+PUMP_DUTY_CYCLE.set_function(_duty_cycle)
+IMAGE_CACHE_HIT_RATIO.set_function(_hit_ratio)
+RESIDENT_MEMORY.set_function(current_rss_bytes)
+PEAK_RESIDENT_MEMORY.set_function(peak_rss_bytes)
+
+
+# Exporters ---------------------------------------------------------------------
+
+class MetricsServer:
+    """Serves /metrics in Prometheus text format from a daemon thread"""
+
+    def __init__(self, registry=REGISTRY, host="127.0.0.1", port=9464):
+        registry_ = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry_.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TimeSeriesWriter:
+    """Appends a snapshot of all metrics as a JSON line every `interval` seconds
+
+    The file is rotated once it grows beyond `max_bytes`, keeping `backups`
+    older files (metrics.jsonl.1, .2, ...).
+    """
+
+    def __init__(self, path, registry=REGISTRY, interval=15.0, max_bytes=5 * 1024 * 1024, backups=3):
+        self.path = path
+        self.registry = registry
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.write()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        line = json.dumps({"time": time.time(), "metrics": self.registry.snapshot()}) + "\n"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                self._rotate()
+            with open(self.path, 'a') as f:
+                f.write(line)
+        except OSError:
+            pass
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+_exporters = {}
+_exporters_lock = threading.Lock()
+
+
+def start_exporters(data_dir, name, port=9464, interval=15.0):
+    """Start the HTTP endpoint and the time-series file once per process
+
+    The port can be overridden with MIXMASTERX_METRICS_PORT (0 disables the
+    endpoint). If it is already taken, only the file is written. Returns
+    (server or None, writer).
+    """
+    with _exporters_lock:
+        if name in _exporters:
+            return _exporters[name]
+        port = int(os.environ.get("MIXMASTERX_METRICS_PORT", port))
+        server = None
+        if port:
+            try:
+                server = MetricsServer(port=port).start()
+            except OSError:
+                server = None
+        writer = TimeSeriesWriter(os.path.join(data_dir, f"metrics_{name}.jsonl"), interval=interval).start()
+        _exporters[name] = (server, writer)
+        return server, writer
@@ -0,0 +1,273 @@
+"""Live progress and ETA of the drinks in the pump queue
+
+OrderProgress follows every order of a PumpMachine: queued, pouring (with
+the ml already in the glass per slot), and done or failed. Each status
+carries an ETA in seconds, computed from the order's place in the queue and
+the calibrated flow rates. While a drink is pouring, the measured rates of
+the flow sensors are used when there are any. The status is published to
+subscribers whenever an order changes and every `interval` seconds while a
+drink pours.
+
+Subscribers are called on the dispensing threads. A Tk frontend hands the
+statuses to CoalescedUpdates, which keeps only the newest one and redraws at
+most once per frame, however fast the updates come in:
+
+    progress = OrderProgress(config, flow_rates)
+    updates = CoalescedUpdates(root, show_progress, frame_ms=50)
+    progress.subscribe(updates.push)
+"""
+import itertools
+import threading
+import time
+
+from pump_controller import DEFAULT_FLOW_RATE
+
+QUEUED = "queued"
+POURING = "pouring"
+DONE = "done"
+FAILED = "failed"
+
+
+class OrderStatus:
+    """Progress of one order at one point in time
+
+    `targets` and `poured` are {slot: ml}; `eta` is the number of seconds
+    until the drink can be taken, `position` the number of drinks ahead.
+    """
+
+    __slots__ = ("id", "cocktail", "targets", "state", "poured", "eta", "position")
+
+    def __init__(self, id, cocktail, targets, state=QUEUED, poured=None, eta=0.0, position=0):
+        self.id = id
+        self.cocktail = cocktail
+        self.targets = targets
+        self.state = state
+        self.poured = poured or dict.fromkeys(targets, 0.0)
+        self.eta = eta
+        self.position = position
+
+    @property
+    def fraction(self):
+        total = sum(self.targets.values())
+        return min(1.0, sum(self.poured.values()) / total) if total else 1.0
+
+    def copy(self):
+        return OrderStatus(self.id, self.cocktail, self.targets, self.state, dict(self.poured), self.eta,
+                           self.position)
+
+    def __repr__(self):
+        return f"OrderStatus({self.id!r}, {self.cocktail!r}, {self.state}, {self.fraction:.0%}, eta={self.eta:.1f})"
+
+
+class OrderProgress:
+    """Tracks the orders of a PumpMachine and publishes their status
+
+    `config` is the SimulationConfig with the handover and cleaning times,
+    `flow_rates` the calibrated {slot: ml/s}. With a FlowMeter as `meter`,
+    poured volumes are measured; otherwise they are estimated from the flow
+    rates and the time since the pour started.
+
+    Bound to a MaintenanceScheduler (MaintenanceService does that), the
+    ETAs include priming the lines that went cold.
+    """
+
+    def __init__(self, config, flow_rates=None, meter=None, interval=0.1, time_scale=1.0):
+        self.config = config
+        self.flow_rates = flow_rates or {}
+        self.meter = meter
+        self.interval = interval
+        self.time_scale = time_scale
+        self.published = 0
+        self.scheduler = None
+        self.clock = None
+        self._ids = itertools.count(1)
+        self._orders = {}            # id -> OrderStatus, in queue order
+        self._pour_started = {}      # id -> monotonic time the pumps started
+        self._pour_ended = {}        # id -> monotonic time the pour ended, while the nozzle is rinsed
+        self._subscribers = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="order-progress", daemon=True)
+        self._thread.start()
+
+    def bind(self, scheduler, clock):
+        """Take line priming into account; `clock` returns the scheduler's time"""
+        with self._cond:
+            self.scheduler = scheduler
+            self.clock = clock
+
+    def next_id(self):
+        return next(self._ids)
+
+    def subscribe(self, callback):
+        """Call `callback` with [OrderStatus, ...] in queue order on every change"""
+        with self._cond:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._cond:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def snapshot(self):
+        """Return copies of the statuses of all orders, in queue order"""
+        with self._cond:
+            self._update()
+            return [status.copy() for status in self._orders.values()]
+
+    # Events from the PumpMachine ---------------------------------------------
+
+    def queued(self, order_id, cocktail, slot_ml):
+        targets = {int(slot): float(ml) for slot, ml in slot_ml.items() if ml > 0}
+        with self._cond:
+            self._orders[order_id] = OrderStatus(order_id, cocktail, targets)
+        self._publish()
+
+    def pouring(self, order_id):
+        with self._cond:
+            status = self._orders.get(order_id)
+            if status is None:
+                return
+            status.state = POURING
+            self._pour_started[order_id] = time.monotonic()
+            self._cond.notify()
+        self._publish()
+
+    def poured(self, order_id, ok=True):
+        with self._cond:
+            status = self._orders.get(order_id)
+            if status is None:
+                return
+            if ok:
+                status.poured = dict(status.targets)
+            status.state = POURING if ok else FAILED
+            self._pour_started.pop(order_id, None)
+            self._pour_ended[order_id] = time.monotonic()
+        self._publish()
+
+    def finished(self, order_id):
+        """The glass can be taken; the order is published as done one last time"""
+        with self._cond:
+            status = self._orders.get(order_id)
+            if status is None:
+                return
+            if status.state != FAILED:
+                status.state = DONE
+        self._publish()
+        with self._cond:
+            self._orders.pop(order_id, None)
+            self._pour_ended.pop(order_id, None)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+
+    # Estimates -----------------------------------------------------------------
+
+    def _rate(self, slot):
+        if self.meter is not None and self.meter.rates[slot] > 0:
+            return float(self.meter.rates[slot])
+        return self.flow_rates.get(slot, DEFAULT_FLOW_RATE)
+
+    def _poured_so_far(self, status, started):
+        if self.meter is not None:
+            # The meter counts from zero for every pour
+            volumes = self.meter.volumes
+            return {slot: min(target, float(volumes[slot])) for slot, target in status.targets.items()}
+        elapsed = (time.monotonic() - started) * self.time_scale
+        return {slot: min(target, elapsed * self.flow_rates.get(slot, DEFAULT_FLOW_RATE))
+                for slot, target in status.targets.items()}
+
+    def _update(self):
+        # Caller holds the lock. Orders are served first come, first served,
+        # so every ETA is the time the orders ahead still need plus its own.
+        config = self.config
+        ahead = 0.0
+        now = self.clock() if self.scheduler is not None else None
+        warm = set()                 # lines the drinks ahead will have primed
+        for position, status in enumerate(self._orders.values()):
+            status.position = position
+            if status.state == QUEUED:
+                pour = max((ml / self.flow_rates.get(slot, DEFAULT_FLOW_RATE) for slot, ml in status.targets.items()),
+                           default=0.0)
+                ahead += config.handover_seconds + pour + config.cleaning_seconds
+                if now is not None:
+                    if any(slot not in warm and not self.scheduler.is_warm(slot, now + ahead)
+                           for slot in status.targets):
+                        ahead += config.prime_seconds
+                    warm.update(status.targets)
+            elif status.state == POURING:
+                started = self._pour_started.get(status.id)
+                ended = self._pour_ended.get(status.id)
+                if ended is not None:
+                    ahead += max(0.0, config.cleaning_seconds - (time.monotonic() - ended) * self.time_scale)
+                else:
+                    if started is not None:
+                        status.poured = self._poured_so_far(status, started)
+                    pour_left = max((max(0.0, target - status.poured[slot]) / self._rate(slot)
+                                     for slot, target in status.targets.items()), default=0.0)
+                    ahead += pour_left + config.cleaning_seconds
+            status.eta = ahead if status.state in (QUEUED, POURING) else 0.0
+
+    def _publish(self):
+        with self._cond:
+            self._update()
+            statuses = [status.copy() for status in self._orders.values()]
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for callback in subscribers:
+            callback(statuses)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pour_started or self._closed)
+                if self._closed:
+                    return
+            time.sleep(self.interval)
+            self._publish()
+
+
+class CoalescedUpdates:
+    """Hands values from any thread to a Tk callback, at most once per frame
+
+    `push` only stores the value and, if no frame is scheduled yet, asks Tk
+    for one with `after`. The frame passes the newest value to `callback`;
+    everything pushed in between is dropped. Frames are at least `frame_ms`
+    apart.
+    """
+
+    def __init__(self, root, callback, frame_ms=50):
+        self.root = root
+        self.callback = callback
+        self.frame_ms = frame_ms
+        self.pushed = 0
+        self.frames = 0
+        self._lock = threading.Lock()
+        self._value = None
+        self._scheduled = False
+        self._last_frame = 0.0
+
+    def push(self, value):
+        with self._lock:
+            self._value = value
+            self.pushed += 1
+            if self._scheduled:
+                return
+            self._scheduled = True
+            wait = self._last_frame + self.frame_ms / 1000 - time.monotonic()
+        try:
+            self.root.after(max(0, int(wait * 1000)), self._frame)
+        except RuntimeError:
+            # The main loop is gone
+            pass
+
+    def _frame(self):
+        with self._lock:
+            value, self._value = self._value, None
+            self._scheduled = False
+            self._last_frame = time.monotonic()
+            self.frames += 1
+        self.callback(value)
@@ -0,0 +1,146 @@
+import math
+
+import numpy as np
+
+# Number of pump slots on the machine
+NUM_SLOTS = 10
+# Most a slot pours in one go: one bottle
+BOTTLE_VOLUME = 700.0
+DEFAULT_PITCHER_SIZE = 1500
+
+
+class PourMatrix:
+    """Recipe x ingredient percentage matrix for vectorized pour calculations
+
+    Rows follow the display order of the RecipeStore, columns are ingredient
+    IDs from its registry. Slot columns are derived from the {ingredient: slot}
+    mapping, where unassigned ingredients use the slot "-".
+    """
+
+    def __init__(self, store, ingredients):
+        self.names = store.names()
+        self.ingredient_names = store.registry.names()
+        self.row_of = {name: row for row, name in enumerate(self.names)}
+
+        self.percentages = np.zeros((len(self.names), len(self.ingredient_names)))
+        # Column order of each recipe as entered, for display
+        self.columns = []
+        for row, recipe in enumerate(store):
+            cols = np.frombuffer(recipe.ingredient_ids, dtype=np.uint16).astype(np.intp)
+            self.percentages[row, cols] = np.frombuffer(recipe.percentages, dtype=np.float64)
+            self.columns.append(cols)
+
+        self._assign_slots(ingredients)
+
+        # Recipe x slot percentages
+        slotted = self.slot_of >= 0
+        self.slot_percentages = np.zeros((len(self.names), NUM_SLOTS))
+        np.add.at(self.slot_percentages.T, self.slot_of[slotted], self.percentages[:, slotted].T)
+
+    @classmethod
+    def from_arrays(cls, store, ingredients, percentages, slot_percentages):
+        """Create a matrix from precomputed arrays, e.g. memory-mapped from a snapshot
+
+        The arrays must have been computed for the same store and slots.
+        """
+        matrix = cls.__new__(cls)
+        matrix.names = store.names()
+        matrix.ingredient_names = store.registry.names()
+        matrix.row_of = {name: row for row, name in enumerate(matrix.names)}
+        matrix.percentages = percentages
+        matrix.columns = [np.frombuffer(recipe.ingredient_ids, dtype=np.uint16).astype(np.intp) for recipe in store]
+        matrix._assign_slots(ingredients)
+        matrix.slot_percentages = slot_percentages
+        return matrix
+
+    def _assign_slots(self, ingredients):
+        # Slot index (0-based) of every ingredient column, -1 if unassigned
+        self.slot_of = np.full(len(self.ingredient_names), -1, dtype=np.intp)
+        for col, name in enumerate(self.ingredient_names):
+            slot = ingredients.get(name, "-")
+            if slot != "-" and 1 <= int(slot) <= NUM_SLOTS:
+                self.slot_of[col] = int(slot) - 1
+        # Recipes that use an ingredient without a slot
+        self.unslotted = (self.percentages[:, self.slot_of < 0] > 0).any(axis=1)
+
+    def ml_amounts(self, glass_sizes):
+        """Return ml per recipe and ingredient
+
+        A scalar glass size gives a (recipes, ingredients) array, a sequence of
+        glass sizes a (glass sizes, recipes, ingredients) array.
+        """
+        return self.percentages * (np.asarray(glass_sizes, dtype=np.float64)[..., None, None] / 100)
+
+    def slot_amounts(self, glass_sizes):
+        """Return ml per recipe and slot, shaped like `ml_amounts`"""
+        return self.slot_percentages * (np.asarray(glass_sizes, dtype=np.float64)[..., None, None] / 100)
+
+    def slot_demand(self, glass_sizes, counts=None):
+        """Return the total ml drawn from each slot
+
+        `counts` weights the recipes (e.g. expected orders per drink); by
+        default every recipe on the menu is poured once.
+        """
+        weights = np.ones(len(self.names)) if counts is None else np.asarray(counts, dtype=np.float64)
+        return weights @ self.slot_amounts(glass_sizes)
+
+    def servings_available(self, glass_sizes, slot_volumes):
+        """Return how many glasses of each recipe the slot volumes (ml) allow
+
+        Recipes using an ingredient without a slot can never be made.
+        """
+        needed = self.slot_amounts(glass_sizes)
+        volumes = np.asarray(slot_volumes, dtype=np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            servings = np.where(needed > 0, volumes / needed, np.inf).min(axis=-1)
+        servings = np.floor(np.where(np.isinf(servings), 0, servings))
+        return np.where(self.unslotted, 0, servings).astype(np.int64)
+
+    def available(self, slot_volumes=None, glass_size=None):
+        """Return a boolean mask of recipes that can be made right now
+
+        Without slot volumes this only checks that every ingredient is loaded
+        in a slot.
+        """
+        if slot_volumes is None:
+            return ~self.unslotted & (self.percentages.sum(axis=1) > 0)
+        return self.servings_available(glass_size, slot_volumes) > 0
+
+    def recipe_pours(self, name, glass_size):
+        """Return [(ingredient, percentage, ml), ...] for one recipe in recipe order"""
+        row = self.row_of[name]
+        cols = self.columns[row]
+        percentages = self.percentages[row, cols]
+        amounts = percentages * (glass_size / 100)
+        return [(self.ingredient_names[col], pct, ml)
+                for col, pct, ml in zip(cols.tolist(), percentages.tolist(), amounts.tolist())]
+
+    def batch_pours(self, name, servings, glass_size, vessel_capacity=None, slot_max=BOTTLE_VOLUME):
+        """Plan `servings` glasses of one recipe as continuous pours into a larger vessel
+
+        Returns [{slot: ml}, ...] with one entry per vessel fill, all the same
+        size. A fill holds at most `vessel_capacity` ml and draws at most
+        `slot_max` ml from each slot (a scalar or one value per slot).
+        """
+        row = self.row_of[name]
+        if self.unslotted[row]:
+            raise ValueError(f"{name} enthält Zutaten ohne Slot")
+        per_slot = self.slot_percentages[row] * (servings * glass_size / 100)
+        used = np.flatnonzero(per_slot > 0)
+        if not len(used):
+            raise ValueError(f"{name} hat keine Zutaten")
+        fills = 1
+        if vessel_capacity:
+            fills = max(fills, math.ceil(per_slot.sum() / vessel_capacity - 1e-9))
+        if slot_max is not None:
+            limits = np.broadcast_to(np.asarray(slot_max, dtype=np.float64), per_slot.shape)[used]
+            fills = max(fills, math.ceil((per_slot[used] / limits).max() - 1e-9))
+        fill = per_slot / fills
+        return [{int(slot) + 1: float(fill[slot]) for slot in used} for _ in range(fills)]
+
+
+def preview_pours(ingredients, glass_size):
+    """Return [(ingredient, percentage, ml), ...] for unsaved editor values"""
+    percentages = np.fromiter(ingredients.values(), dtype=np.float64, count=len(ingredients))
+    amounts = percentages * (glass_size / 100)
+    return list(zip(ingredients, percentages.tolist(), amounts.tolist()))
@@ -0,0 +1,600 @@
+"""Driver for the pump microcontroller on the serial port
+
+Frames on the wire:
+
+    0xA5 | len | seq (2 bytes) | cmd | payload (len bytes) | CRC-16/CCITT (2 bytes)
+
+The CRC covers everything between the sync byte and the CRC. The controller
+answers every command with `cmd | 0x80` (ACK) or NAK, echoing the sequence
+number, so any number of commands can be in flight at once; replies are
+matched by sequence number on a reader thread and resolve a Future. Commands
+without a reply in time are resent with the same sequence number (the
+controller replays its answer for duplicates) and fail after `retries`.
+
+One START frame carries several (slot, duration) pairs, so a whole drink is
+started with a single write. When a timed pour finishes the controller sends
+an unsolicited SLOT_DONE event with sequence number 0.
+
+`FakeController` emulates the microcontroller on a pty so everything can be
+run and benchmarked without hardware:
+
+    with FakeController() as fake, PumpController(fake.port) as pumps:
+        pumps.dispense({1: 40.0, 4: 60.0}).result()
+"""
+import binascii
+import os
+import select
+import struct
+import termios
+import threading
+import time
+import tty
+from concurrent.futures import Future
+
+from pour_matrix import NUM_SLOTS
+from recipe_model import load_json
+
+SYNC = 0xA5
+HEADER = struct.Struct(">BHB")   # len, seq, cmd
+MAX_PAYLOAD = 255
+
+CMD_PING = 0x01
+CMD_START = 0x02
+CMD_STOP = 0x03
+CMD_STATUS = 0x04
+EVT_SLOT_DONE = 0x10
+REPLY_FLAG = 0x80
+NAK = 0x7F
+
+NAK_BAD_SLOT = 1
+NAK_BAD_COMMAND = 2
+NAK_BUSY = 3
+
+START_ENTRY = struct.Struct(">BI")   # slot, duration in ms
+# Pump flow in ml per second, used when a slot has no calibrated rate
+DEFAULT_FLOW_RATE = 2.0
+# Calibrated rates per slot, e.g. {"1": 2.4, "2": 1.8}
+FLOW_RATES_FILE = "flow_rates.json"
+
+
+class PumpControllerError(Exception):
+    pass
+
+
+def load_flow_rates(data_dir):
+    """Return the calibrated {slot: ml/s} from data/flow_rates.json; invalid entries are left out"""
+    entries = load_json(os.path.join(data_dir, FLOW_RATES_FILE), {})
+    rates = {}
+    if not isinstance(entries, dict):
+        return rates
+    for slot, rate in entries.items():
+        try:
+            slot, rate = int(slot), float(rate)
+        except (TypeError, ValueError):
+            continue
+        if 1 <= slot <= NUM_SLOTS and rate > 0:
+            rates[slot] = rate
+    return rates
+
+
+class PumpTimeout(PumpControllerError):
+    pass
+
+
+class PumpNak(PumpControllerError):
+    def __init__(self, code):
+        super().__init__(f"Befehl vom Controller abgelehnt (Code {code})")
+        self.code = code
+
+
+def encode_frame(seq, cmd, payload=b""):
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"Nutzdaten zu lang: {len(payload)} Bytes")
+    body = HEADER.pack(len(payload), seq, cmd) + payload
+    return bytes([SYNC]) + body + binascii.crc_hqx(body, 0xFFFF).to_bytes(2, "big")
+
+
+class FrameParser:
+    """Splits a byte stream into (seq, cmd, payload) frames
+
+    Bytes before a sync byte and frames with a bad CRC are skipped, so the
+    parser resynchronizes after line noise.
+    """
+
+    def __init__(self):
+        self._buf = bytearray()
+        self.errors = 0
+
+    def feed(self, data):
+        self._buf += data
+        frames = []
+        buf = self._buf
+        while buf:
+            start = buf.find(SYNC)
+            if start < 0:
+                buf.clear()
+                break
+            if start:
+                del buf[:start]
+            if len(buf) < 1 + HEADER.size:
+                break
+            length, seq, cmd = HEADER.unpack_from(buf, 1)
+            end = 1 + HEADER.size + length
+            if len(buf) < end + 2:
+                break
+            if binascii.crc_hqx(bytes(buf[1:end]), 0xFFFF) != int.from_bytes(buf[end:end + 2], "big"):
+                self.errors += 1
+                del buf[0]
+                continue
+            frames.append((seq, cmd, bytes(buf[1 + HEADER.size:end])))
+            del buf[:end + 2]
+        return frames
+
+
+def open_serial(port, baudrate=115200):
+    """Open a serial device (or pty) in raw mode and return the fd"""
+    fd = os.open(port, os.O_RDWR | os.O_NOCTTY)
+    try:
+        tty.setraw(fd)
+        speed = getattr(termios, f"B{baudrate}", None)
+        if speed is not None:
+            attrs = termios.tcgetattr(fd)
+            attrs[4] = attrs[5] = speed
+            termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    except termios.error:
+        os.close(fd)
+        raise
+    return fd
+
+
+def write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+class _Pending:
+    __slots__ = ("frame", "future", "deadline", "attempts")
+
+    def __init__(self, frame, future, deadline):
+        self.frame = frame
+        self.future = future
+        self.deadline = deadline
+        self.attempts = 1
+
+
+class PumpController:
+    """Pipelined client for the pump controller
+
+    `timeout` is the time to wait for an ACK before resending, `retries` the
+    number of resends, `max_in_flight` the number of unanswered commands
+    after which `send` blocks. `done_margin` is how long after its planned
+    end a pour may wait for its SLOT_DONE events before the controller is
+    asked for the running slots.
+    """
+
+    def __init__(self, port, baudrate=115200, timeout=0.25, retries=2, max_in_flight=32, done_margin=1.0):
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.retries = retries
+        self.done_margin = done_margin
+        self.on_slot_done = None     # called with the slot number from the reader thread
+        self.fake = None             # FakeController to shut down with this connection
+        self._fd = None
+        self._window = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending = {}
+        self._next_seq = 1
+        self._pours = {}             # slot -> (Future, {slot: seconds}, remaining slots)
+        self._wake_r = self._wake_w = None
+        self._reader = None
+        self._closed = threading.Event()
+
+    def open(self):
+        self._fd = open_serial(self.port, self.baudrate)
+        self._wake_r, self._wake_w = os.pipe()
+        self._closed.clear()
+        self._reader = threading.Thread(target=self._read_loop, name="pump-reader", daemon=True)
+        self._reader.start()
+        return self
+
+    def close(self):
+        if self._fd is None:
+            return
+        self._closed.set()
+        os.write(self._wake_w, b"x")
+        self._reader.join(timeout=1.0)
+        for fd in (self._fd, self._wake_r, self._wake_w):
+            os.close(fd)
+        self._fd = None
+        self._fail_all(PumpControllerError("Verbindung zum Controller geschlossen"))
+        if self.fake is not None:
+            self.fake.close()
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # Sending -----------------------------------------------------------------
+
+    def send(self, cmd, payload=b""):
+        """Send a command without waiting and return a Future for the reply payload"""
+        return self.send_many([(cmd, payload)])[0]
+
+    def send_many(self, commands):
+        """Send several (cmd, payload) commands with a single write"""
+        if self._fd is None:
+            raise PumpControllerError("Controller ist nicht verbunden")
+        futures = []
+        frames = []
+        for cmd, payload in commands:
+            if not self._window.acquire(blocking=False):
+                # Window full: get what we have on the wire before waiting for replies
+                self._write(frames)
+                frames = []
+                self._window.acquire()
+            future = Future()
+            with self._lock:
+                seq = self._allocate_seq()
+                frame = encode_frame(seq, cmd, payload)
+                self._pending[seq] = _Pending(frame, future, time.monotonic() + self.timeout)
+            future.add_done_callback(lambda f: self._window.release())
+            futures.append(future)
+            frames.append(frame)
+        self._write(frames)
+        return futures
+
+    def _write(self, frames):
+        if frames:
+            with self._write_lock:
+                write_all(self._fd, b"".join(frames))
+
+    def _allocate_seq(self):
+        # 0 is reserved for events from the controller
+        while True:
+            seq = self._next_seq
+            self._next_seq = seq % 0xFFFF + 1
+            if seq not in self._pending:
+                return seq
+
+    def ping(self):
+        return self.send(CMD_PING)
+
+    def start(self, durations):
+        """Start several pumps at once; `durations` is {slot: seconds}"""
+        entries = [START_ENTRY.pack(int(slot), max(1, round(seconds * 1000)))
+                   for slot, seconds in durations.items()]
+        per_frame = MAX_PAYLOAD // START_ENTRY.size
+        futures = self.send_many([(CMD_START, b"".join(entries[i:i + per_frame]))
+                                  for i in range(0, len(entries), per_frame)])
+        return futures[0] if len(futures) == 1 else _gather(futures)
+
+    def stop(self, slots=()):
+        """Stop the given slots, or all pumps if none are given
+
+        Stopped slots count as done for `dispense`, so its Future still
+        resolves (with the planned seconds).
+        """
+        stopped = self.send(CMD_STOP, bytes(int(slot) for slot in slots))
+
+        def finish(f):
+            if f.exception() is None:
+                with self._lock:
+                    pouring = [slot for slot in (slots or list(self._pours)) if slot in self._pours]
+                for slot in pouring:
+                    self._slot_done(slot)
+        stopped.add_done_callback(finish)
+        return stopped
+
+    def status(self):
+        """Return a Future for the set of slots that are currently running"""
+        result = Future()
+
+        def decode(f):
+            if f.exception() is not None:
+                result.set_exception(f.exception())
+            else:
+                mask = int.from_bytes(f.result(), "big")
+                result.set_result({slot for slot in range(1, NUM_SLOTS + 1) if mask >> (slot - 1) & 1})
+        self.send(CMD_STATUS).add_done_callback(decode)
+        return result
+
+    def dispense(self, slot_ml, flow_rates=None):
+        """Pour {slot: ml} with all pumps started in one frame
+
+        Returns a Future that resolves to {slot: seconds the pump ran} once
+        the controller reported every slot as done. If that takes longer than
+        planned plus `done_margin`, STATUS decides: slots that stopped count
+        as done (their event was lost), slots still running are stopped and
+        the Future fails with PumpTimeout. Either way the slots are free
+        again.
+        """
+        flow_rates = flow_rates or {}
+        durations = {slot: ml / flow_rates.get(slot, DEFAULT_FLOW_RATE)
+                     for slot, ml in slot_ml.items() if ml > 0}
+        done = Future()
+        if not durations:
+            done.set_result({})
+            return done
+
+        state = [done, {slot: round(seconds, 3) for slot, seconds in durations.items()}, set(durations)]
+        with self._lock:
+            busy = [slot for slot in durations if slot in self._pours]
+            if busy:
+                raise PumpControllerError(f"Slot {busy[0]} läuft bereits")
+            for slot in durations:
+                self._pours[slot] = state
+
+        def started(f):
+            if f.exception() is not None:
+                with self._lock:
+                    for slot in durations:
+                        self._pours.pop(slot, None)
+                if not done.done():
+                    done.set_exception(f.exception())
+                return
+            # Not on the reader thread: checking sends a command and waits for it
+            deadline = threading.Timer(max(durations.values()) + self.done_margin, self._check_pour, (state,))
+            deadline.daemon = True
+            done.add_done_callback(lambda f: deadline.cancel())
+            deadline.start()
+        try:
+            starting = self.start(durations)
+        except (PumpControllerError, OSError):
+            # Not sent, e.g. the serial adapter is gone: the slots must not stay busy
+            with self._lock:
+                for slot in durations:
+                    if self._pours.get(slot) is state:
+                        del self._pours[slot]
+            raise
+        starting.add_done_callback(started)
+        return done
+
+    def _check_pour(self, state):
+        """Settle a pour whose SLOT_DONE events are overdue"""
+        done, _, remaining = state
+        try:
+            running = self.status().result(self.timeout * (self.retries + 2))
+        except (PumpControllerError, TimeoutError):
+            running = None
+        with self._lock:
+            slots = [slot for slot in list(remaining) if self._pours.get(slot) is state]
+            # Without an answer the state of the pumps is unknown; free the slots anyway
+            stuck = slots if running is None else [slot for slot in slots if slot in running]
+            for slot in stuck:
+                del self._pours[slot]
+        for slot in slots:
+            if slot not in stuck:
+                self._slot_done(slot)
+        if not stuck:
+            return
+        if running is not None:
+            self.stop(stuck)
+        if not done.done():
+            done.set_exception(PumpTimeout(f"Slot {stuck[0]} meldet kein Ende"))
+
+    # Receiving ---------------------------------------------------------------
+
+    def _read_loop(self):
+        parser = FrameParser()
+        tick = min(self.timeout / 4, 0.05)
+        while not self._closed.is_set():
+            readable, _, _ = select.select([self._fd, self._wake_r], [], [], tick)
+            if self._fd in readable:
+                try:
+                    data = os.read(self._fd, 4096)
+                except OSError:
+                    data = b""
+                for seq, cmd, payload in parser.feed(data):
+                    self._handle(seq, cmd, payload)
+            self._check_timeouts()
+
+    def _handle(self, seq, cmd, payload):
+        if seq == 0:
+            if cmd == EVT_SLOT_DONE and payload:
+                self._slot_done(payload[0])
+            return
+        with self._lock:
+            pending = self._pending.pop(seq, None)
+        if pending is None:
+            return   # late answer to a command that was already resent or failed
+        if cmd == NAK:
+            pending.future.set_exception(PumpNak(payload[0] if payload else 0))
+        else:
+            pending.future.set_result(payload)
+
+    def _slot_done(self, slot):
+        with self._lock:
+            state = self._pours.pop(slot, None)
+        if state is not None:
+            done, seconds, remaining = state
+            remaining.discard(slot)
+            if not remaining and not done.done():
+                done.set_result(seconds)
+        if self.on_slot_done is not None:
+            self.on_slot_done(slot)
+
+    def _check_timeouts(self):
+        now = time.monotonic()
+        resend = []
+        failed = []
+        with self._lock:
+            for seq, pending in list(self._pending.items()):
+                if pending.deadline > now:
+                    continue
+                if pending.attempts > self.retries:
+                    failed.append(self._pending.pop(seq))
+                else:
+                    pending.attempts += 1
+                    pending.deadline = now + self.timeout
+                    resend.append(pending.frame)
+        self._write(resend)
+        for pending in failed:
+            pending.future.set_exception(PumpTimeout("Keine Antwort vom Pumpen-Controller"))
+
+    def _fail_all(self, error):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            pours, self._pours = self._pours, {}
+        for entry in pending.values():
+            if not entry.future.done():
+                entry.future.set_exception(error)
+        for done, _, _ in pours.values():
+            if not done.done():
+                done.set_exception(error)
+
+
+def _gather(futures):
+    """Combine several Futures into one that resolves when all are done"""
+    combined = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def finished(f):
+        with lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if f.exception() is not None and not combined.done():
+            combined.set_exception(f.exception())
+        elif last and not combined.done():
+            combined.set_result([g.result() for g in futures])
+    for future in futures:
+        future.add_done_callback(finished)
+    return combined
+
+
+class FakeController:
+    """Emulates the pump microcontroller on a pty
+
+    `latency` delays every reply, `drop_every` ignores every n-th frame to
+    exercise the resend path. Timed pours end with a SLOT_DONE event.
+    """
+
+    def __init__(self, latency=0.0, drop_every=0, num_slots=NUM_SLOTS):
+        self.latency = latency
+        self.drop_every = drop_every
+        self.num_slots = num_slots
+        self.running = {}            # slot -> Timer
+        self.frames_received = 0
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._replies = {}           # seq -> (command frame, reply) for duplicate detection
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="fake-pump-controller", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._closed.set()
+        self._thread.join(timeout=1.0)
+        with self._lock:
+            for timer in self.running.values():
+                timer.cancel()
+            self.running.clear()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _send(self, seq, cmd, payload=b""):
+        # Replies come from the reader thread, SLOT_DONE events from timers
+        with self._write_lock:
+            write_all(self._master, encode_frame(seq, cmd, payload))
+
+    def _run(self):
+        parser = FrameParser()
+        while not self._closed.is_set():
+            readable, _, _ = select.select([self._master], [], [], 0.05)
+            if not readable:
+                continue
+            try:
+                data = os.read(self._master, 4096)
+            except OSError:
+                return
+            for seq, cmd, payload in parser.feed(data):
+                self.frames_received += 1
+                if self.drop_every and self.frames_received % self.drop_every == 0:
+                    continue
+                if self.latency:
+                    time.sleep(self.latency)
+                self._handle(seq, cmd, payload)
+
+    def _handle(self, seq, cmd, payload):
+        key = (cmd, payload)
+        previous = self._replies.get(seq)
+        if previous is not None and previous[0] == key:
+            # A resend: answer again without executing twice
+            self._send(seq, *previous[1])
+            return
+        reply = self._execute(cmd, payload)
+        self._replies[seq] = (key, reply)
+        if len(self._replies) > 256:
+            del self._replies[next(iter(self._replies))]
+        self._send(seq, *reply)
+
+    def _execute(self, cmd, payload):
+        if cmd == CMD_PING:
+            return cmd | REPLY_FLAG, b""
+        if cmd == CMD_START:
+            entries = [START_ENTRY.unpack_from(payload, i) for i in range(0, len(payload), START_ENTRY.size)]
+            if any(not 1 <= slot <= self.num_slots for slot, _ in entries):
+                return NAK, bytes([NAK_BAD_SLOT])
+            with self._lock:
+                if any(slot in self.running for slot, _ in entries):
+                    return NAK, bytes([NAK_BUSY])
+                for slot, ms in entries:
+                    timer = threading.Timer(ms / 1000, self._finish, (slot,))
+                    timer.daemon = True
+                    self.running[slot] = timer
+                    timer.start()
+            return cmd | REPLY_FLAG, b""
+        if cmd == CMD_STOP:
+            with self._lock:
+                for slot in list(payload) or list(self.running):
+                    timer = self.running.pop(slot, None)
+                    if timer is not None:
+                        timer.cancel()
+            return cmd | REPLY_FLAG, b""
+        if cmd == CMD_STATUS:
+            with self._lock:
+                mask = sum(1 << (slot - 1) for slot in self.running)
+            return cmd | REPLY_FLAG, mask.to_bytes(2, "big")
+        return NAK, bytes([NAK_BAD_COMMAND])
+
+    def _finish(self, slot):
+        with self._lock:
+            if self.running.pop(slot, None) is None:
+                return
+        if not self._closed.is_set():
+            self._send(0, EVT_SLOT_DONE, bytes([slot]))
+
+
+def open_from_env():
+    """Connect to the controller named by MIXMASTERX_PUMP_PORT, or return None
+
+    `MIXMASTERX_PUMP_PORT=fake` starts a FakeController, handy on machines
+    without pumps.
+    """
+    port = os.environ.get("MIXMASTERX_PUMP_PORT")
+    if not port:
+        return None
+    if port == "fake":
+        fake = FakeController().start()
+        pumps = PumpController(fake.port)
+        pumps.fake = fake
+        return pumps.open()
+    return PumpController(port, int(os.environ.get("MIXMASTERX_PUMP_BAUDRATE", 115200))).open()
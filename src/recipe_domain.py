@@ -0,0 +1,156 @@
+"""Recipe validation and normalization shared by all frontends
+
+All arithmetic on percentages and volumes uses Decimal, so values typed in
+by the user (33.3 + 33.3 + 33.4) add up exactly. Floats are converted via
+their shortest repr, which is what the user entered.
+"""
+import math
+from decimal import Decimal, InvalidOperation, ROUND_FLOOR, ROUND_HALF_UP
+
+HUNDRED = Decimal(100)
+# Allow small rounding errors in the percentage sum
+PERCENT_TOLERANCE = Decimal("0.1")
+_FLOAT_TOLERANCE = float(PERCENT_TOLERANCE)
+
+
+def to_decimal(value):
+    """Convert a number or a string like "33,5" / "33 %" to Decimal
+
+    Raises ValueError for anything that is not a finite number.
+    """
+    if isinstance(value, Decimal):
+        result = value
+    elif isinstance(value, float):
+        result = Decimal(repr(value))
+    elif isinstance(value, int):
+        result = Decimal(value)
+    else:
+        try:
+            result = Decimal(str(value).replace("%", "").replace(",", ".").strip())
+        except InvalidOperation:
+            raise ValueError(f"Keine gültige Zahl: {value!r}") from None
+    if not result.is_finite():
+        raise ValueError(f"Keine gültige Zahl: {value!r}")
+    return result
+
+
+def percentage_total(ingredients):
+    """Return the exact sum of a {name: percentage} mapping"""
+    return sum((to_decimal(pct) for pct in ingredients.values()), Decimal(0))
+
+
+def validate_percentages(ingredients):
+    """Check that the percentages add up to 100%"""
+    return abs(percentage_total(ingredients) - HUNDRED) < PERCENT_TOLERANCE
+
+
+def validate_recipe(ingredients, name=None):
+    """Return a list of error messages for one recipe, empty if it is valid
+
+    The name is only checked when given, so editors of existing recipes can
+    skip it.
+    """
+    errors = []
+    if name is not None and not name.strip():
+        errors.append("Bitte geben Sie einen Namen ein!")
+    if not ingredients:
+        errors.append("Bitte fügen Sie mindestens eine Zutat hinzu!")
+        return errors
+
+    values = []
+    invalid = False
+    for ing, pct in ingredients.items():
+        if type(pct) is float or type(pct) is int:
+            values.append(pct)
+            continue
+        try:
+            values.append(float(to_decimal(pct)))
+        except ValueError:
+            errors.append(f"Ungültiger Prozentwert für {ing}: {pct}")
+            invalid = True
+    if invalid:
+        return errors
+
+    if min(values) < 0 or max(values) > 100:
+        errors.append("Prozentwerte müssen zwischen 0 und 100 liegen")
+
+    # Decide on the float sum and only fall back to Decimal right at the tolerance edge
+    total = math.fsum(values)
+    deviation = abs(total - 100)
+    if deviation < _FLOAT_TOLERANCE - 1e-9:
+        return errors
+    if deviation <= _FLOAT_TOLERANCE + 1e-9:
+        total = percentage_total(ingredients)
+        if abs(total - HUNDRED) < PERCENT_TOLERANCE:
+            return errors
+    errors.append(f"Die Summe der Prozente muss 100% ergeben! Aktuelle Summe: {total:.1f}%")
+    return errors
+
+
+def validate_catalog(recipes):
+    """Validate a whole catalog at once
+
+    `recipes` is a {name: {ingredient: percentage}} mapping or an iterable of
+    Recipe objects. Returns {name: [error messages]} for the invalid recipes
+    only, so an empty dict means everything is fine.
+    """
+    if isinstance(recipes, dict):
+        items = recipes.items()
+    else:
+        # By name, so the messages say which ingredient is wrong
+        items = ((r.name, dict(r.items())) for r in recipes)
+    errors = {}
+    for name, ingredients in items:
+        recipe_errors = validate_recipe(ingredients)
+        if recipe_errors:
+            errors[name] = recipe_errors
+    return errors
+
+
+def format_catalog_errors(errors):
+    """Format the result of validate_catalog as one message"""
+    return "\n".join(f"{name}: {message}" for name, messages in errors.items() for message in messages)
+
+
+def distribute(total, weights, places=1):
+    """Split `total` proportionally to `weights`, rounded to `places` decimals
+
+    Uses the largest-remainder method so the parts add up to exactly `total`.
+    """
+    quantum = Decimal(1).scaleb(-places)
+    weights = [to_decimal(w) for w in weights]
+    weight_sum = sum(weights, Decimal(0))
+    if weight_sum == 0:
+        return [Decimal(0).quantize(quantum) for _ in weights]
+
+    exact = [to_decimal(total) * w / weight_sum for w in weights]
+    parts = [value.quantize(quantum, rounding=ROUND_FLOOR) for value in exact]
+    steps = int((to_decimal(total).quantize(quantum) - sum(parts, Decimal(0))) / quantum)
+    by_remainder = sorted(range(len(exact)), key=lambda i: parts[i] - exact[i])
+    for i in by_remainder[:steps]:
+        parts[i] += quantum
+    return parts
+
+
+def normalize_percentages(ingredients, places=1):
+    """Scale the percentages so they add up to exactly 100%
+
+    Returns a new {name: float} dict; ingredients at 0% are dropped. Raises
+    ValueError if a value is not a number or nothing is left to scale.
+    """
+    used = {ing: pct for ing, pct in ingredients.items() if to_decimal(pct) > 0}
+    if not used:
+        raise ValueError("Bitte fügen Sie mindestens eine Zutat hinzu!")
+    parts = distribute(HUNDRED, used.values(), places)
+    return {ing: float(part) for ing, part in zip(used, parts)}
+
+
+def ml_amount(percentage, glass_size, places=1):
+    """Return the exact ml amount of one ingredient, rounded half up"""
+    quantum = Decimal(1).scaleb(-places)
+    return (to_decimal(percentage) * to_decimal(glass_size) / HUNDRED).quantize(quantum, rounding=ROUND_HALF_UP)
+
+
+def split_volume(ingredients, glass_size, places=1):
+    """Return {name: Decimal ml} for a recipe, adding up to exactly the glass size"""
+    return dict(zip(ingredients, distribute(glass_size, ingredients.values(), places)))
@@ -0,0 +1,226 @@
+import json
+import os
+import sys
+from array import array
+
+
+class IngredientRegistry:
+    """Interns ingredient names and hands out stable integer IDs"""
+
+    __slots__ = ("_ids", "_names")
+
+    def __init__(self, names=()):
+        self._ids = {}
+        self._names = []
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name):
+        """Return the ID for an ingredient name, registering it if necessary"""
+        ing_id = self._ids.get(name)
+        if ing_id is None:
+            name = sys.intern(name)
+            ing_id = len(self._names)
+            self._ids[name] = ing_id
+            self._names.append(name)
+        return ing_id
+
+    def id_of(self, name, default=None):
+        """Return the ID of a known ingredient without registering it"""
+        return self._ids.get(name, default)
+
+    def name_of(self, ing_id):
+        """Return the ingredient name for an ID"""
+        return self._names[ing_id]
+
+    def names(self):
+        """Return all ingredient names ordered by ID"""
+        return list(self._names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def __len__(self):
+        return len(self._names)
+
+    def __iter__(self):
+        return iter(self._names)
+
+
+class Recipe:
+    """A cocktail recipe with its ingredient vector stored as compact arrays
+
+    `ingredient_ids` and `percentages` are parallel arrays in recipe order,
+    so the ingredient with ID `ingredient_ids[i]` makes up `percentages[i]`
+    percent of the drink.
+    """
+
+    __slots__ = ("name", "image", "glass_size", "ingredient_ids", "percentages", "registry")
+
+    def __init__(self, registry, name, image, ingredients, glass_size=None):
+        self.registry = registry
+        self.name = sys.intern(name)
+        self.image = image
+        self.glass_size = glass_size
+        self.ingredient_ids = array("H")
+        self.percentages = array("d")
+        self.set_ingredients(ingredients)
+
+    @classmethod
+    def from_arrays(cls, registry, name, image, ingredient_ids, percentages, glass_size=None):
+        """Create a recipe from ready-made ID and percentage arrays, e.g. from a snapshot"""
+        recipe = cls.__new__(cls)
+        recipe.registry = registry
+        recipe.name = sys.intern(name)
+        recipe.image = image
+        recipe.glass_size = glass_size
+        recipe.ingredient_ids = ingredient_ids
+        recipe.percentages = percentages
+        return recipe
+
+    def set_ingredients(self, ingredients):
+        """Replace the ingredient vector with a {name: percentage} mapping"""
+        intern = self.registry.intern
+        self.ingredient_ids = array("H", [intern(ing) for ing in ingredients])
+        self.percentages = array("d", [float(pct) for pct in ingredients.values()])
+
+    def set_percentage(self, ingredient, percentage):
+        """Set the percentage of a single ingredient, adding it if missing"""
+        ing_id = self.registry.intern(ingredient)
+        try:
+            self.percentages[self.ingredient_ids.index(ing_id)] = float(percentage)
+        except ValueError:
+            self.ingredient_ids.append(ing_id)
+            self.percentages.append(float(percentage))
+
+    def percentage_of(self, ingredient):
+        """Return the percentage of an ingredient, 0.0 if it is not used"""
+        ing_id = self.registry.id_of(ingredient)
+        if ing_id is None or ing_id not in self.ingredient_ids:
+            return 0.0
+        return self.percentages[self.ingredient_ids.index(ing_id)]
+
+    def items(self):
+        """Iterate over (ingredient name, percentage) pairs in recipe order"""
+        name_of = self.registry.name_of
+        return ((name_of(ing_id), pct) for ing_id, pct in zip(self.ingredient_ids, self.percentages))
+
+    def ingredients(self):
+        """Return the ingredients as a {name: percentage} dict"""
+        return dict(self.items())
+
+    def total_percentage(self):
+        """Return the sum of all ingredient percentages"""
+        return sum(self.percentages)
+
+    def dense_vector(self, width=None):
+        """Return a dense percentage array indexed by ingredient ID"""
+        vector = array("d", bytes(8 * (width or len(self.registry))))
+        for ing_id, pct in zip(self.ingredient_ids, self.percentages):
+            vector[ing_id] = pct
+        return vector
+
+    def to_dict(self):
+        """Return the recipe in the JSON shape used by recipes.json"""
+        data = {"image": self.image}
+        if self.glass_size is not None:
+            data["glass_size"] = self.glass_size
+        data["ingredients"] = self.ingredients()
+        return data
+
+    def __repr__(self):
+        return f"Recipe({self.name!r}, {self.ingredients()!r})"
+
+
+class RecipeStore:
+    """Ordered collection of recipes sharing one ingredient registry"""
+
+    __slots__ = ("registry", "_recipes")
+
+    def __init__(self, registry=None):
+        self.registry = registry if registry is not None else IngredientRegistry()
+        self._recipes = {}
+
+    @classmethod
+    def from_dicts(cls, recipes, registry=None):
+        """Build a store from the nested {name: {"image", "ingredients", ...}} shape"""
+        store = cls(registry)
+        for name, data in recipes.items():
+            store.add(name, data.get("image"), data.get("ingredients", {}), data.get("glass_size"))
+        return store
+
+    def to_dicts(self):
+        """Return all recipes in the nested dict shape used by recipes.json"""
+        return {name: recipe.to_dict() for name, recipe in self._recipes.items()}
+
+    def add(self, name, image, ingredients, glass_size=None):
+        """Add or replace a recipe and return it"""
+        return self.add_recipe(Recipe(self.registry, name, image, ingredients, glass_size))
+
+    def add_recipe(self, recipe):
+        """Add or replace a Recipe built on this store's registry and return it"""
+        self._recipes[recipe.name] = recipe
+        return recipe
+
+    def remove(self, name):
+        """Remove a recipe and return it"""
+        return self._recipes.pop(name)
+
+    def get(self, name, default=None):
+        return self._recipes.get(name, default)
+
+    def names(self):
+        """Return the recipe names in display order"""
+        return list(self._recipes)
+
+    def items(self):
+        return self._recipes.items()
+
+    def __getitem__(self, name):
+        return self._recipes[name]
+
+    def __delitem__(self, name):
+        del self._recipes[name]
+
+    def __contains__(self, name):
+        return name in self._recipes
+
+    def __len__(self):
+        return len(self._recipes)
+
+    def __iter__(self):
+        return iter(self._recipes.values())
+
+
+def load_recipe_store(recipes_file, ingredients_file=None, default_recipes=None):
+    """Load recipes.json into a RecipeStore
+
+    When an ingredients file is given, its ingredients are registered first so
+    that IDs follow the slot configuration order. Missing or unreadable files
+    fall back to `default_recipes`.
+    """
+    registry = IngredientRegistry()
+    if ingredients_file is not None:
+        registry = IngredientRegistry(load_json(ingredients_file, {}))
+
+    recipes = load_json(recipes_file, None)
+    if recipes is None:
+        recipes = default_recipes or {}
+    return RecipeStore.from_dicts(recipes, registry)
+
+
+def save_recipe_store(store, recipes_file):
+    """Write a RecipeStore back to recipes.json"""
+    with open(recipes_file, 'w') as f:
+        json.dump(store.to_dicts(), f, indent=4)
+
+
+def load_json(path, default):
+    """Load a JSON file, returning `default` if it is missing or invalid"""
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
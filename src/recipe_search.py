@@ -0,0 +1,252 @@
+import bisect
+import unicodedata
+from itertools import compress, islice
+
+# Turns a string of "0"/"1" characters into zero/one bytes for compress()
+_BITS = bytes.maketrans(b"01", b"\x00\x01")
+
+
+def normalize(text):
+    """Casefold text and strip accents so "Crémant" matches "cremant" """
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).strip()
+
+
+def trigrams(word):
+    """Return the set of padded trigrams of a normalized word"""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def count_at_least(masks, threshold, universe):
+    """Return the bitmask of positions set in at least `threshold` of `masks`
+
+    Counts are kept bit-sliced (one int per counter bit), so the whole
+    catalog is counted with a handful of big-int operations.
+    """
+    planes = []
+    for mask in masks:
+        carry = mask
+        for i, plane in enumerate(planes):
+            planes[i] = plane ^ carry
+            carry &= plane
+            if not carry:
+                break
+        if carry:
+            planes.append(carry)
+
+    if threshold >= 1 << len(planes):
+        return 0
+    greater, equal = 0, universe
+    for bit in reversed(range(len(planes))):
+        if threshold >> bit & 1:
+            equal &= planes[bit]
+        else:
+            greater |= equal & planes[bit]
+            equal &= ~planes[bit]
+    return greater | equal
+
+
+class RecipeSearchIndex:
+    """In-memory search index over recipe names and ingredients
+
+    Every recipe gets a position in menu order and all postings (name tokens,
+    trigrams, ingredients) are stored as int bitmasks over those positions,
+    so filters are a few bitwise operations regardless of catalog size. The
+    index is updated incrementally with `add`, `update` and `remove`.
+    """
+
+    def __init__(self, store=None):
+        self._names = []            # position -> recipe name, None once removed
+        self._position = {}         # recipe name -> position
+        self._live = 0              # bitmask of positions in use
+        self._tokens = []           # sorted (token, position) pairs
+        self._trigrams = {}         # trigram -> bitmask
+        self._by_ingredient = {}    # ingredient -> bitmask
+        self._ingredients_of = {}   # recipe name -> set of ingredients
+        if store is not None:
+            self._bulk_add(store)
+
+    def _name_tokens(self, name):
+        key = normalize(name)
+        # The full name plus each word, so "Spr" finds "Aperol Spritz"
+        return {key} | set(key.split())
+
+    def _set_ingredients(self, name, ingredients):
+        bit = 1 << self._position[name]
+        for ing in self._ingredients_of.get(name, ()):
+            self._by_ingredient[ing] &= ~bit
+        self._ingredients_of[name] = ingredients
+        for ing in ingredients:
+            self._by_ingredient[ing] = self._by_ingredient.get(ing, 0) | bit
+
+    def add(self, recipe):
+        """Index a recipe (anything with `name` and `items()`)
+
+        Adding a name that is already indexed updates it in place.
+        """
+        name = recipe.name
+        if name not in self._position:
+            pos = len(self._names)
+            bit = 1 << pos
+            self._names.append(name)
+            self._position[name] = pos
+            self._live |= bit
+            for token in self._name_tokens(name):
+                bisect.insort(self._tokens, (token, pos))
+                for gram in trigrams(token):
+                    self._trigrams[gram] = self._trigrams.get(gram, 0) | bit
+        self._set_ingredients(name, {ing for ing, percentage in recipe.items() if percentage > 0})
+
+    def _bulk_add(self, recipes):
+        """Index many new recipes at once, building each bitmask only once"""
+        gram_positions = {}
+        ingredient_positions = {}
+        for recipe in recipes:
+            name = recipe.name
+            if name in self._position:
+                self.add(recipe)
+                continue
+            pos = len(self._names)
+            self._names.append(name)
+            self._position[name] = pos
+            for token in self._name_tokens(name):
+                self._tokens.append((token, pos))
+                for gram in trigrams(token):
+                    gram_positions.setdefault(gram, []).append(pos)
+            ingredients = {ing for ing, percentage in recipe.items() if percentage > 0}
+            self._ingredients_of[name] = ingredients
+            for ing in ingredients:
+                ingredient_positions.setdefault(ing, []).append(pos)
+
+        self._tokens.sort()
+        self._live = self._mask_of(self._position.values())
+        for gram, positions in gram_positions.items():
+            self._trigrams[gram] = self._trigrams.get(gram, 0) | self._mask_of(positions)
+        for ing, positions in ingredient_positions.items():
+            self._by_ingredient[ing] = self._by_ingredient.get(ing, 0) | self._mask_of(positions)
+
+    def update(self, recipe):
+        """Re-index a recipe whose ingredients changed, keeping its position"""
+        self.add(recipe)
+
+    def remove(self, name):
+        """Remove a recipe from the index"""
+        pos = self._position.pop(name, None)
+        if pos is None:
+            return
+        bit = 1 << pos
+        for token in self._name_tokens(name):
+            i = bisect.bisect_left(self._tokens, (token, pos))
+            if i < len(self._tokens) and self._tokens[i] == (token, pos):
+                del self._tokens[i]
+            for gram in trigrams(token):
+                self._trigrams[gram] &= ~bit
+        for ing in self._ingredients_of.pop(name):
+            self._by_ingredient[ing] &= ~bit
+        self._names[pos] = None
+        self._live &= ~bit
+
+        # Compact positions once most of them are holes
+        if len(self._names) > 64 and len(self._position) < len(self._names) // 2:
+            self._reindex()
+
+    def _reindex(self):
+        entries = [_Entry(name, self._ingredients_of[name]) for name in self._names if name is not None]
+        self.__init__()
+        self._bulk_add(entries)
+
+    def _mask_of(self, positions):
+        """Build a bitmask from an iterable of positions"""
+        bits = bytearray((len(self._names) + 7) // 8)
+        for pos in positions:
+            bits[pos >> 3] |= 1 << (pos & 7)
+        return int.from_bytes(bits, "little")
+
+    def _names_in(self, mask, limit=None):
+        """Return the recipe names of a bitmask in menu order"""
+        flags = bin(mask)[:1:-1].encode().translate(_BITS)
+        names = compress(self._names, flags)
+        return list(islice(names, limit)) if limit is not None else list(names)
+
+    def prefix_mask(self, query):
+        """Return the bitmask of names with the full name or a word starting with `query`"""
+        key = normalize(query)
+        start = bisect.bisect_left(self._tokens, (key, -1))
+        end = bisect.bisect_left(self._tokens, (key + "\U0010ffff", -1), start)
+        return self._mask_of(pos for _, pos in self._tokens[start:end])
+
+    def fuzzy_masks(self, query, min_score=0.5):
+        """Return bitmasks of fuzzy matches, grouped from best to worst score"""
+        grams = set()
+        for word in normalize(query).split():
+            grams |= trigrams(word)
+        masks = [self._trigrams[gram] for gram in grams if gram in self._trigrams]
+        groups = []
+        seen = 0
+        for count in range(len(grams), max(1, int(min_score * len(grams) + 0.5)) - 1, -1):
+            mask = count_at_least(masks, count, self._live) & ~seen
+            if mask:
+                groups.append(mask)
+                seen |= mask
+        return groups
+
+    def recipes_with(self, ingredient):
+        """Return the names of all recipes using an ingredient"""
+        return self._names_in(self._by_ingredient.get(ingredient, 0))
+
+    def search(self, query="", include=(), exclude=(), loaded=None, limit=None):
+        """Return matching recipe names
+
+        `include`/`exclude` are ingredients that must or must not be used and
+        `loaded` is the set of ingredients currently in a slot; when given,
+        only drinks makeable with them are returned. Prefix matches keep menu
+        order; if a query has no prefix match, fuzzy matches are returned best
+        first.
+        """
+        groups = [self._live]
+        if query.strip():
+            prefix = self.prefix_mask(query)
+            groups = [prefix] if prefix else self.fuzzy_masks(query)
+
+        allowed = self._live
+        for ing in include:
+            allowed &= self._by_ingredient.get(ing, 0)
+        for ing in exclude:
+            allowed &= ~self._by_ingredient.get(ing, 0)
+        if loaded is not None:
+            for ing, mask in self._by_ingredient.items():
+                if ing not in loaded:
+                    allowed &= ~mask
+
+        result = []
+        for mask in groups:
+            remaining = None if limit is None else limit - len(result)
+            if remaining == 0:
+                break
+            result.extend(self._names_in(mask & allowed, remaining))
+        return result
+
+    def __contains__(self, name):
+        return name in self._position
+
+    def __len__(self):
+        return len(self._position)
+
+
+class _Entry:
+    """Minimal recipe stand-in used when re-indexing"""
+
+    __slots__ = ("name", "_ingredients")
+
+    def __init__(self, name, ingredients):
+        self.name = name
+        self._ingredients = ingredients
+
+    def items(self):
+        return ((ing, 1.0) for ing in self._ingredients)
+
+
+def loaded_ingredients(ingredients):
+    """Return the ingredients currently assigned to a slot"""
+    return {ing for ing, slot in ingredients.items() if slot != "-"}
@@ -0,0 +1,346 @@
+"""Discrete-event throughput simulator for capacity planning
+
+Answers "can one machine handle 250 drinks/hour with this menu and slot
+layout?" before the event. Orders arrive as a Poisson process (constant or
+piecewise-constant rate over the night), pick a drink by popularity and are
+served first come, first served. A drink occupies the machine for
+
+    handover + priming (if a slot sat idle too long) + pour + cleaning
+
+where the pour takes as long as its slowest slot, since all pumps of a drink
+run at the same time. Service times for the whole menu come from the
+PourMatrix in one vectorized step; the event loop itself only does float
+arithmetic, so a full night simulates in milliseconds.
+
+Usage:
+    python src/simulator.py --rate 250 --hours 6
+    python src/simulator.py --sweep-rate 100 150 200 250 --sweep-flow 2 4 8
+"""
+import argparse
+import itertools
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from recipe_model import load_json, load_recipe_store
+from pour_matrix import NUM_SLOTS, PourMatrix
+from pump_controller import DEFAULT_FLOW_RATE
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+class SimulationConfig:
+    """Machine and event parameters of one simulation
+
+    `arrival_rates` is [(hour since opening, drinks per hour), ...]; each rate
+    holds until the next entry or closing time. `flow_rates` is {slot: ml/s}.
+    """
+
+    def __init__(self, hours=6.0, arrival_rates=((0, 250),), glass_size=400, flow_rates=None,
+                 default_flow_rate=DEFAULT_FLOW_RATE, handover_seconds=8.0, cleaning_seconds=3.0,
+                 prime_seconds=4.0, prime_after=600.0, replications=5, seed=1):
+        self.hours = hours
+        self.arrival_rates = tuple(arrival_rates)
+        self.glass_size = glass_size
+        self.flow_rates = dict(flow_rates or {})
+        self.default_flow_rate = default_flow_rate
+        self.handover_seconds = handover_seconds
+        self.cleaning_seconds = cleaning_seconds
+        self.prime_seconds = prime_seconds
+        self.prime_after = prime_after
+        self.replications = replications
+        self.seed = seed
+
+    def replace(self, **changes):
+        config = SimulationConfig.__new__(SimulationConfig)
+        config.__dict__.update(self.__dict__)
+        config.__dict__.update(changes)
+        return config
+
+    def drink_seconds(self, slot_ml):
+        """Machine time for one pour of {slot: ml}, including handover and cleaning"""
+        pour = max((ml / self.flow_rates.get(slot, self.default_flow_rate) for slot, ml in slot_ml.items()), default=0.0)
+        return self.handover_seconds + pour + self.cleaning_seconds
+
+    def slot_flow_rates(self):
+        return np.array([self.flow_rates.get(slot, self.default_flow_rate) for slot in range(1, NUM_SLOTS + 1)])
+
+
+class MenuProfile:
+    """The makeable drinks of a menu as plain arrays, cheap to send to worker processes"""
+
+    def __init__(self, names, slot_ml, weights=None):
+        self.names = list(names)
+        self.slot_ml = np.asarray(slot_ml, dtype=np.float64)    # drinks x slots, for a 100 ml glass
+        weights = np.ones(len(self.names)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.weights = weights / weights.sum()
+
+    @classmethod
+    def from_store(cls, store, ingredients, popularity=None):
+        """Build a profile from a RecipeStore and {ingredient: slot}
+
+        Drinks that use an ingredient without a slot are left out.
+        `popularity` is {name: relative weight}, by default all are equal.
+        """
+        matrix = PourMatrix(store, ingredients)
+        available = matrix.available()
+        names = [name for name, ok in zip(matrix.names, available) if ok]
+        if not names:
+            raise ValueError("Kein Cocktail ist mit der aktuellen Slot-Belegung herstellbar")
+        weights = None
+        if popularity is not None:
+            weights = [popularity.get(name, 0.0) for name in names]
+        return cls(names, matrix.slot_amounts(100)[available], weights)
+
+
+class SimulationResult:
+    def __init__(self, config, orders, waits, turnarounds, makespan, busy, pump_seconds,
+                 critical_seconds, primes, max_queue, ml_per_slot):
+        self.config = config
+        self.orders = orders
+        self.waits = waits
+        self.turnarounds = turnarounds
+        self.makespan = makespan
+        self.busy = busy
+        self.pump_seconds = pump_seconds
+        self.critical_seconds = critical_seconds
+        self.primes = primes
+        self.max_queue = max_queue
+        self.ml_per_slot = ml_per_slot
+
+    @property
+    def throughput_per_hour(self):
+        return self.orders / (self.makespan / 3600) if self.makespan else 0.0
+
+    @property
+    def offered_per_hour(self):
+        return self.orders / self.config.hours
+
+    @property
+    def capacity_per_hour(self):
+        """Drinks per hour if the machine never waited for orders"""
+        return 3600 * self.orders / self.busy if self.busy else 0.0
+
+    @property
+    def utilization(self):
+        return self.busy / self.makespan if self.makespan else 0.0
+
+    @property
+    def drain_minutes(self):
+        """How long after closing the last drink was finished"""
+        return max(0.0, self.makespan - self.config.hours * 3600) / 60
+
+    def wait_percentile(self, q):
+        return float(np.percentile(self.waits, q)) if len(self.waits) else 0.0
+
+    def turnaround_percentile(self, q):
+        return float(np.percentile(self.turnarounds, q)) if len(self.turnarounds) else 0.0
+
+    def bottleneck_slots(self, count=3):
+        """Return [(slot, share of pour time it was the slowest slot), ...], worst first"""
+        total = self.critical_seconds.sum()
+        order = np.argsort(-self.critical_seconds)[:count]
+        return [(int(i) + 1, float(self.critical_seconds[i] / total)) for i in order
+                if total and self.critical_seconds[i] > 0]
+
+    def summary(self):
+        return {
+            "offered_per_hour": round(self.offered_per_hour, 1),
+            "throughput_per_hour": round(self.throughput_per_hour, 1),
+            "capacity_per_hour": round(self.capacity_per_hour, 1),
+            "utilization": round(self.utilization, 3),
+            "wait_p50_s": round(self.wait_percentile(50), 1),
+            "wait_p95_s": round(self.wait_percentile(95), 1),
+            "turnaround_p95_s": round(self.turnaround_percentile(95), 1),
+            "max_queue": self.max_queue,
+            "drain_minutes": round(self.drain_minutes, 1),
+            "bottleneck_slots": self.bottleneck_slots(),
+        }
+
+
+def arrival_times(config, rng):
+    """Return sorted order times in seconds since opening"""
+    close = config.hours * 3600
+    times = []
+    steps = sorted(config.arrival_rates)
+    for i, (hour, rate) in enumerate(steps):
+        start = hour * 3600
+        end = min(steps[i + 1][0] * 3600 if i + 1 < len(steps) else close, close)
+        if end <= start or rate <= 0:
+            continue
+        count = rng.poisson(rate * (end - start) / 3600)
+        times.append(rng.uniform(start, end, count))
+    return np.sort(np.concatenate(times)) if times else np.empty(0)
+
+
+def simulate_once(profile, config, seed):
+    """Simulate one night and return a SimulationResult"""
+    rng = np.random.default_rng(seed)
+    arrivals = arrival_times(config, rng)
+    choices = rng.choice(len(profile.names), size=len(arrivals), p=profile.weights)
+
+    # Service profile of every drink at once: seconds per slot, pour time, slowest slot
+    slot_ml = profile.slot_ml * (config.glass_size / 100)
+    slot_seconds = slot_ml / config.slot_flow_rates()
+    pour_seconds = slot_seconds.max(axis=1)
+    critical = slot_seconds.argmax(axis=1)
+    used = [np.flatnonzero(row).tolist() for row in slot_ml]
+    fixed = config.handover_seconds + config.cleaning_seconds
+    pour_list = pour_seconds.tolist()
+
+    # The event loop; FIFO single server, so the next start is known directly
+    last_used = [-np.inf] * NUM_SLOTS
+    primes = np.zeros(NUM_SLOTS, dtype=np.int64)
+    starts = np.empty(len(arrivals))
+    done = np.empty(len(arrivals))
+    free_at = 0.0
+    busy = 0.0
+    prime_after, prime_seconds = config.prime_after, config.prime_seconds
+    for i, (arrival, drink) in enumerate(zip(arrivals.tolist(), choices.tolist())):
+        start = arrival if arrival > free_at else free_at
+        prime = 0.0
+        for slot in used[drink]:
+            if start - last_used[slot] > prime_after:
+                primes[slot] += 1
+                prime = prime_seconds
+        pour_end = start + config.handover_seconds + prime + pour_list[drink]
+        for slot in used[drink]:
+            last_used[slot] = pour_end
+        free_at = pour_end + config.cleaning_seconds
+        busy += fixed + prime + pour_list[drink]
+        starts[i] = start
+        done[i] = free_at
+
+    counts = np.bincount(choices, minlength=len(profile.names))
+    critical_seconds = np.bincount(critical, weights=counts * pour_seconds, minlength=NUM_SLOTS)
+    # Orders waiting when each order arrives: arrived before it, not started yet
+    queue = np.arange(len(arrivals)) - np.searchsorted(starts, arrivals, side="right")
+    return SimulationResult(
+        config=config,
+        orders=len(arrivals),
+        waits=starts - arrivals,
+        turnarounds=done - arrivals,
+        makespan=float(done[-1]) if len(done) else 0.0,
+        busy=busy,
+        pump_seconds=counts @ slot_seconds,
+        critical_seconds=critical_seconds,
+        primes=primes,
+        max_queue=int(queue.max()) + 1 if len(queue) else 0,
+        ml_per_slot=counts @ slot_ml,
+    )
+
+
+def simulate(profile, config):
+    """Run `config.replications` nights and pool the results"""
+    runs = [simulate_once(profile, config, config.seed + i) for i in range(config.replications)]
+    n = len(runs)
+    return SimulationResult(
+        config=config,
+        orders=sum(r.orders for r in runs) / n,
+        waits=np.concatenate([r.waits for r in runs]),
+        turnarounds=np.concatenate([r.turnarounds for r in runs]),
+        makespan=sum(r.makespan for r in runs) / n,
+        busy=sum(r.busy for r in runs) / n,
+        pump_seconds=sum(r.pump_seconds for r in runs) / n,
+        critical_seconds=sum(r.critical_seconds for r in runs) / n,
+        primes=sum(r.primes for r in runs) / n,
+        max_queue=max(r.max_queue for r in runs),
+        ml_per_slot=sum(r.ml_per_slot for r in runs) / n,
+    )
+
+
+def _simulate_args(args):
+    return simulate(*args)
+
+
+def sweep(profile, base_config, grid, workers=None):
+    """Simulate every combination of `grid` ({config attribute: [values]}) in parallel
+
+    Returns [(changes, SimulationResult), ...] in grid order. The work is
+    spread over all cores with one process per core.
+    """
+    keys = list(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+    configs = [base_config.replace(**changes) for changes in combos]
+    if len(configs) == 1 or workers == 1:
+        results = [simulate(profile, config) for config in configs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_simulate_args, [(profile, config) for config in configs]))
+    return list(zip(combos, results))
+
+
+def parse_rate_profile(values):
+    """Parse ["0:120", "2:250", ...] into [(hour, rate), ...]"""
+    steps = []
+    for value in values:
+        hour, _, rate = value.partition(":")
+        steps.append((float(hour), float(rate)))
+    return steps
+
+
+def format_result(changes, result):
+    summary = result.summary()
+    label = ", ".join(f"{key}={value}" for key, value in changes.items()) or "Basis"
+    bottlenecks = ", ".join(f"Slot {slot} ({share:.0%})" for slot, share in summary["bottleneck_slots"])
+    return (f"{label}\n"
+            f"  Angebot {summary['offered_per_hour']:7.1f}/h, Durchsatz {summary['throughput_per_hour']:7.1f}/h, "
+            f"Kapazität {summary['capacity_per_hour']:7.1f}/h, Auslastung {summary['utilization']:.0%}\n"
+            f"  Wartezeit p50 {summary['wait_p50_s']:8.1f}s, p95 {summary['wait_p95_s']:8.1f}s, "
+            f"max. Warteschlange {summary['max_queue']}, Nachlauf {summary['drain_minutes']:.1f} min\n"
+            f"  Engpässe: {bottlenecks or '-'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Durchsatz-Simulation für einen Abend")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Verzeichnis mit recipes.json und ingredients.json")
+    parser.add_argument("--hours", type=float, default=6.0, help="Öffnungsdauer in Stunden")
+    parser.add_argument("--rate", type=float, default=250.0, help="Bestellungen pro Stunde")
+    parser.add_argument("--rate-profile", nargs="+", metavar="STUNDE:RATE",
+                        help="Stufenweise Bestellrate, z.B. 0:120 2:250 4:80")
+    parser.add_argument("--glass-size", type=int, help="Glasgröße in ml (Standard: aus glass_size.json)")
+    parser.add_argument("--flow-rate", type=float, default=DEFAULT_FLOW_RATE, help="Pumpenleistung in ml/s")
+    parser.add_argument("--handover", type=float, default=8.0, help="Sekunden für Glaswechsel pro Drink")
+    parser.add_argument("--cleaning", type=float, default=3.0, help="Sekunden Spülen pro Drink")
+    parser.add_argument("--prime", type=float, default=4.0, help="Sekunden Ansaugen nach Standzeit")
+    parser.add_argument("--prime-after", type=float, default=600.0, help="Standzeit in Sekunden bis zum Ansaugen")
+    parser.add_argument("--replications", type=int, default=5, help="Simulierte Abende pro Konfiguration")
+    parser.add_argument("--sweep-rate", type=float, nargs="+", help="Bestellraten für einen Parameter-Sweep")
+    parser.add_argument("--sweep-flow", type=float, nargs="+", help="Pumpenleistungen für einen Parameter-Sweep")
+    parser.add_argument("--workers", type=int, help="Anzahl Prozesse (Standard: alle Kerne)")
+    args = parser.parse_args(argv)
+
+    store = load_recipe_store(os.path.join(args.data_dir, "recipes.json"),
+                              os.path.join(args.data_dir, "ingredients.json"))
+    ingredients = load_json(os.path.join(args.data_dir, "ingredients.json"), {})
+    glass_size = args.glass_size or load_json(os.path.join(args.data_dir, "glass_size.json"),
+                                              {"glass_size": 400}).get("glass_size", 400)
+    try:
+        profile = MenuProfile.from_store(store, ingredients)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    arrival_rates = parse_rate_profile(args.rate_profile) if args.rate_profile else [(0, args.rate)]
+    config = SimulationConfig(hours=args.hours, arrival_rates=arrival_rates, glass_size=glass_size,
+                              default_flow_rate=args.flow_rate, handover_seconds=args.handover,
+                              cleaning_seconds=args.cleaning, prime_seconds=args.prime,
+                              prime_after=args.prime_after, replications=args.replications)
+    grid = {}
+    if args.sweep_rate:
+        grid["arrival_rates"] = [((0, rate),) for rate in args.sweep_rate]
+    if args.sweep_flow:
+        grid["default_flow_rate"] = args.sweep_flow
+
+    print(f"{len(profile.names)} Cocktails, Glasgröße {glass_size}ml, {args.hours:g} Stunden")
+    for changes, result in sweep(profile, config, grid, args.workers):
+        if "arrival_rates" in changes:
+            changes["rate"] = changes.pop("arrival_rates")[0][1]
+        print(format_result(changes, result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
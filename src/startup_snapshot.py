@@ -0,0 +1,281 @@
+"""Memory-mapped startup snapshot of the menu
+
+Between boot and the first frame of the Tk app most time goes into parsing
+the JSON files, building the pour matrix and decoding and scaling the
+cocktail images. The snapshot keeps the result of all that in one binary
+file next to the data files: the recipes in display order with their
+ingredient arrays, the pour matrix and the grid thumbnails as raw pixels.
+The file is memory-mapped, so a warm boot only reads the pages it touches.
+
+The snapshot records the mtime and size of the JSON files it was built from
+and is ignored as soon as one of them differs. Thumbnails are keyed by the
+image's own mtime and stay usable from an outdated snapshot. SnapshotWriter
+rebuilds the file on a background thread after the data changed.
+
+Layout: a fixed header (magic, format, header length), a marshal-encoded
+index and the 8-byte aligned arrays and pixel blobs it points to.
+"""
+import marshal
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+
+import numpy as np
+from PIL import Image
+
+from recipe_model import IngredientRegistry, Recipe, RecipeStore
+from pour_matrix import PourMatrix
+from thumbnail_pack import GRID_SIZE
+
+SNAPSHOT_FILE = "startup_snapshot.bin"
+SOURCE_FILES = ("ingredients.json", "recipes.json", "glass_size.json")
+FORMAT_VERSION = 1
+MAGIC = b"MXSNAP\r\n"
+HEADER = struct.Struct("<8sII")
+# Thumbnails stored per snapshot (the grid cache holds as many)
+THUMBNAIL_LIMIT = 256
+
+
+def data_start(index_length):
+    """Return the file offset of the blobs; blob offsets in the index count from here"""
+    return (HEADER.size + index_length + 7) & ~7
+
+
+def source_stamps(data_dir):
+    """Return {file name: (mtime_ns, size) or None} of the JSON data files"""
+    stamps = {}
+    for name in SOURCE_FILES:
+        try:
+            st = os.stat(os.path.join(data_dir, name))
+            stamps[name] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stamps[name] = None
+    return stamps
+
+
+def make_thumbnail(image_path):
+    """Decode an image and scale it to the grid size"""
+    img = Image.open(image_path)
+    # JPEGs are decoded at the smallest scale that still covers the grid size
+    img.draft("RGB", GRID_SIZE)
+    return img.resize(GRID_SIZE, Image.Resampling.LANCZOS)
+
+
+class Snapshot:
+    """A read-only snapshot file mapped into memory"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, length = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("Unbekanntes Snapshot-Format")
+        self.index = marshal.loads(self._map[HEADER.size:HEADER.size + length])
+        self._base = data_start(length)
+        if self._base + self.index["size"] != len(self._map):
+            raise ValueError("Snapshot ist unvollständig")
+
+    def release(self):
+        """Drop the mapped pages from the resident set; they are paged in again when read"""
+        if hasattr(mmap, "MADV_DONTNEED"):
+            self._map.madvise(mmap.MADV_DONTNEED)
+
+    @property
+    def ingredients(self):
+        return self.index["ingredients"]
+
+    @property
+    def glass_size(self):
+        return self.index["glass_size"]
+
+    @property
+    def pitcher_size(self):
+        return self.index["pitcher_size"]
+
+    def is_current(self, stamps):
+        """Return True if the snapshot was built from the data files as they are now"""
+        return self.index["sources"] == stamps
+
+    def _array(self, typecode, offset, length):
+        values = array(typecode)
+        values.frombytes(self._map[self._base + offset:self._base + offset + length])
+        return values
+
+    def recipe_store(self):
+        """Return a new RecipeStore with the recipes of the snapshot"""
+        store = RecipeStore(IngredientRegistry(self.index["registry"]))
+        ids = self._array("H", *self.index["ingredient_ids"])
+        percentages = self._array("d", *self.index["percentages"])
+        start = 0
+        for name, image, glass_size, count in self.index["recipes"]:
+            end = start + count
+            store.add_recipe(Recipe.from_arrays(store.registry, name, image, ids[start:end],
+                                                percentages[start:end], glass_size))
+            start = end
+        return store
+
+    def pour_matrix(self, store):
+        """Return the PourMatrix of `store`, with its arrays read straight from the mapping"""
+        rows, cols = len(self.index["recipes"]), len(self.index["registry"])
+        percentages = np.frombuffer(self._map, dtype=np.float64, count=rows * cols,
+                                    offset=self._base + self.index["matrix"]).reshape(rows, cols)
+        slot_percentages = np.frombuffer(self._map, dtype=np.float64, count=rows * self.index["slots"],
+                                         offset=self._base + self.index["slot_matrix"]).reshape(rows, self.index["slots"])
+        return PourMatrix.from_arrays(store, self.ingredients, percentages, slot_percentages)
+
+    def thumbnail_data(self, image_path, mtime_ns):
+        """Return (mode, size, pixel buffer) of a stored thumbnail or None"""
+        entry = self.index["thumbnails"].get(image_path)
+        if entry is None or entry[0] != mtime_ns:
+            return None
+        _, mode, width, height, offset, length = entry
+        offset += self._base
+        return mode, (width, height), memoryview(self._map)[offset:offset + length]
+
+    def thumbnail(self, image_path, mtime_ns):
+        """Return the grid thumbnail of an image as a PIL image, or None if it is not stored"""
+        data = self.thumbnail_data(image_path, mtime_ns)
+        if data is None:
+            return None
+        mode, size, pixels = data
+        return Image.frombuffer(mode, size, pixels, "raw", mode, 0, 1)
+
+
+def open_snapshot(path):
+    """Map a snapshot file; returns None if it is missing, torn or of another format"""
+    try:
+        return Snapshot(path)
+    except (OSError, ValueError, EOFError, TypeError, KeyError, struct.error):
+        return None
+
+
+def write_snapshot(path, stamps, ingredients, store, glass_size, pitcher_size, previous=None):
+    """Write the snapshot of a loaded catalog
+
+    Thumbnails whose image did not change are copied from `previous` instead
+    of decoding the image again. The file is replaced atomically.
+    """
+    matrix = PourMatrix(store, ingredients)
+    blobs = []
+    size = 0
+
+    def add_blob(data):
+        nonlocal size
+        data = bytes(data)
+        offset = size
+        blobs.append(data + b"\0" * (-len(data) % 8))
+        size += len(blobs[-1])
+        return offset, len(data)
+
+    recipes = []
+    ids = array("H")
+    percentages = array("d")
+    for recipe in store:
+        recipes.append((recipe.name, recipe.image, recipe.glass_size, len(recipe.ingredient_ids)))
+        ids.extend(recipe.ingredient_ids)
+        percentages.extend(recipe.percentages)
+    index = {
+        "sources": stamps,
+        "ingredients": dict(ingredients),
+        "glass_size": glass_size,
+        "pitcher_size": pitcher_size,
+        "registry": store.registry.names(),
+        "recipes": recipes,
+        "ingredient_ids": add_blob(ids.tobytes()),
+        "percentages": add_blob(percentages.tobytes()),
+        "matrix": add_blob(np.ascontiguousarray(matrix.percentages, dtype=np.float64).tobytes())[0],
+        "slot_matrix": add_blob(np.ascontiguousarray(matrix.slot_percentages, dtype=np.float64).tobytes())[0],
+        "slots": matrix.slot_percentages.shape[1],
+        "thumbnails": {},
+    }
+
+    for image_path in dict.fromkeys(recipe.image for recipe in store):
+        if len(index["thumbnails"]) >= THUMBNAIL_LIMIT:
+            break
+        try:
+            mtime_ns = os.stat(image_path).st_mtime_ns
+            data = previous.thumbnail_data(image_path, mtime_ns) if previous is not None else None
+            if data is None:
+                img = make_thumbnail(image_path)
+                data = img.mode, img.size, img.tobytes()
+        except (OSError, ValueError, TypeError):
+            continue
+        mode, (width, height), pixels = data
+        index["thumbnails"][image_path] = (mtime_ns, mode, width, height) + add_blob(pixels)
+    index["size"] = size
+
+    encoded = marshal.dumps(index)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(encoded)))
+        f.write(encoded)
+        f.write(b"\0" * (data_start(len(encoded)) - HEADER.size - len(encoded)))
+        for blob in blobs:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SnapshotWriter:
+    """Rebuilds the snapshot on a background thread after the data files changed
+
+    `read_data` returns (ingredients, RecipeStore, glass_size, pitcher_size)
+    loaded from the JSON files and must be safe to call from another thread.
+    Requests within `delay` seconds are coalesced into one rebuild, since the
+    admin saves on every keystroke.
+    """
+
+    def __init__(self, path, data_dir, read_data, delay=2.0):
+        self.path = path
+        self.data_dir = data_dir
+        self.read_data = read_data
+        self.delay = delay
+        self.builds = 0
+        self._due = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="startup-snapshot", daemon=True)
+        self._thread.start()
+
+    def request(self):
+        """Schedule a rebuild from the data files as they are after `delay` seconds"""
+        with self._cond:
+            self._due = time.monotonic() + self.delay
+            self._cond.notify()
+
+    def build(self):
+        """Rebuild the snapshot now, on the calling thread"""
+        # Stamp before reading: a file written meanwhile then no longer matches
+        stamps = source_stamps(self.data_dir)
+        ingredients, store, glass_size, pitcher_size = self.read_data()
+        write_snapshot(self.path, stamps, ingredients, store, glass_size, pitcher_size,
+                       previous=open_snapshot(self.path))
+        self.builds += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and (self._due is None or self._due > time.monotonic()):
+                    self._cond.wait(None if self._due is None else self._due - time.monotonic())
+                if self._due is None:
+                    return
+                self._due = None
+                closed = self._closed
+            try:
+                self.build()
+            except (OSError, ValueError) as e:
+                # An outdated snapshot is ignored, so the next boot just loads the JSON files
+                print(f"Startup-Snapshot konnte nicht geschrieben werden: {e}")
+            if closed:
+                return
+
+    def close(self):
+        """Stop the thread, writing a pending rebuild first"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
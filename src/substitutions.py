@@ -0,0 +1,200 @@
+"""Alternatives for drinks that cannot be made right now
+
+When an ingredient is not loaded in a slot (or its slot ran dry), the drinks
+using it are greyed out. SubstitutionEngine finds what can be offered
+instead: the same drink with an allowed ingredient swap, such as Prosecco
+for Secco, or the most similar drink that can be made.
+
+Swaps are groups of interchangeable ingredients, from SWAP_GROUPS and
+optionally `data/substitutions.json` (a list of lists of names). For the
+similarity search, every recipe is a percentage vector over the swap groups,
+normalized to unit length when the engine is built, so the cosine similarity
+of one drink to the whole menu is a single matrix-vector product.
+
+`availability` also takes slot volumes, but the apps do not track fill
+levels yet, so MainWindow only greys out drinks whose ingredients are not
+loaded.
+"""
+import os
+
+import numpy as np
+
+from recipe_model import load_json
+
+SUBSTITUTIONS_FILE = "substitutions.json"
+# Ingredients that can stand in for each other at the same percentage
+SWAP_GROUPS = [
+    ["Secco", "Prosecco", "Sekt"],
+    ["Mineralwasser", "Sodawasser"],
+    ["Tonic", "Indian Tonic"],
+]
+# Drinks less similar than this are not offered
+MIN_SIMILARITY = 0.5
+
+
+def load_swap_groups(data_dir):
+    """Return the built-in swap groups plus those from data/substitutions.json"""
+    extra = load_json(os.path.join(data_dir, SUBSTITUTIONS_FILE), [])
+    if not isinstance(extra, list):
+        extra = []
+    return SWAP_GROUPS + [group for group in extra if isinstance(group, list)]
+
+
+class Suggestion:
+    """A drink to offer instead; `swaps` maps {ingredient: replacement} for pouring it"""
+
+    __slots__ = ("name", "swaps", "similarity")
+
+    def __init__(self, name, swaps, similarity):
+        self.name = name
+        self.swaps = swaps
+        self.similarity = similarity
+
+    def label(self):
+        """Short German description for buttons"""
+        if not self.swaps:
+            return self.name
+        return f"{self.name} ({', '.join(f'{new} statt {old}' for old, new in self.swaps.items())})"
+
+    def __repr__(self):
+        return f"Suggestion({self.name!r}, {self.swaps!r}, {self.similarity:.2f})"
+
+
+class SubstitutionEngine:
+    """Nearest makeable variants of the recipes in a PourMatrix
+
+    Built once per pour matrix; `availability` must be called again after
+    slot volumes change, everything else stays precomputed.
+    """
+
+    def __init__(self, pour_matrix, swap_groups=SWAP_GROUPS):
+        self.matrix = pour_matrix
+        names = pour_matrix.ingredient_names
+        col_of = {name: col for col, name in enumerate(names)}
+
+        # Group of every ingredient column; ingredients without a group are their own
+        self.group_of = np.arange(len(names), dtype=np.intp)
+        self.partners = [[] for _ in names]
+        for group in swap_groups:
+            cols = [col_of[name] for name in group if name in col_of]
+            for col in cols:
+                self.group_of[col] = cols[0]
+                self.partners[col] = [other for other in cols if other != col]
+
+        # Recipe vectors over the groups, unit length
+        vectors = np.zeros_like(pour_matrix.percentages)
+        np.add.at(vectors.T, self.group_of, pour_matrix.percentages.T)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+        self.uses = pour_matrix.percentages > 0
+        self.availability()
+
+    def availability(self, slot_volumes=None):
+        """Recompute which ingredients and recipes can be poured
+
+        An ingredient is available if it is loaded in a slot and, when slot
+        volumes (ml) are given, that slot is not empty.
+        """
+        slot_of = self.matrix.slot_of
+        available = slot_of >= 0
+        if slot_volumes is not None:
+            volumes = np.asarray(slot_volumes, dtype=np.float64)
+            available &= volumes[np.maximum(slot_of, 0)] > 0
+        self.available_columns = available
+        # A column is covered if it or one of its swap partners is available
+        group_available = np.zeros(len(available), dtype=bool)
+        np.logical_or.at(group_available, self.group_of, available)
+        covered = group_available[self.group_of]
+        has_ingredients = self.uses.any(axis=1)
+        self.makeable = has_ingredients & ~(self.uses & ~available).any(axis=1)
+        self.makeable_with_swaps = has_ingredients & ~(self.uses & ~covered).any(axis=1)
+
+    def swaps_for(self, row):
+        """Return {ingredient: replacement} that makes a recipe pourable, or None
+
+        A replacement must not already be in the recipe, otherwise both would
+        pour from the same slot.
+        """
+        names = self.matrix.ingredient_names
+        swaps = {}
+        used = self.uses[row]
+        for col in np.flatnonzero(used & ~self.available_columns).tolist():
+            replacement = next((other for other in self.partners[col]
+                                if self.available_columns[other] and not used[other]), None)
+            if replacement is None:
+                return None
+            swaps[names[col]] = names[replacement]
+        return swaps
+
+    def suggest(self, name, limit=3, min_similarity=MIN_SIMILARITY):
+        """Return up to `limit` Suggestions for a recipe, best first
+
+        A drink that can be made as it is yields no suggestions. Otherwise
+        the drink itself with swapped ingredients comes first, followed by
+        the most similar other drinks.
+        """
+        row = self.matrix.row_of[name]
+        if self.makeable[row]:
+            return []
+        suggestions = []
+        if self.makeable_with_swaps[row]:
+            swaps = self.swaps_for(row)
+            if swaps is not None:
+                suggestions.append(Suggestion(name, swaps, 1.0))
+
+        similarity = self.vectors @ self.vectors[row]
+        similarity[~self.makeable_with_swaps] = -1.0
+        similarity[row] = -1.0
+        candidates = np.flatnonzero(similarity >= min_similarity)
+        # Only sort the best few; a couple extra in case swaps turn out impossible
+        keep = min(len(candidates), 2 * limit)
+        if keep < len(candidates):
+            candidates = candidates[np.argpartition(-similarity[candidates], keep - 1)[:keep]]
+        candidates = candidates[np.argsort(-similarity[candidates], kind="stable")]
+        for other in candidates.tolist():
+            if len(suggestions) >= limit:
+                break
+            swaps = {} if self.makeable[other] else self.swaps_for(other)
+            if swaps is not None:
+                suggestions.append(Suggestion(self.matrix.names[other], swaps, float(similarity[other])))
+        return suggestions[:limit]
+
+    def best_alternatives(self, names, min_similarity=MIN_SIMILARITY, chunk=1024):
+        """Return {name: Suggestion} with the best alternative for each drink that can't be made
+
+        Batched for the grid: one matrix product per `chunk` drinks, against
+        only the drinks that can be poured.
+        """
+        rows = np.array([self.matrix.row_of[name] for name in names], dtype=np.intp)
+        rows = rows[~self.makeable[rows]] if len(rows) else rows
+        candidates = np.flatnonzero(self.makeable_with_swaps)
+        alternatives = {}
+        for start in range(0, len(rows), chunk):
+            block = rows[start:start + chunk]
+            if len(candidates):
+                similarity = self.vectors[block] @ self.vectors[candidates].T
+                # A drink is never its own alternative
+                similarity[block[:, None] == candidates[None, :]] = -1.0
+                best = similarity.argmax(axis=1)
+                scores = similarity[np.arange(len(block)), best].tolist()
+                best = candidates[best].tolist()
+            else:
+                best = scores = [None] * len(block)
+            for row, other, score in zip(block.tolist(), best, scores):
+                suggestion = self._best_for(row, other, score, min_similarity)
+                if suggestion is not None:
+                    alternatives[self.matrix.names[row]] = suggestion
+        return alternatives
+
+    def _best_for(self, row, other, score, min_similarity):
+        name = self.matrix.names[row]
+        swaps = self.swaps_for(row) if self.makeable_with_swaps[row] else None
+        if swaps is not None:
+            return Suggestion(name, swaps, 1.0)
+        if other is None or score < min_similarity:
+            return None
+        swaps = {} if self.makeable[other] else self.swaps_for(other)
+        if swaps is None:
+            # Rare: the best match needs a swap onto an ingredient it already has
+            return next(iter(self.suggest(name, limit=1, min_similarity=min_similarity)), None)
+        return Suggestion(self.matrix.names[other], swaps, score)
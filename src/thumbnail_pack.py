@@ -0,0 +1,294 @@
+"""Packed thumbnail tiles for the Tk frontends
+
+Instead of opening and decoding one JPEG per cocktail, the frontends read
+ready-scaled tiles from a single file, `data/thumbnails.pack`. Each tile is a
+binary PPM, which Tk's photo image reads directly, so showing a thumbnail
+needs neither a JPEG decode nor PIL. The pack is memory-mapped; a tile is one
+slice of the mapping.
+
+The pack file is append-only. `data/thumbnails.pack.idx` holds one line per
+tile with its image, size, the image mtime and the tile's offset and length;
+later lines override earlier ones. When an image changes, only its new tiles
+are appended and indexed. `compact()` drops tiles that are outdated or whose
+image is gone once they take up more than half of the file.
+
+Run `python src/thumbnail_pack.py` to pack all images in assets/ ahead of
+time, so even the first start reads no JPEG.
+"""
+import argparse
+import contextlib
+import fcntl
+import glob
+import json
+import mmap
+import os
+import sys
+
+from PIL import Image
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+PACK_FILE = "thumbnails.pack"
+# Tile sizes of the cocktail grid (complex_main) and the display app (main)
+GRID_SIZE = (200, 266)
+DISPLAY_SIZE = (250, 250)
+
+
+def encode_tile(img):
+    """Return an image as binary PPM"""
+    img = img.convert("RGB")
+    return b"P6\n%d %d\n255\n" % img.size + img.tobytes()
+
+
+def decode_tile(tile):
+    """Return a PPM tile as a PIL image sharing the tile's buffer"""
+    magic, dims, maxval, _ = bytes(tile[:32]).split(b"\n", 3)
+    width, height = map(int, dims.split())
+    start = len(magic) + len(dims) + len(maxval) + 3
+    return Image.frombuffer("RGB", (width, height), tile[start:], "raw", "RGB", 0, 1)
+
+
+def make_tile(image_path, size):
+    """Decode an image, scale it to `size` and encode it as a tile"""
+    img = Image.open(image_path)
+    # JPEGs are decoded at the smallest scale that still covers `size`
+    img.draft("RGB", size)
+    return encode_tile(img.resize(size, Image.Resampling.LANCZOS))
+
+
+def tile_key(image_path, size):
+    return f"{os.path.abspath(image_path)}@{size[0]}x{size[1]}"
+
+
+class ThumbnailPack:
+    """Append-only, memory-mapped file of thumbnail tiles
+
+    Several processes may use the same pack; appends are serialized with a
+    lock on the index file, and tiles appended by another process are found
+    by re-reading the index on a miss.
+    """
+
+    def __init__(self, data_dir=DATA_DIR):
+        os.makedirs(data_dir, exist_ok=True)
+        self.path = os.path.join(data_dir, PACK_FILE)
+        self.index_path = self.path + ".idx"
+        self.index = {}          # key -> (mtime_ns, offset, length)
+        self.indexed_bytes = 0   # size of the tiles in the index, the rest of the pack is superseded
+        self._index_read = 0     # bytes of the index file read so far
+        self._index_inode = None
+        self._map = None
+        self.hits = 0
+        self.misses = 0
+        self._read_index()
+
+    # Reading -----------------------------------------------------------------
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                inode = os.fstat(f.fileno()).st_ino
+                if inode != self._index_inode:
+                    # First read, or another process compacted the pack
+                    self.index = {}
+                    self.indexed_bytes = 0
+                    self._index_read = 0
+                    self._index_inode = inode
+                    self._map = None
+                f.seek(self._index_read)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break            # an append still in progress
+                    self._index_read += len(line)
+                    try:
+                        key, mtime_ns, offset, length = json.loads(line)
+                    except ValueError:
+                        continue
+                    previous = self.index.get(key)
+                    if previous is not None:
+                        self.indexed_bytes -= previous[2]
+                    self.index[key] = (mtime_ns, offset, length)
+                    self.indexed_bytes += length
+        except FileNotFoundError:
+            pass
+
+    def _remap(self):
+        # Compaction holds the exclusive lock, so index and pack are read in a matching state;
+        # retry if a compaction replaced the index while we waited, like _locked
+        self._map = None
+        try:
+            while True:
+                with open(self.index_path, 'rb') as lock:
+                    fcntl.flock(lock, fcntl.LOCK_SH)
+                    if os.stat(self.index_path).st_ino != os.fstat(lock.fileno()).st_ino:
+                        continue
+                    self._read_index()
+                    with open(self.path, 'rb') as f:
+                        self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    return
+        except (OSError, ValueError):
+            pass
+
+    def release(self):
+        """Drop the mapped tiles from the resident set; they are paged in again when read"""
+        if self._map is not None and hasattr(mmap, "MADV_DONTNEED"):
+            self._map.madvise(mmap.MADV_DONTNEED)
+
+    def _entry(self, key, mtime_ns):
+        entry = self.index.get(key)
+        if entry is None or entry[0] != mtime_ns or self._map is None or entry[1] + entry[2] > len(self._map):
+            return None
+        return entry
+
+    def get(self, image_path, size):
+        """Return the PPM tile of an image as a memoryview, or None if it is missing or outdated"""
+        try:
+            mtime_ns = os.stat(image_path).st_mtime_ns
+        except OSError:
+            return None
+        key = tile_key(image_path, size)
+        entry = self._entry(key, mtime_ns)
+        if entry is None:
+            # Packed meanwhile, by us or another process
+            self._remap()
+            entry = self._entry(key, mtime_ns)
+            if entry is None:
+                return None
+        return memoryview(self._map)[entry[1]:entry[1] + entry[2]]
+
+    def tile(self, image_path, size):
+        """Return the PPM tile of an image, packing it first if needed"""
+        tile = self.get(image_path, size)
+        if tile is not None:
+            self.hits += 1
+            return tile
+        self.misses += 1
+        try:
+            self.update([image_path], [size])
+        except OSError:
+            pass
+        tile = self.get(image_path, size)
+        # Without a writable pack the tile is still returned, just not kept
+        return tile if tile is not None else memoryview(make_tile(image_path, size))
+
+    # Writing -----------------------------------------------------------------
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # Lock the index file; retry if a compaction replaced it while we waited
+        while True:
+            index_file = open(self.index_path, 'ab')
+            fcntl.flock(index_file, fcntl.LOCK_EX)
+            try:
+                current = os.stat(self.index_path).st_ino == os.fstat(index_file.fileno()).st_ino
+            except FileNotFoundError:
+                current = False
+            if current:
+                break
+            index_file.close()
+        try:
+            self._read_index()
+            yield index_file
+        finally:
+            fcntl.flock(index_file, fcntl.LOCK_UN)
+            index_file.close()
+
+    def update(self, image_paths, sizes):
+        """Pack the tiles of all images and sizes that are missing or outdated
+
+        Returns the number of tiles written. Images that cannot be read are
+        skipped.
+        """
+        pending = []
+        for image_path in image_paths:
+            try:
+                mtime_ns = os.stat(image_path).st_mtime_ns
+            except OSError:
+                continue
+            for size in sizes:
+                entry = self.index.get(tile_key(image_path, size))
+                if entry is None or entry[0] != mtime_ns:
+                    pending.append((image_path, tuple(size), mtime_ns))
+        if not pending:
+            return 0
+
+        with self._locked() as index_file:
+            with open(self.path, 'ab') as pack:
+                offset = pack.seek(0, os.SEEK_END)
+                lines = []
+                for image_path, size, mtime_ns in pending:
+                    key = tile_key(image_path, size)
+                    entry = self.index.get(key)
+                    if entry is not None and entry[0] == mtime_ns:
+                        continue     # another process packed it meanwhile
+                    try:
+                        tile = make_tile(image_path, size)
+                    except (OSError, ValueError):
+                        continue
+                    pack.write(tile)
+                    lines.append(json.dumps([key, mtime_ns, offset, len(tile)]).encode() + b"\n")
+                    offset += len(tile)
+                # Tiles must be in the pack before the index points at them
+                pack.flush()
+            index_file.write(b"".join(lines))
+            index_file.flush()
+            self._read_index()
+            superseded = offset > 2 * self.indexed_bytes
+        if superseded:
+            self.compact()
+        return len(lines)
+
+    def compact(self, force=False):
+        """Rewrite the pack without outdated tiles and tiles of deleted images
+
+        Only runs when such tiles take up more than half of the pack unless
+        `force` is set. Returns the number of bytes saved.
+        """
+        with self._locked():
+            live = {}
+            for key, (mtime_ns, offset, length) in self.index.items():
+                try:
+                    if os.stat(key.rpartition("@")[0]).st_mtime_ns == mtime_ns:
+                        live[key] = (mtime_ns, offset, length)
+                except OSError:
+                    pass
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                return 0
+            if not force and sum(length for _, _, length in live.values()) * 2 >= size:
+                return 0
+
+            offset = 0
+            with open(self.path, 'rb') as source, open(self.path + ".tmp", 'wb') as pack, \
+                    open(self.index_path + ".tmp", 'wb') as index_file:
+                for key, (mtime_ns, old_offset, length) in sorted(live.items(), key=lambda item: item[1][1]):
+                    source.seek(old_offset)
+                    pack.write(source.read(length))
+                    index_file.write(json.dumps([key, mtime_ns, offset, length]).encode() + b"\n")
+                    offset += length
+            # Readers holding the old mapping keep the old file until they notice the new index
+            os.replace(self.path + ".tmp", self.path)
+            os.replace(self.index_path + ".tmp", self.index_path)
+        self._read_index()
+        return size - offset
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vorschaubilder in data/thumbnails.pack packen")
+    parser.add_argument("images", nargs="*", help="Bilder (Standard: alle Bilder in assets/)")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    parser.add_argument("--compact", action="store_true", help="Veraltete Kacheln immer entfernen")
+    args = parser.parse_args(argv)
+
+    images = args.images or sorted(glob.glob(os.path.join(ASSETS_DIR, "*.jpg")) +
+                                   glob.glob(os.path.join(ASSETS_DIR, "*.jpeg")) +
+                                   glob.glob(os.path.join(ASSETS_DIR, "*.png")))
+    pack = ThumbnailPack(args.data_dir)
+    written = pack.update(images, [GRID_SIZE, DISPLAY_SIZE])
+    saved = pack.compact(force=args.compact)
+    print(f"{written} Kacheln gepackt, {len(pack.index)} im Paket, {saved / 1024:.0f} KiB freigegeben")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""The Tk app stays within the Pi Zero memory budget
+
+Starts the MainWindow in a fresh process with MIXMASTERX_MEMORY_MB=100 on a
+catalog of a few hundred recipes with an image each, pages through the grid
+and every admin section (the child of benchmarks/bench_memory.py) and checks
+its peak RSS. Needs a display or Xvfb and is skipped without one.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+from suite import ensure_display
+import bench_memory
+
+BUDGET_MB = 100
+RECIPES = 300
+
+
+@pytest.fixture(scope="module")
+def display():
+    xvfb, error = ensure_display()
+    if error:
+        pytest.skip(error)
+    yield
+    if xvfb is not None:
+        xvfb.terminate()
+
+
+def test_peak_memory_within_budget(display, tmp_path):
+    catalog = bench_memory.image_catalog(RECIPES, str(tmp_path))
+    # The first start packs the thumbnails and writes the snapshot
+    bench_memory.run(catalog.data_dir, None)
+    stats = bench_memory.run(catalog.data_dir, BUDGET_MB)
+    assert stats["peak"] <= BUDGET_MB, f"Spitze {stats['peak']:.1f} MB bei {RECIPES} Rezepten"